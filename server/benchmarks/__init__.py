@@ -0,0 +1,103 @@
+# Benchmarks for 102shows
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+This package contains benchmarks that measure the performance of 102shows without a real LED strip
+and without an MQTT broker on the network. Run them from the :file:`server` directory, for example: ::
+
+    python3 -m benchmarks.showswitch --num-leds 300 --json showswitch.json
+
+Each benchmark prints a human-readable summary and can write its results as JSON (or CSV),
+so the numbers of different versions can be compared.
+"""
+
+import csv
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import yaml
+
+from helpers.configparser import ConfigTree, get_configuration
+
+__all__ = ['hdr', 'rendering', 'segments', 'showswitch']
+
+server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  #: path of the :file:`server` directory
+
+
+def get_benchmark_configuration(num_leds: int, broker_host: str = 'localhost', broker_port: int = 1883,
+                                **strip_settings) -> ConfigTree:
+    """\
+    builds a configuration tree from :file:`defaults.yml` for a benchmark
+    (instead of reading the :file:`config.yml` of the installation)
+
+    :param num_leds: number of LEDs of the (simulated) strip
+    :param broker_host: address of the MQTT broker
+    :param broker_port: port of the MQTT broker
+    :param strip_settings: further settings of the ``Strip`` section, e.g. ``fps=100``
+    :return: settings tree
+    """
+    user_config = {'sys_name': 'benchmark',
+                   'Strip': dict(driver='Dummy', num_leds=num_leds, **strip_settings),
+                   'MQTT': {'username': None,
+                            'Broker': {'host': broker_host, 'port': broker_port}}}
+
+    with tempfile.NamedTemporaryFile('w', suffix='.yml') as user_file:
+        yaml.safe_dump(user_config, user_file)
+        user_file.flush()
+        return get_configuration(os.path.join(server_dir, 'defaults.yml'), user_file.name)
+
+
+def summarize(samples_sec: list) -> dict:
+    """\
+    calculates the usual statistics of a list of latencies
+
+    :param samples_sec: the measured latencies (in seconds)
+    :return: the number of samples and p50, p99, mean and maximum (in milliseconds)
+    """
+    samples_ms = np.asarray(samples_sec, dtype=float) * 1000
+    if not len(samples_ms):
+        return {'samples': 0}
+    return {'samples': len(samples_ms),
+            'p50_ms': float(np.percentile(samples_ms, 50)),
+            'p99_ms': float(np.percentile(samples_ms, 99)),
+            'mean_ms': float(samples_ms.mean()),
+            'max_ms': float(samples_ms.max())}
+
+
+def write_json(results: dict, filename: str) -> None:
+    """\
+    stores benchmark results as a JSON file
+
+    :param results: the results
+    :param filename: path of the file. ``-`` prints the JSON to stdout.
+    """
+    if filename == '-':
+        print(json.dumps(results, indent=2))
+        return
+    with open(filename, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def write_csv(rows: list, filename: str) -> None:
+    """\
+    stores benchmark results as a CSV file with one line per result
+
+    :param rows: the results as a list of :py:class:`dict` objects
+    :param filename: path of the file. ``-`` prints the CSV to stdout.
+    """
+    columns = []
+    for row in rows:
+        columns += [key for key in row if key not in columns]
+
+    file = sys.stdout if filename == '-' else open(filename, 'w', newline='')
+    try:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    finally:
+        if file is not sys.stdout:
+            file.close()
@@ -0,0 +1,142 @@
+# HDR encoding benchmark
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Compares the standard encoding of :py:class:`drivers.apa102.APA102` with the HDR encoding
+(see :py:func:`drivers.apa102.APA102.encode_hdr`).
+
+For each strip length, the benchmark reports the time of :py:func:`~drivers.apa102.APA102.encode`
+(which regenerates the whole message buffer) in both modes: ``standard_ms_p50``, ``standard_ms_mean``,
+``hdr_ms_p50`` and ``hdr_ms_mean``.
+It also counts the distinct intensities a fade from black to white shows at a low global brightness
+(``standard_fade_levels`` and ``hdr_fade_levels``): the more levels, the smoother the fade.
+
+Usage (in the :file:`server` directory): ::
+
+    python3 -m benchmarks.hdr [--num-leds 60 300 1024 4096] [--brightness 0.1] [--frames 200]
+                              [--json results.json] [--csv results.csv]
+"""
+
+import argparse
+import logging
+import time
+from unittest import mock
+
+import numpy as np
+
+from benchmarks import summarize, write_csv, write_json
+from drivers import apa102, fakespidev
+
+logger = logging.getLogger('102shows.server.benchmarks.hdr')
+
+
+def make_strip(num_leds: int, hdr: bool) -> apa102.APA102:
+    """\
+    creates an APA102 strip on a :py:mod:`drivers.fakespidev` device
+
+    :param num_leds: length of the strip
+    :param hdr: use the HDR encoder
+    :return: the strip
+    """
+    with mock.patch.object(apa102, 'spidev', fakespidev):
+        return apa102.APA102(num_leds, hdr=hdr)
+
+
+def measure_encode(num_leds: int, hdr: bool, num_frames: int) -> dict:
+    """\
+    measures the time of :py:func:`drivers.apa102.APA102.encode` with random colors and brightness values
+
+    :param num_leds: length of the strip
+    :param hdr: use the HDR encoder
+    :param num_frames: number of frames to be encoded
+    :return: the statistics of the encode() durations (see :py:func:`benchmarks.summarize`)
+    """
+    strip = make_strip(num_leds, hdr)
+    random = np.random.RandomState(102)
+    strip.color_buffer[:] = random.uniform(0, 255, (num_leds, 3))
+    strip.brightness_buffer[:] = random.uniform(0, 1, num_leds)
+    strip.encode()  # builds the HDR tables
+
+    samples = []
+    try:
+        for _ in range(num_frames):
+            start = time.perf_counter()
+            strip.encode()
+            samples.append(time.perf_counter() - start)
+    finally:
+        strip.close()
+    return summarize(samples)
+
+
+def count_fade_levels(hdr: bool, brightness: float, num_steps: int = 4096) -> int:
+    """\
+    counts the distinct intensities of a red channel that fades from 0 to 255
+
+    :param hdr: use the HDR encoder
+    :param brightness: the global brightness during the fade
+    :param num_steps: number of steps of the fade
+    :return: the number of distinct intensities
+    """
+    strip = make_strip(num_steps, hdr)
+    strip.set_pixels(slice(None), np.linspace(0, 255, num_steps)[:, np.newaxis] * [1, 0, 0])
+    strip.set_global_brightness(brightness)
+    strip.on_global_brightness_change()
+    frames = strip.led_frames.astype(np.int64)
+    strip.close()
+    return len(np.unique((frames[:, 0] & 0b00011111) * frames[:, 3]))
+
+
+def run_benchmark(num_leds: list = (60, 300, 1024, 4096), brightness: float = 0.1, num_frames: int = 200) -> list:
+    """\
+    runs the benchmark
+
+    :param num_leds: the strip lengths to be measured
+    :param brightness: the global brightness of the fade
+    :param num_frames: number of frames to be encoded for each strip length and mode
+    :return: one result :py:class:`dict` per strip length
+    """
+    fade_levels = {hdr: count_fade_levels(hdr, brightness) for hdr in (False, True)}
+
+    results = []
+    for leds in num_leds:
+        logger.info("measuring {} LEDs".format(leds))
+        standard = measure_encode(leds, False, num_frames)
+        hdr = measure_encode(leds, True, num_frames)
+        results.append({'num_leds': leds,
+                        'standard_ms_p50': standard['p50_ms'], 'standard_ms_mean': standard['mean_ms'],
+                        'hdr_ms_p50': hdr['p50_ms'], 'hdr_ms_mean': hdr['mean_ms'],
+                        'standard_fade_levels': fade_levels[False], 'hdr_fade_levels': fade_levels[True]})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compares the standard and the HDR encoding of APA102 strips")
+    parser.add_argument('--num-leds', type=int, nargs='+', default=[60, 300, 1024, 4096],
+                        help="the strip lengths to be measured")
+    parser.add_argument('--brightness', type=float, default=0.1, help="global brightness of the fade")
+    parser.add_argument('--frames', type=int, default=200, help="number of frames for each strip length and mode")
+    parser.add_argument('--json', metavar='FILE', help="write the results to a JSON file ('-' for stdout)")
+    parser.add_argument('--csv', metavar='FILE', help="write the results to a CSV file ('-' for stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run_benchmark(args.num_leds, args.brightness, args.frames)
+
+    print("fade from black to red at global brightness {}: {} levels standard, {} levels HDR".format(
+        args.brightness, results[0]['standard_fade_levels'], results[0]['hdr_fade_levels']))
+    print("{:>10}{:>20}{:>20}{:>16}{:>16}".format(
+        "LEDs", "standard p50 [ms]", "standard mean [ms]", "HDR p50 [ms]", "HDR mean [ms]"))
+    for result in results:
+        print("{:>10}{:>20.3f}{:>20.3f}{:>16.3f}{:>16.3f}".format(
+            result['num_leds'], result['standard_ms_p50'], result['standard_ms_mean'],
+            result['hdr_ms_p50'], result['hdr_ms_mean']))
+
+    if args.json:
+        write_json({'benchmark': 'hdr', 'brightness': args.brightness, 'results': results}, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+# Frame rendering benchmark
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Measures how expensive the frames of each lightshow are and how this scales with the length of the strip.
+
+Every show in :py:data:`benchmark_shows` runs for a while on a
+:py:class:`drivers.dummy.DummyDriver` strip (which does not transmit anything).
+By default, the shows are not paced: the :py:class:`helpers.scheduler.FrameScheduler` does not wait
+for the deadlines of the frames (see :py:func:`skip_waiting`), so each show renders as many frames as it can.
+The frame rate of the strip still sets the number of frames of e.g. a blend, and pauses still take their time.
+With ``--paced``, the shows run at the frame rate of the strip, like on a real installation.
+The shows publish their MQTT notifications to an :py:class:`OfflineClient`, so no broker is needed.
+The playback show plays a recording that the benchmark writes (see :py:func:`write_recording`).
+Shows that cannot run on a strip length (e.g. spin the bottle on short strips) are skipped with the reason.
+For each show and strip length, the benchmark reports:
+
+    - ``frames``: number of distinct frames the show rendered
+    - ``fps``: the frame rate that was actually achieved (distinct frames per second)
+    - ``cpu_ms_per_frame``: CPU time of the show thread per rendered frame
+    - ``load``: CPU time of the show thread per wall clock time (``1.0`` means that the show cannot keep up).
+      In unpaced runs, a show with a load far below ``1.0`` spent its time idling or pausing,
+      so its ``fps`` is not the limit of its renderer.
+
+For color cycles (:py:class:`lightshows.templates.colorcycle.ColorCycle`) it additionally calls
+:py:func:`~lightshows.templates.colorcycle.ColorCycle.update` in a tight loop and reports
+the time per call as ``update_ms_p50`` and ``update_ms_mean``.
+
+Usage (in the :file:`server` directory): ::
+
+    python3 -m benchmarks.rendering [--num-leds 60 300 1024 4096] [--shows rainbow theaterchase]
+                                    [--duration 2] [--fps 60] [--paced] [--json results.json] [--csv results.csv]
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+
+from benchmarks import get_benchmark_configuration, summarize, write_csv, write_json
+from drivers.dummy import DummyDriver
+from helpers.configparser import ConfigTree
+from helpers.exceptions import InvalidConf, InvalidParameters, InvalidStrip, ShowStopped
+from helpers.framefile import FrameFileHeader, write_frames
+from helpers.scheduler import FrameScheduler
+from lightshows.__active__ import shows
+from lightshows.strandtest import StrandTest
+from lightshows.templates.colorcycle import ColorCycle
+
+logger = logging.getLogger('102shows.server.benchmarks.rendering')
+
+show_parameters = {'solidcolor': {'color': [255, 127, 0]},
+                   'spinthebottle': {'highlight_color': [255, 255, 255], 'background_color': [0, 0, 64],
+                                     'time_sec': 2, 'fadeout': True},
+                   'twocolorblend': {'color1': [255, 0, 0], 'color2': [0, 0, 255]}}
+"""parameters for the shows that do not run without them"""
+
+benchmark_shows = dict(shows, strandtest=StrandTest)
+"""the measured shows: all shows in :py:data:`lightshows.__active__.shows` and the strand test"""
+
+
+class OfflineClient:
+    """\
+    Stands in for the :py:class:`paho.mqtt.client.Client` of a show,
+    so the show can run without a connection to a broker. It only counts the messages.
+    """
+
+    def __init__(self):
+        self.published = 0  #: number of messages the show has published
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False) -> None:
+        self.published += 1
+
+    def subscribe(self, topic, qos: int = 0) -> None:
+        pass
+
+
+def skip_waiting(scheduler: FrameScheduler, deadline: float) -> None:
+    """\
+    replaces :py:func:`helpers.scheduler.FrameScheduler.sleep_until` in unpaced runs:
+    returns immediately instead of waiting for the deadline
+
+    :param scheduler: the scheduler
+    :param deadline: the deadline (ignored)
+    :raises ShowStopped: if the :py:attr:`~helpers.scheduler.FrameScheduler.interrupt` event is set
+    """
+    if scheduler.interrupt is not None and scheduler.interrupt.is_set():
+        raise ShowStopped()
+
+
+def write_recording(directory: str, num_leds: int, fps: float) -> str:
+    """\
+    writes a frame file with a moving color gradient for the playback show
+
+    :param directory: the playback directory
+    :param num_leds: number of LEDs per frame
+    :param fps: frame rate of the recording
+    :return: name of the file
+    """
+    header = FrameFileHeader(num_leds=num_leds, fps=fps)
+    frames = np.zeros(int(2 * fps), dtype=header.dtype)
+    gradient = np.linspace(0, 255, 3 * num_leds).reshape(num_leds, 3)
+    for index in range(len(frames)):
+        frames[index]['colors'] = np.roll(gradient, index, axis=0)
+    file_name = 'benchmark-{}.102f'.format(num_leds)
+    write_frames(os.path.join(directory, file_name), header, frames)
+    return file_name
+
+
+def measure_show(show_class, parameters: dict, num_leds: int, conf: ConfigTree, duration_sec: float,
+                 paced: bool = False) -> dict:
+    """\
+    runs a show for ``duration_sec`` seconds and measures the rendered frames
+
+    :param show_class: the lightshow class
+    :param parameters: the parameters of the show
+    :param num_leds: number of LEDs of the strip
+    :param conf: the configuration (the ``Strip`` section sets the frame rate)
+    :param duration_sec: how long the show runs
+    :param paced: wait for the deadlines of the frames (otherwise, the show renders as fast as it can)
+    :return: the measured values (see the module description)
+    """
+    strip = DummyDriver(num_leds)
+    strip.fps = conf.Strip.fps
+    strip.skip_identical_frames = True  # so that strip.transmitted_frames counts the distinct frames
+    strip.forced_refresh_sec = float('inf')
+
+    show = show_class(strip, parameters, mqtt_client=OfflineClient(), config=conf)
+    show.check_runnable()
+
+    cpu_time = []
+
+    def run_show():
+        cpu_start = time.thread_time()
+        try:
+            show.start()
+        finally:
+            cpu_time.append(time.thread_time() - cpu_start)
+
+    thread = threading.Thread(target=run_show, name=show.name, daemon=True)
+    with mock.patch.object(FrameScheduler, 'sleep_until', FrameScheduler.sleep_until if paced else skip_waiting):
+        start_time = time.perf_counter()
+        thread.start()
+        time.sleep(duration_sec)
+        show.stop()
+        thread.join()
+        wall_time = time.perf_counter() - start_time
+
+    frames = strip.transmitted_frames
+    cpu_sec = cpu_time[0] if cpu_time else None  # nothing if the show thread did not end
+    return {'frames': frames,
+            'fps': frames / wall_time,
+            'cpu_ms_per_frame': 1000 * cpu_sec / frames if frames and cpu_sec is not None else None,
+            'load': cpu_sec / wall_time if cpu_sec is not None else None}
+
+
+def measure_update(show_class, parameters: dict, num_leds: int, conf: ConfigTree, duration_sec: float) -> dict:
+    """\
+    calls :py:func:`~lightshows.templates.colorcycle.ColorCycle.update` of a color cycle
+    (and :py:func:`drivers.LEDStrip.show`) as often as possible for ``duration_sec`` seconds
+
+    :param show_class: a subclass of :py:class:`lightshows.templates.colorcycle.ColorCycle`
+    :param parameters: the parameters of the show
+    :param num_leds: number of LEDs of the strip
+    :param conf: the configuration
+    :param duration_sec: how long the measurement takes
+    :return: p50 and mean of the time per frame (in milliseconds)
+    """
+    strip = DummyDriver(num_leds)
+    show = show_class(strip, parameters, mqtt_client=OfflineClient(), config=conf)
+    show.check_runnable()
+    show.before_start()
+
+    num_steps = show.p.value['num_steps_per_cycle']
+    samples = []
+    end_time = time.perf_counter() + duration_sec
+    frame = 0
+    while time.perf_counter() < end_time or len(samples) < 10:
+        frame_start = time.perf_counter()
+        show.update(frame % num_steps, frame // num_steps)
+        strip.show()
+        samples.append(time.perf_counter() - frame_start)
+        frame += 1
+
+    stats = summarize(samples)
+    return {'update_ms_p50': stats['p50_ms'], 'update_ms_mean': stats['mean_ms']}
+
+
+def run_benchmark(num_leds: list = (60, 300, 1024, 4096), show_names: list = None, duration_sec: float = 2,
+                  fps: float = 60, paced: bool = False) -> list:
+    """\
+    runs the benchmark
+
+    :param num_leds: the strip lengths to be measured
+    :param show_names: the shows to be measured (default: all shows in :py:data:`benchmark_shows`)
+    :param duration_sec: how long each show runs on each strip
+    :param fps: frame rate of the strip
+    :param paced: run the shows at the frame rate of the strip (otherwise, they render as fast as they can)
+    :return: one result :py:class:`dict` per show and strip length.
+             If a show cannot run on a strip (e.g. because it is too short), the result names the reason
+             as ``skipped``.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as playback_directory:  # for the recordings of the playback show
+        for show_name in show_names or sorted(benchmark_shows):
+            show_class = benchmark_shows[show_name]
+            for leds in num_leds:
+                conf = get_benchmark_configuration(leds, fps=fps)
+                parameters = dict(show_parameters.get(show_name, {}))
+                if show_name == 'playback':
+                    conf.Playback.directory = playback_directory
+                    parameters['file'] = write_recording(playback_directory, leds, fps)
+
+                result = {'show': show_name, 'num_leds': leds}
+                logger.info("measuring {} with {} LEDs".format(show_name, leds))
+                try:
+                    result.update(measure_show(show_class, parameters, leds, conf, duration_sec, paced))
+                    if issubclass(show_class, ColorCycle):
+                        result.update(measure_update(show_class, parameters, leds, conf, duration_sec / 2))
+                except (InvalidStrip, InvalidConf, InvalidParameters) as error:
+                    logger.info("skipping {} with {} LEDs: {}".format(show_name, leds, error))
+                    result['skipped'] = str(error)
+                results.append(result)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measures the frame rendering of all lightshows")
+    parser.add_argument('--num-leds', type=int, nargs='+', default=[60, 300, 1024, 4096],
+                        help="the strip lengths to be measured")
+    parser.add_argument('--shows', nargs='+', choices=sorted(benchmark_shows),
+                        help="the shows to be measured (default: all)")
+    parser.add_argument('--duration', type=float, default=2, help="how long each show runs (in seconds)")
+    parser.add_argument('--fps', type=float, default=60, help="frame rate of the strip")
+    parser.add_argument('--paced', action='store_true',
+                        help="run the shows at the frame rate of the strip instead of as fast as they can")
+    parser.add_argument('--json', metavar='FILE', help="write the results to a JSON file ('-' for stdout)")
+    parser.add_argument('--csv', metavar='FILE', help="write the results to a CSV file ('-' for stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run_benchmark(args.num_leds, args.shows, args.duration, args.fps, args.paced)
+
+    print("frame rendering: {duration} s per show, {pacing}".format(
+        duration=args.duration, pacing="paced at {} fps".format(args.fps) if args.paced else "unpaced"))
+    print("{:<16}{:>8}{:>10}{:>16}{:>8}{:>14}".format(
+        "show", "LEDs", "fps", "CPU/frame [ms]", "load", "update [ms]"))
+    for result in results:
+        if 'skipped' in result:
+            print("{show:<16}{num_leds:>8}  skipped: {skipped}".format(**result))
+            continue
+        print("{:<16}{:>8}{:>10.1f}{:>16}{:>8}{:>14}".format(
+            result['show'], result['num_leds'], result['fps'],
+            '-' if result['cpu_ms_per_frame'] is None else '{:.3f}'.format(result['cpu_ms_per_frame']),
+            '-' if result['load'] is None else '{:.2f}'.format(result['load']),
+            '{:.3f}'.format(result['update_ms_p50']) if 'update_ms_p50' in result else '-'))
+
+    if args.json:
+        write_json({'benchmark': 'rendering', 'duration_sec': args.duration, 'fps': args.fps, 'paced': args.paced,
+                    'results': results}, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+
+
+if __name__ == '__main__':
+    main()
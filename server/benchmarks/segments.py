@@ -0,0 +1,111 @@
+# Segment output benchmark
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Measures how much faster a strip is sent to the LEDs if it is split into several segments
+on different SPI buses (see :py:class:`drivers.segmented.SegmentedStrip`).
+
+The segments are APA102 strips on :py:mod:`drivers.fakespidev` devices that block for as long
+as a real bus would need for each transfer. For each number of segments, the benchmark reports
+the time per :py:func:`~drivers.LEDStrip.show` call (``show_ms_p50``, ``show_ms_mean``)
+and the ``speedup`` compared to a single strip of the same length.
+
+Usage (in the :file:`server` directory): ::
+
+    python3 -m benchmarks.segments [--num-leds 1200] [--segments 1 2 4] [--clock-speed-hz 4000000]
+                                   [--frames 50] [--json results.json] [--csv results.csv]
+"""
+
+import argparse
+import logging
+import time
+from unittest import mock
+
+from benchmarks import summarize, write_csv, write_json
+from drivers import apa102, fakespidev
+from drivers.segmented import SegmentedStrip
+
+logger = logging.getLogger('102shows.server.benchmarks.segments')
+
+
+def measure_segments(num_leds: int, num_segments: int, clock_speed_hz: int, num_frames: int) -> dict:
+    """\
+    measures the time of :py:func:`drivers.LEDStrip.show` on a strip that is split into equal segments
+
+    :param num_leds: length of the whole strip
+    :param num_segments: number of segments (each one on its own SPI bus)
+    :param clock_speed_hz: clock speed of the simulated buses
+    :param num_frames: number of frames to be sent
+    :return: the statistics of the show() durations (see :py:func:`benchmarks.summarize`)
+    """
+    segment_leds = [num_leds // num_segments + (index < num_leds % num_segments) for index in range(num_segments)]
+    segments = [{'num_leds': leds, 'bus': index, 'device': 0} for index, leds in enumerate(segment_leds)]
+    with mock.patch.object(apa102, 'spidev', fakespidev):
+        strip = SegmentedStrip(apa102.APA102, segments, max_clock_speed_hz=clock_speed_hz)
+
+    samples = []
+    try:
+        for frame in range(num_frames):
+            strip.fill((frame % 256, 0, 255 - frame % 256))
+            start = time.perf_counter()
+            strip.show()
+            samples.append(time.perf_counter() - start)
+    finally:
+        strip.close()
+    return summarize(samples)
+
+
+def run_benchmark(num_leds: int = 1200, num_segments: list = (1, 2, 4), clock_speed_hz: int = 4000000,
+                  num_frames: int = 50) -> list:
+    """\
+    runs the benchmark
+
+    :param num_leds: length of the whole strip
+    :param num_segments: the numbers of segments to be measured
+    :param clock_speed_hz: clock speed of the simulated buses
+    :param num_frames: number of frames to be sent for each number of segments
+    :return: one result :py:class:`dict` per number of segments
+    """
+    results = []
+    for segments in num_segments:
+        logger.info("measuring {} segments".format(segments))
+        stats = measure_segments(num_leds, segments, clock_speed_hz, num_frames)
+        results.append({'num_leds': num_leds, 'segments': segments,
+                        'show_ms_p50': stats['p50_ms'], 'show_ms_mean': stats['mean_ms']})
+
+    single = next((result for result in results if result['segments'] == 1), None)
+    for result in results:
+        result['speedup'] = single['show_ms_mean'] / result['show_ms_mean'] if single else None
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measures the output time of strips that are split into segments")
+    parser.add_argument('--num-leds', type=int, default=1200, help="length of the whole strip")
+    parser.add_argument('--segments', type=int, nargs='+', default=[1, 2, 4],
+                        help="the numbers of segments to be measured")
+    parser.add_argument('--clock-speed-hz', type=int, default=4000000, help="clock speed of the simulated SPI buses")
+    parser.add_argument('--frames', type=int, default=50, help="number of frames for each number of segments")
+    parser.add_argument('--json', metavar='FILE', help="write the results to a JSON file ('-' for stdout)")
+    parser.add_argument('--csv', metavar='FILE', help="write the results to a CSV file ('-' for stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run_benchmark(args.num_leds, args.segments, args.clock_speed_hz, args.frames)
+
+    print("segment output: {leds} LEDs at {clock} Hz".format(leds=args.num_leds, clock=args.clock_speed_hz))
+    print("{:>10}{:>16}{:>16}{:>10}".format("segments", "show p50 [ms]", "show mean [ms]", "speedup"))
+    for result in results:
+        print("{:>10}{:>16.3f}{:>16.3f}{:>10}".format(
+            result['segments'], result['show_ms_p50'], result['show_ms_mean'],
+            '-' if result['speedup'] is None else '{:.2f}'.format(result['speedup'])))
+
+    if args.json:
+        write_json({'benchmark': 'segments', 'clock_speed_hz': args.clock_speed_hz, 'results': results}, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+# Show switch latency benchmark
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Measures how fast 102shows reacts to MQTT commands.
+
+The benchmark feeds synthetic MQTT messages into :py:func:`mqttcontrol.MQTTControl.on_message`
+on the event loop of the controller, which is connected to a :py:class:`helpers.fakebroker.FakeBroker`.
+The shows run in the real show worker with a :py:class:`RecordingDriver` strip that reports
+the time of every transmitted frame.
+
+It reports p50 and p99 of these latencies:
+
+    - **time to first frame**: from a ``show/start`` message until the first frame of the new show is transmitted
+    - **time to dark**: from a ``show/stop`` message (followed by the start of ``clear`` without fading,
+      as the user interface does to switch off the strip) until the first dark frame is transmitted
+    - **brightness to visible frame**: from a ``global-brightness/set`` message
+      until the first frame with the new brightness is transmitted
+    - **show parameter to visible frame**: from a ``parameters/set`` message to a running :py:class:`ParameterProbe`
+      until the first frame with the new color is transmitted. The parameter takes the whole way of a show
+      parameter: it is verified as a transaction when the message arrives
+      (see :py:func:`lightshows.templates.base.Lightshow.verify_parameter_set`) and committed at the next frame
+      boundary (see :py:func:`lightshows.templates.base.Lightshow.commit_parameters`).
+
+Usage (in the :file:`server` directory): ::
+
+    python3 -m benchmarks.showswitch [--num-leds 300] [--repeat 50] [--show rainbow] [--json results.json]
+"""
+
+import argparse
+from collections import namedtuple
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+import paho.mqtt.client
+
+from benchmarks import get_benchmark_configuration, summarize, write_json
+from drivers.dummy import DummyDriver
+from helpers.fakebroker import FakeBroker
+from helpers.preprocessors import list_to_tuple
+import helpers.verify as verify
+from lightshows.__active__ import shows
+from lightshows.templates.base import Lightshow
+from mqttcontrol import MQTTControl
+
+logger = logging.getLogger('102shows.server.benchmarks.showswitch')
+
+Frame = namedtuple('Frame', ['time', 'brightness', 'lit', 'color'])
+"""\
+A transmitted frame: :py:func:`time.perf_counter` timestamp, global brightness,
+if any LED is lit and the color of the first LED
+"""
+
+
+class ParameterProbe(Lightshow):
+    """\
+    A show that fills the strip with its ``color`` parameter in the frame that commits the parameter,
+    so a parameter change becomes visible as early as possible.
+    """
+
+    def init_parameters(self):
+        self.register('color', (255, 255, 255), verify.rgb_color_tuple, preprocessor=list_to_tuple)
+
+    def check_runnable(self):
+        pass
+
+    def run(self):
+        self.mqtt.parse_parameter_changes = True
+        self.strip.fill(self.p.value['color'])
+
+    def commit_parameters(self, values: dict, send_mqtt_update: bool = True) -> None:
+        super().commit_parameters(values, send_mqtt_update)
+        self.strip.fill(self.p.value['color'])
+
+
+class RecordingDriver(DummyDriver):
+    """\
+    A dummy driver that reports every transmitted frame to the benchmark process.
+    The frames are sent through a :py:class:`multiprocessing.Queue`, so they can be
+    recorded in the show worker process.
+    """
+
+    def __init__(self, num_leds: int, max_clock_speed_hz: int = 4000000, max_global_brightness: float = 1.0):
+        super().__init__(num_leds, max_clock_speed_hz, max_global_brightness)
+        self.frames = multiprocessing.Queue()  #: the transmitted :py:class:`Frame` objects
+
+    def transmit(self) -> None:
+        self.frames.put(Frame(time.perf_counter(), self._global_brightness, bool(self.color_buffer.any()),
+                              tuple(self.color_buffer[0].tolist())))
+
+    def wait_for_frame(self, after: float, condition=None, timeout_sec: float = 5) -> Frame:
+        """\
+        waits for the first frame that is transmitted after a given point in time and fulfills a condition
+
+        :param after: :py:func:`time.perf_counter` timestamp
+        :param condition: a function that takes a :py:class:`Frame` and returns ``True`` for the wanted frame
+        :param timeout_sec: maximum waiting time
+        :return: the frame
+        :raises TimeoutError: if there was no such frame within ``timeout_sec``
+        """
+        end_time = time.perf_counter() + timeout_sec
+        while True:
+            try:
+                frame = self.frames.get(timeout=max(end_time - time.perf_counter(), 0))
+            except queue.Empty:
+                raise TimeoutError("No matching frame within {} seconds".format(timeout_sec)) from None
+            if frame.time > after and (condition is None or condition(frame)):
+                return frame
+
+
+def make_message(topic: str, payload: str) -> paho.mqtt.client.MQTTMessage:
+    """builds an MQTT message like the ones the Paho client passes to ``on_message``"""
+    message = paho.mqtt.client.MQTTMessage(topic=topic.encode())
+    message.payload = payload.encode()
+    return message
+
+
+def run_benchmark(num_leds: int = 300, repeat: int = 50, show_name: str = 'rainbow',
+                  show_parameters: dict = None, settle_sec: float = 0.05) -> dict:
+    """\
+    runs the benchmark
+
+    :param num_leds: number of LEDs of the simulated strip
+    :param repeat: number of measurements for each latency
+    :param show_name: the show that is started (it should change the strip in every frame)
+    :param show_parameters: parameters of the show
+    :param settle_sec: break between two commands
+    :return: the statistics of each latency (see :py:func:`benchmarks.summarize`)
+    """
+    samples = {'time_to_first_frame': [], 'time_to_dark': [], 'brightness_to_visible_frame': [],
+               'show_parameter_to_visible_frame': []}
+
+    with FakeBroker() as broker:
+        conf = get_benchmark_configuration(num_leds, broker.host, broker.port)
+        paths = conf.MQTT.Path
+        start_message = make_message(paths.show_start, json.dumps({'name': show_name,
+                                                                   'parameters': show_parameters or {}}))
+        stop_message = make_message(paths.show_stop, '')
+        clear_message = make_message(paths.show_start, json.dumps({'name': 'clear',
+                                                                   'parameters': {'fadetime_sec': 0}}))
+        probe_message = make_message(paths.show_start, json.dumps({'name': 'parameterprobe'}))
+        probe_parameter_path = paths.show_parameter_set.format(show_name='parameterprobe')
+
+        strip = RecordingDriver(num_leds, max_global_brightness=conf.Strip.max_brightness_percent / 100.0)
+        control = MQTTControl(conf)
+        control.init_strip(strip)
+        shows['parameterprobe'] = ParameterProbe  # only for the worker process of this benchmark (it is forked)
+        try:
+            control.start_worker()
+            control.connect()
+            controller = threading.Thread(target=control.loop.run_forever, name='controller', daemon=True)
+            controller.start()
+
+            def command(message: paho.mqtt.client.MQTTMessage) -> None:
+                control.loop.call_soon_threadsafe(control.on_message, control.mqtt, None, message)
+
+            try:
+                for iteration in range(repeat + 1):  # the first iteration warms up and is not counted
+                    # start the show
+                    start_time = time.perf_counter()
+                    command(start_message)
+                    first_frame = strip.wait_for_frame(start_time)
+                    time.sleep(settle_sec)
+
+                    # change the brightness while the show is running
+                    brightness = 0.25 if iteration % 2 else 0.5
+                    parameter_time = time.perf_counter()
+                    command(make_message(paths.global_brightness_set, str(brightness)))
+                    brightness_frame = strip.wait_for_frame(parameter_time,
+                                                            lambda frame: abs(frame.brightness - brightness) < 1e-6)
+                    time.sleep(settle_sec)
+
+                    # change a show parameter
+                    probe_time = time.perf_counter()
+                    command(probe_message)
+                    strip.wait_for_frame(probe_time)
+                    time.sleep(settle_sec)
+                    color = (0, 255, 0) if iteration % 2 else (0, 0, 255)
+                    show_parameter_time = time.perf_counter()
+                    command(make_message(probe_parameter_path, json.dumps({'color': color})))
+                    show_parameter_frame = strip.wait_for_frame(show_parameter_time, lambda frame: frame.color == color)
+                    time.sleep(settle_sec)
+
+                    # switch the strip off
+                    stop_time = time.perf_counter()
+                    command(stop_message)
+                    command(clear_message)
+                    dark_frame = strip.wait_for_frame(stop_time, lambda frame: not frame.lit)
+                    time.sleep(settle_sec)
+
+                    if iteration:
+                        samples['time_to_first_frame'].append(first_frame.time - start_time)
+                        samples['brightness_to_visible_frame'].append(brightness_frame.time - parameter_time)
+                        samples['show_parameter_to_visible_frame'].append(
+                            show_parameter_frame.time - show_parameter_time)
+                        samples['time_to_dark'].append(dark_frame.time - stop_time)
+            finally:
+                control.loop.call_soon_threadsafe(control.stop_controller)
+                controller.join()
+        finally:
+            del shows['parameterprobe']
+
+    return {name: summarize(values) for name, values in samples.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measures the latency of show switches and parameter changes")
+    parser.add_argument('--num-leds', type=int, default=300, help="number of LEDs of the simulated strip")
+    parser.add_argument('--repeat', type=int, default=50, help="number of measurements for each latency")
+    parser.add_argument('--show', default='rainbow', help="the show that is started")
+    parser.add_argument('--parameters', type=json.loads, default={}, help="parameters of the show (as JSON)")
+    parser.add_argument('--json', metavar='FILE', help="write the results to a JSON file ('-' for stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run_benchmark(args.num_leds, args.repeat, args.show, args.parameters)
+
+    print("show switch latency: {show}, {num_leds} LEDs, {repeat} repetitions".format(
+        show=args.show, num_leds=args.num_leds, repeat=args.repeat))
+    print("{:<34}{:>10}{:>10}{:>10}".format("", "p50 [ms]", "p99 [ms]", "max [ms]"))
+    for name, stats in results.items():
+        print("{:<34}{p50_ms:>10.2f}{p99_ms:>10.2f}{max_ms:>10.2f}".format(name.replace('_', ' '), **stats))
+
+    if args.json:
+        write_json({'benchmark': 'showswitch', 'num_leds': args.num_leds, 'repeat': args.repeat,
+                    'show': args.show, 'parameters': args.parameters, 'results': results}, args.json)
+
+
+if __name__ == '__main__':
+    main()
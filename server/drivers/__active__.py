@@ -6,7 +6,8 @@
 from drivers import *
 
 drivers = {'apa102': apa102.APA102,
-           'dummy': dummy.DummyDriver
+           'dummy': dummy.DummyDriver,
+           'recorder': recorder.RecorderDriver
            }
 """\
 This maps the driver names for configuration to the according
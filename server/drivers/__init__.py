@@ -5,11 +5,17 @@
 """This module contains the drivers for the LED strips"""
 
 import logging
+import os
+import threading
+import time
 from abc import ABCMeta, abstractmethod
-from multiprocessing import Array as SyncedArray
-from multiprocessing import Value as SyncedValue
+from multiprocessing.shared_memory import SharedMemory
 
-__all__ = ['apa102', 'dummy', 'LEDStrip']
+import numpy as np
+
+from helpers.exceptions import ShowStopped
+
+__all__ = ['apa102', 'dummy', 'recorder', 'segmented', 'zone', 'AsyncOutput', 'LEDStrip']
 
 logger = logging.getLogger('102shows.drivers')
 
@@ -24,6 +30,22 @@ class LEDStrip(metaclass=ABCMeta):
         - Pixel resolution (number of dim-steps per color component) is 8-bit, so minimum brightness is ``0``
           and maximum brightness is ``255``
 
+    The color and brightness buffers are NumPy arrays, so whole frames can be written at once with
+    :func:`set_pixels` and :func:`fill` instead of calling :func:`set_pixel` for every single LED.
+
+    The whole strip state (colors, brightness values and the global brightness) is stored in one
+    contiguous block of memory. A copy of it lives in shared memory that all processes of 102shows can access,
+    so handing the strip state over to another process (:func:`sync_up` and :func:`sync_down`) is a single copy.
+
+    Every change of the buffers increases :py:attr:`frame_generation`. If :py:attr:`skip_identical_frames`
+    is set, :func:`show` uses this to avoid sending the same frame to the strip over and over again.
+
+    The entry point of a driver is :func:`transmit`, which sends the message buffer to the strip.
+    Drivers must not overwrite :func:`show`: it calls the :py:attr:`frame_hooks`, skips identical frames,
+    applies the global brightness and hands the frame to the :py:attr:`output_thread`, and only then
+    invokes :func:`transmit` (or :func:`transmit_message`). A driver that overwrites :func:`show` anyway
+    is reported with a warning.
+
     The constructor stores the given parameters and initializes the color and brightness buffers.
     Drivers can and should extend this method.
 
@@ -40,24 +62,53 @@ class LEDStrip(metaclass=ABCMeta):
         self.__is_frozen = False
         self._global_brightness = 1.0  #: global brightness multiplicator (0-1)
         self.__max_global_brightness = max_global_brightness
-
-        # buffers
-        self.color_buffer = [(0.0, 0.0, 0.0)] * self.num_leds
-        self.brightness_buffer = [1.0] * self.num_leds
+        self.__global_brightness_pending = False  # the global brightness is not in the message buffer yet
+        self.__shown_generation = -1  # frame generation that was transmitted last
+        self.__last_transmission = 0.0  # time.perf_counter() value of the last transmission
+        self.output_thread = None  #: the :py:class:`AsyncOutput` if :py:attr:`async_output` is used
+        self.frame_hooks = []  #: functions that :func:`show` calls before each frame, e.g. to apply pending updates
+
+        # frame statistics
+        self.frame_generation = 0  #: is increased every time the strip state changes
+        self.transmitted_frames = 0  #: number of frames that were actually sent to the strip
+        self.skipped_frames = 0  #: number of :func:`show` calls that were skipped because nothing changed
+
+        # buffers: colors (3 values per LED) + brightness (1 value per LED) + global brightness
+        self.state_buffer = np.zeros(4 * self.num_leds + 1, dtype=np.float32)
+        #: the whole strip state in one block, :py:attr:`color_buffer` and :py:attr:`brightness_buffer` are views on it
+        self.color_buffer = self.state_buffer[:3 * self.num_leds].reshape(self.num_leds, 3)
+        #: the ``(red, green, blue)`` color of each LED as a ``num_leds x 3`` array (``0.0 - 255.0``)
+        self.brightness_buffer = self.state_buffer[3 * self.num_leds:4 * self.num_leds]
         #: the individual dim factors for each LED (0-1), EXCLUDING the global dim factor
-
-        self.synced_red_buffer = SyncedArray('f', [0.0] * self.num_leds)
-        self.synced_green_buffer = SyncedArray('f', [0.0] * self.num_leds)
-        self.synced_blue_buffer = SyncedArray('f', [0.0] * self.num_leds)
-        self.synced_brightness_buffer = SyncedArray('f', self.brightness_buffer)
-        self.synced_global_brightness = SyncedValue('f', self._global_brightness)
+        self.brightness_buffer[:] = 1.0
+        self.state_buffer[-1] = self._global_brightness
+
+        # shared copy of the state buffer for the other processes
+        self.__shared_memory = SharedMemory(create=True, size=self.state_buffer.nbytes)
+        self.__shared_memory_owner = os.getpid()  # only the creating process may free the shared memory
+        self.synced_state_buffer = np.ndarray(self.state_buffer.shape, dtype=self.state_buffer.dtype,
+                                              buffer=self.__shared_memory.buf)
+        #: the shared counterpart of :py:attr:`state_buffer`
+        np.copyto(self.synced_state_buffer, self.state_buffer)
+
+    def __init_subclass__(cls, **kwargs):
+        """warns about drivers that overwrite :func:`show` instead of implementing :func:`transmit`"""
+        super().__init_subclass__(**kwargs)
+        if 'show' in cls.__dict__:
+            logger.warning("{driver} overwrites LEDStrip.show(): frame hooks, skipped frames and the global "
+                           "brightness only work if it implements transmit() instead".format(driver=cls.__name__))
 
     def __del__(self):
         """Invokes :py:func': `close` and deletes all the buffers."""
+        if not hasattr(self, 'synced_state_buffer'):  # the constructor failed before the buffers were allocated
+            return
         self.close()
 
-        del self.color_buffer, self.synced_red_buffer, self.synced_green_buffer, self.synced_blue_buffer
-        del self.brightness_buffer, self.synced_brightness_buffer
+        del self.color_buffer, self.brightness_buffer, self.state_buffer
+        del self.synced_state_buffer  # no view on the shared memory must be left before closing it
+        self.__shared_memory.close()
+        if os.getpid() == self.__shared_memory_owner:
+            self.__shared_memory.unlink()
 
         logger.info("Driver successfully closed")
 
@@ -83,6 +134,32 @@ class LEDStrip(metaclass=ABCMeta):
     Currently only used in :func:`lightshows.templates.base.sleep`
     """
 
+    skip_identical_frames = False
+    """\
+    If this is ``True``, :func:`show` does not send a frame to the strip
+    if the buffers did not change since the last transmission
+    (unless the last transmission is older than :py:attr:`forced_refresh_sec`)
+    """
+
+    fps = 60
+    """\
+    The target frame rate (frames per second) for animations on this strip,
+    e.g. in :py:class:`helpers.color.SmoothBlend` and :py:class:`lightshows.templates.colorcycle.ColorCycle`
+    """
+
+    forced_refresh_sec = 5
+    """\
+    The maximum time (in *seconds*) between two transmissions if :py:attr:`skip_identical_frames` is set.
+    Unchanged frames are still sent this often to keep the strip in sync.
+    """
+
+    async_output = False
+    """\
+    If this is ``True`` and the driver supports it (see :func:`message`), :func:`show` does not wait
+    for the transmission: it copies the message buffer and hands the copy to an :py:class:`AsyncOutput` thread.
+    So the next frame can be rendered while the last one is still being sent to the strip.
+    """
+
     @abstractmethod
     def close(self) -> None:
         """\
@@ -97,6 +174,8 @@ class LEDStrip(metaclass=ABCMeta):
         Freezes the strip.
         All state-changing methods (:func:`on_color_change` and :func:`on_brightness_change`)
         must not do anything anymore and leave the buffer unchanged.
+        :func:`show` raises :py:class:`helpers.exceptions.ShowStopped`,
+        so a lightshow that is still drawing on the strip ends.
         """
         self.__frozen = True
 
@@ -112,7 +191,7 @@ class LEDStrip(metaclass=ABCMeta):
         :return: ``(red, green, blue)`` as tuple
         """
 
-        return self.color_buffer[led_num]
+        return tuple(self.color_buffer[led_num].tolist())
 
     # do not overwrite this method:
     def set_pixel(self, led_num: int, red: float, green: float, blue: float) -> None:
@@ -133,6 +212,7 @@ class LEDStrip(metaclass=ABCMeta):
         if not self.__frozen:
             self.color_buffer[led_num] = (red, green, blue)
             self.on_color_change(led_num, red, green, blue)
+            self.frame_generation += 1
 
     @abstractmethod
     def on_color_change(self, led_num, red: float, green: float, blue: float) -> None:
@@ -146,6 +226,100 @@ class LEDStrip(metaclass=ABCMeta):
         :param blue: blue component of the pixel (``0.0 - 255.0``)
         """
 
+    # do not overwrite this method:
+    def set_pixels(self, leds, colors) -> None:
+        """\
+        Sets the buffer values of several pixels at once.
+        Indices beyond the ends of the strip are ignored, just like in :func:`set_pixel`.
+
+        :param leds: the pixels to be set, either as :py:class:`slice` or as a sequence of LED indices
+        :param colors: either a single ``(red, green, blue)`` color for all of the given pixels
+                       or a ``len(leds) x 3`` array with an individual color for each pixel (``0.0 - 255.0``)
+        """
+
+        if self.__frozen:
+            return
+
+        colors = np.asarray(colors, dtype=np.float32)
+
+        if not isinstance(leds, slice):
+            leds = np.asarray(leds, dtype=np.intp)
+            visible = (leds >= 0) & (leds < self.num_leds)
+            if not visible.all():  # some pixels are invisible, so ignore them
+                if colors.ndim == 2:
+                    colors = colors[visible]
+                leds = leds[visible]
+
+        self.color_buffer[leds] = colors
+        self.on_pixels_change(leds)
+        self.frame_generation += 1
+
+    def fill(self, color: tuple) -> None:
+        """\
+        Sets all pixels in the buffer to the same color
+
+        :param color: ``(red, green, blue)`` tuple (``0.0 - 255.0``)
+        """
+        self.set_pixels(slice(None), color)
+
+    def on_pixels_change(self, leds) -> None:
+        """\
+        Changes the message buffer after several pixels were changed in the global color buffer.
+        The default implementation calls :func:`on_color_change` for each of the pixels.
+        Drivers should overwrite this method with something faster.
+
+        :param leds: the changed pixels, either as :py:class:`slice` or as an array of LED indices
+        """
+        for led_num in range(self.num_leds)[leds] if isinstance(leds, slice) else leds:
+            red, green, blue = self.color_buffer[led_num].tolist()
+            self.on_color_change(int(led_num), red, green, blue)
+
+    def on_brightnesses_change(self, leds) -> None:
+        """\
+        Changes the message buffer after the brightness of several LEDs was changed.
+        The default implementation calls :func:`on_brightness_change` for each of the LEDs.
+        Drivers should overwrite this method with something faster.
+
+        :param leds: the changed LEDs, either as :py:class:`slice` or as an array of LED indices
+        """
+        for led_num in range(self.num_leds)[leds] if isinstance(leds, slice) else leds:
+            self.on_brightness_change(int(led_num))
+
+    def encoded_frame(self) -> np.ndarray:
+        """\
+        Returns the driver-specific encoding of the current colors, e.g. the color bytes of the message buffer.
+        Together with the colors, it can be stored and later restored by :func:`load_frame`
+        (see :py:mod:`helpers.framecache`).
+        The default implementation returns an empty ``num_leds x 0`` array.
+
+        :return: a ``num_leds x n`` array of bytes (:py:class:`numpy.uint8`)
+        """
+        return np.empty((self.num_leds, 0), dtype=np.uint8)
+
+    def load_frame(self, colors, encoded) -> None:
+        """\
+        Sets all pixels to a frame that was stored before.
+
+        :param colors: ``num_leds x 3`` array with the color of each pixel (``0 - 255``)
+        :param encoded: what :func:`encoded_frame` returned for these colors
+        """
+        if self.__frozen:
+            return
+
+        self.color_buffer[:] = colors
+        self.on_frame_load(encoded)
+        self.frame_generation += 1
+
+    def on_frame_load(self, encoded) -> None:
+        """\
+        Changes the message buffer after a stored frame was loaded into the color buffer (see :func:`load_frame`).
+        The default implementation calls :func:`on_pixels_change` for all pixels.
+        Drivers can overwrite this method to copy the ``encoded`` frame into the message buffer instead.
+
+        :param encoded: what :func:`encoded_frame` returned for the frame
+        """
+        self.on_pixels_change(slice(None))
+
     def set_pixel_bytes(self, led_num: int, rgb_color: int) -> None:
         """\
         Changes the pixel ``led_num`` to the given color **in the buffer**.
@@ -190,16 +364,89 @@ class LEDStrip(metaclass=ABCMeta):
         b = rgb_color & 0x0000FF
         return r, g, b
 
-    @abstractmethod
+    # do not overwrite this method:
     def show(self) -> None:
         """\
-        **Subclasses should overwrite this method**
+        Shows the buffered pixels on the strip by invoking :func:`transmit`.
+        If :py:attr:`skip_identical_frames` is set, nothing is sent if the frame did not change
+        since the last transmission and that transmission is less than :py:attr:`forced_refresh_sec` ago.
+        Before that, the functions in :py:attr:`frame_hooks` are called.
+
+        :raises ShowStopped: if the strip is frozen (see :func:`freeze`)
+        """
+        if self.__frozen:
+            raise ShowStopped()
+
+        for hook in self.frame_hooks:  # frame boundary: changes that were collected since the last frame
+            hook()
+
+        now = time.perf_counter()
+
+        if self.skip_identical_frames and self.__shown_generation == self.frame_generation:
+            if now - self.__last_transmission < self.forced_refresh_sec:
+                self.skipped_frames += 1
+                return
+
+        self.__shown_generation = self.frame_generation
+        self.__last_transmission = now
+        if self.__global_brightness_pending:  # apply the global brightness only once per frame
+            self.__global_brightness_pending = False
+            self.on_global_brightness_change()
+        if self.async_output and self.message() is not None:
+            self.submit_message()
+        else:
+            self.transmit()
+        self.transmitted_frames += 1
+
+    @abstractmethod
+    def transmit(self) -> None:
+        """\
+        **Subclasses must overwrite this method** (instead of :func:`show`)
 
         This method should show the buffered pixels on the strip,
         e.g. write the message buffer to the port on which the strip is connected.
+        It is invoked by :func:`show` for every frame that is actually sent.
         """
         pass
 
+    def message(self):
+        """\
+        Returns the message buffer that :func:`transmit` sends to the strip.
+        Drivers that return a buffer here must also implement :func:`transmit_message`,
+        then they support :py:attr:`async_output`.
+        The default implementation returns ``None`` (no support for :py:attr:`async_output`).
+
+        :return: the message buffer (a :py:class:`bytearray`), a :py:class:`tuple` of buffers
+                 that form the message one after the other (e.g. after :func:`rotate`) or ``None``
+        """
+        return None
+
+    def transmit_message(self, message) -> None:
+        """\
+        Sends a copy of the message buffer (see :func:`message`) to the strip.
+        It is invoked by the :py:class:`AsyncOutput` thread.
+
+        :param message: the message to be sent
+        """
+        raise NotImplementedError
+
+    def submit_message(self) -> None:
+        """hands the current message buffer over to the :py:attr:`output_thread` (which is started if necessary)"""
+        message = self.message()
+        if self.output_thread is None or self.output_thread.pid != os.getpid():  # no output thread in this process
+            size = sum(map(len, message)) if isinstance(message, tuple) else len(message)
+            self.output_thread = AsyncOutput(self.transmit_message, size)
+        self.output_thread.submit(message)
+
+    def stop_output(self) -> None:
+        """\
+        Waits until the :py:attr:`output_thread` has sent the latest frame, then stops it.
+        Drivers that support :py:attr:`async_output` should call this in :func:`close`.
+        """
+        if self.output_thread is not None and self.output_thread.pid == os.getpid():
+            self.output_thread.stop()
+        self.output_thread = None
+
     def rotate(self, positions: int = 1) -> None:
         """\
         Treating the internal leds array as a circular buffer, rotate it by the specified number of positions.
@@ -207,10 +454,22 @@ class LEDStrip(metaclass=ABCMeta):
 
         :param positions: the number of steps to rotate
         """
-        self.color_buffer = self.color_buffer[positions:] + self.color_buffer[:positions]
-        for led_num in range(self.num_leds):
-            r, g, b = self.get_pixel(led_num)
-            self.on_color_change(led_num, r, g, b)
+        if not self.num_leds:
+            return
+        positions %= self.num_leds
+        self.color_buffer[:] = np.concatenate((self.color_buffer[positions:], self.color_buffer[:positions]))
+        self.on_rotate(positions)
+        self.frame_generation += 1
+
+    def on_rotate(self, positions: int) -> None:
+        """\
+        Changes the message buffer after the color buffer was rotated (see :func:`rotate`).
+        The default implementation calls :func:`on_pixels_change` for all pixels.
+        Drivers can overwrite this method to rotate their encoded message instead of encoding it again.
+
+        :param positions: the number of steps the color buffer was rotated
+        """
+        self.on_pixels_change(slice(None))
 
     def set_brightness(self, led_num: int, brightness: float) -> None:
         """\
@@ -232,6 +491,35 @@ class LEDStrip(metaclass=ABCMeta):
 
         self.brightness_buffer[led_num] = brightness
         self.on_brightness_change(led_num)
+        self.frame_generation += 1
+
+    # do not overwrite this method:
+    def set_brightnesses(self, leds, brightnesses) -> None:
+        """\
+        Sets the brightness of several LEDs at once. A global multiplier is applied.
+        Indices beyond the ends of the strip are ignored, just like in :func:`set_pixels`.
+
+        :param leds: the LEDs to be set, either as :py:class:`slice` or as a sequence of LED indices
+        :param brightnesses: either a single brightness for all of the given LEDs
+                             or an array with an individual brightness for each LED (``0.0 - 1.0``)
+        """
+
+        if self.__frozen:
+            return
+
+        brightnesses = np.clip(brightnesses, 0.0, 1.0)
+
+        if not isinstance(leds, slice):
+            leds = np.asarray(leds, dtype=np.intp)
+            visible = (leds >= 0) & (leds < self.num_leds)
+            if not visible.all():  # some LEDs are invisible, so ignore them
+                if brightnesses.ndim == 1:
+                    brightnesses = brightnesses[visible]
+                leds = leds[visible]
+
+        self.brightness_buffer[leds] = brightnesses
+        self.on_brightnesses_change(leds)
+        self.frame_generation += 1
 
     @abstractmethod
     def on_brightness_change(self, led_num: int) -> None:
@@ -246,6 +534,9 @@ class LEDStrip(metaclass=ABCMeta):
         """\
         Sets a global brightness multiplicator which applies to every single LED's brightness.
 
+        The message buffer is not changed here: the global brightness is applied when the next frame is shown
+        (see :func:`on_global_brightness_change`), so many changes between two frames cost nothing.
+
         :param brightness: the global brightness (``0.0 - 1.0``) multiplicator to be set
         """
         if brightness < 0.0:
@@ -255,13 +546,20 @@ class LEDStrip(metaclass=ABCMeta):
         else:
             self._global_brightness = brightness
 
-        for led_num in range(self.num_leds):
-            self.on_brightness_change(led_num)
+        self.__global_brightness_pending = True
+        self.frame_generation += 1
+
+    def on_global_brightness_change(self) -> None:
+        """\
+        Changes the message buffer after the global brightness was changed.
+        It is invoked by :func:`show` (at most once per frame) before the frame is sent.
+        The default implementation calls :func:`on_brightnesses_change` for all LEDs.
+        """
+        self.on_brightnesses_change(slice(None))
 
     def clear_buffer(self) -> None:
         """Resets all pixels in the color buffer to ``(0,0,0)``."""
-        for led_num in range(self.num_leds):
-            self.set_pixel(led_num, 0, 0, 0)
+        self.fill((0, 0, 0))
 
     def clear_strip(self) -> None:
         """Clears the color buffer, then invokes a blackout on the strip by calling :py:func:`show`"""
@@ -275,31 +573,109 @@ class LEDStrip(metaclass=ABCMeta):
         """
         logger.info("sync_up()")
 
-        self.synced_global_brightness.value = self._global_brightness
-
-        for led_num, (red, green, blue) in enumerate(self.color_buffer):
-            # colors
-            self.synced_red_buffer[led_num] = red
-            self.synced_green_buffer[led_num] = green
-            self.synced_blue_buffer[led_num] = blue
-
-            # brightness
-            self.synced_brightness_buffer[led_num] = self.brightness_buffer[led_num]
+        self.state_buffer[-1] = self._global_brightness
+        np.copyto(self.synced_state_buffer, self.state_buffer)
 
     def sync_down(self) -> None:
         """Reads the shared color and brightness buffers and copies them to the local buffers"""
         logger.info("sync_down()")
 
-        self._global_brightness = self.synced_global_brightness.value
+        np.copyto(self.state_buffer, self.synced_state_buffer)
+        self._global_brightness = float(self.state_buffer[-1])
 
-        for led_num, _ in enumerate(self.color_buffer):
-            # colors
-            red = self.synced_red_buffer[led_num]
-            green = self.synced_green_buffer[led_num]
-            blue = self.synced_blue_buffer[led_num]
-            self.color_buffer[led_num] = (red, green, blue)
-            self.on_color_change(led_num, red, green, blue)
+        # regenerate the message buffer
+        self.on_pixels_change(slice(None))
+        self.on_brightnesses_change(slice(None))
 
-            # brightness
-            self.brightness_buffer[led_num] = self.synced_brightness_buffer[led_num]
-            self.on_brightness_change(led_num)
+        self.frame_generation += 1
+
+
+class AsyncOutput:
+    """\
+    A thread that sends frames to the strip while the next frame is being rendered
+    (see :py:attr:`LEDStrip.async_output`).
+
+    :func:`submit` copies a message into the pending buffer and returns immediately.
+    The thread swaps the pending buffer with its own front buffer and sends that one.
+    If a new message is submitted before the thread took the pending one, the pending message
+    is overwritten (latest frame wins), so the strip never falls behind the animation.
+
+    :param send: function that sends a message to the strip
+    :param size: size of the messages in bytes
+    """
+
+    def __init__(self, send, size: int):
+        self.send = send  #: function that sends a message to the strip
+        self.pid = os.getpid()  #: the thread belongs to this process
+
+        self.pending = bytearray(size)  #: the message that waits to be sent
+        self.front = bytearray(size)  #: the message that is being sent
+        self.has_pending = False  #: is there a message in :py:attr:`pending`?
+        self.running = True
+        self.busy = False  #: is the thread sending a message right now?
+        self.condition = threading.Condition()
+
+        self.submitted_frames = 0  #: number of messages that were submitted
+        self.sent_frames = 0  #: number of messages that were sent
+        self.overwritten_frames = 0  #: number of messages that were overwritten by a newer one before being sent
+        self.dropped_frames = 0  #: number of messages that could not be sent because of an error
+
+        self.thread = threading.Thread(target=self.run, name='102shows-output', daemon=True)
+        self.thread.start()
+
+    def submit(self, message) -> None:
+        """\
+        hands a message over to the thread
+
+        :param message: the message or a :py:class:`tuple` of its parts
+                        (it is copied, so the caller can change it right away)
+        """
+        with self.condition:
+            if self.has_pending:
+                self.overwritten_frames += 1
+            if isinstance(message, tuple):
+                offset = 0
+                for part in message:
+                    self.pending[offset:offset + len(part)] = part
+                    offset += len(part)
+            else:
+                self.pending[:] = message
+            self.has_pending = True
+            self.submitted_frames += 1
+            self.condition.notify_all()
+
+    def run(self) -> None:
+        """the main loop of the thread: sends the pending message whenever there is one"""
+        while True:
+            with self.condition:
+                while self.running and not self.has_pending:
+                    self.condition.wait()
+                if not self.has_pending:  # stopped and nothing left to send
+                    return
+                self.pending, self.front = self.front, self.pending
+                self.has_pending = False
+                self.busy = True
+
+            try:
+                self.send(self.front)
+                self.sent_frames += 1
+            except OSError as error:
+                logger.error("Could not send frame to the strip: {}".format(error))
+                self.dropped_frames += 1
+
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+
+    def flush(self) -> None:
+        """waits until all submitted messages are sent (or overwritten)"""
+        with self.condition:
+            while self.has_pending or self.busy:
+                self.condition.wait()
+
+    def stop(self) -> None:
+        """sends the pending message (if there is one), then ends the thread"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
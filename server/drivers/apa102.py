@@ -2,11 +2,69 @@
 # (c) 2015 Martin Erzberger, 2016-2017 Simon Leiner
 # licensed under the GNU Public License, version 2
 
+import functools
+
 import spidev
-from multiprocessing import Array as SyncedArray
+
+import numpy as np
 
 from drivers import LEDStrip
-from helpers.color import grayscale_correction
+from helpers.color import grayscale_correction, grayscale_correction_array
+
+GRAYSCALE_TABLE = np.array([grayscale_correction(lightness) for lightness in range(256)], dtype=np.uint8)
+"""maps each 8-bit lightness value to the CIE 1931 corrected PWM duty cycle"""
+
+PREFIX_TABLE = np.array([0b11100000 | brightness_byte for brightness_byte in range(32)], dtype=np.uint8)
+"""maps each 5-bit brightness value to the according APA102 prefix byte"""
+
+
+HDR_STEPS = 16
+"""the HDR encoder looks up color components in steps of ``1 / HDR_STEPS``"""
+
+HDR_BRIGHTNESS_LEVELS = 4096
+"""the HDR encoder looks up brightness values in ``HDR_BRIGHTNESS_LEVELS`` steps from 0 to 1"""
+
+
+@functools.lru_cache(maxsize=1)
+def hdr_tables() -> tuple:
+    """\
+    Builds the lookup tables of the HDR encoder (see :func:`APA102.encode_hdr`) on first use.
+    The target intensity of each color channel is a 16-bit value (``0 - 65535``).
+
+    :return: four read-only arrays:
+
+             - the 16-bit CIE 1931 corrected intensity of each color component in steps of ``1 / HDR_STEPS``
+             - the 16-bit CIE 1931 corrected dim factor of each of the ``HDR_BRIGHTNESS_LEVELS`` brightness values
+             - the smallest 5-bit brightness (``0 - 31``) that can show each 16-bit intensity
+             - a ``32 x 65536`` array with the duty cycle that shows each intensity with each 5-bit brightness
+    """
+    color_intensity = grayscale_correction_array(np.arange(255 * HDR_STEPS + 1) / HDR_STEPS, max_out=65535)
+    dim_factor = grayscale_correction_array(np.linspace(0, 1, HDR_BRIGHTNESS_LEVELS), max_in=1, max_out=65535)
+
+    intensity = np.arange(65536)
+    min_brightness = np.ceil(intensity * 31 / 65535).astype(np.uint8)
+    duty_cycle = np.zeros((32, 65536), dtype=np.uint8)
+    for brightness_byte in range(1, 32):
+        duty_cycle[brightness_byte] = np.minimum(np.rint(intensity * 31 * 255 / (brightness_byte * 65535)), 255)
+
+    tables = color_intensity, dim_factor, min_brightness, duty_cycle
+    for table in tables:
+        table.setflags(write=False)
+    return tables
+
+
+def spidev_buffer_size(default: int = 4096) -> int:
+    """\
+    Reads the maximum size of a single SPI transfer from the spidev kernel module
+
+    :param default: the value to return if the size cannot be read
+    :return: the buffer size in bytes
+    """
+    try:
+        with open('/sys/module/spidev/parameters/bufsiz') as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return default
 
 
 class APA102(LEDStrip):
@@ -47,30 +105,53 @@ class APA102(LEDStrip):
         Essentially the driver sends additional zeroes to LED 1 as long as it takes for the last color frame
         to make it down the line to the last LED.
 
-    Restrictions of this driver:
-        - strips cannot have more than 1024 LEDs
+    The complete SPI message (start frame, LED frames and end frame) lives in a single preallocated buffer,
+    :py:attr:`spi_message`. Only the LED frames in it are ever changed and :func:`transmit` sends the whole buffer
+    at once, split into chunks of at most :py:attr:`max_transfer_bytes` bytes.
+
+    In HDR mode (``hdr``), the 5-bit brightness and the 8-bit duty cycles of each LED are chosen together
+    (see :func:`encode_hdr`), which makes fades at low brightness much smoother.
 
     The constructor initializes the strip connection via SPI
+
+    :param num_leds: number of LEDs in the strip
+    :param max_clock_speed_hz: maximum clock speed (Hz) of the bus
+    :param max_global_brightness: maximum global brightness
+    :param bus: number of the SPI bus
+    :param device: chip select (slave device) on the SPI bus
+    :param hdr: use the HDR encoder
     """
 
-    def __init__(self, num_leds: int, max_clock_speed_hz: int = 4000000, max_global_brightness: float = 1.0):
+    def __init__(self, num_leds: int, max_clock_speed_hz: int = 4000000, max_global_brightness: float = 1.0,
+                 bus: int = 0, device: int = 1, hdr: bool = False):
         super().__init__(num_leds, max_clock_speed_hz, max_global_brightness)
-
-        # check if we do not have too much LEDs in the strip
-        if self.num_leds > 1024:
-            raise Exception("The APA102 LED driver does not support strips of more than 1024 LEDs")
+        self.hdr = hdr  #: use the HDR encoder (see :func:`encode_hdr`)
 
         # SPI connection
         self.spi = spidev.SpiDev()  # Init the SPI device
-        self.spi.open(0, 1)  # Open SPI port 0, slave device (CS)  1
+        self.spi.open(bus, device)  # Open the SPI bus and slave device (CS)
         self.spi.max_speed_hz = self.max_clock_speed_hz  # should not be higher than 8000000
-        self.leds = [self.led_prefix(self._global_brightness), 0, 0, 0] * self.num_leds  # 4 bytes per LED
-        self.synced_buffer = SyncedArray('i', self.leds)
+        self.max_transfer_bytes = spidev_buffer_size()  #: the maximum number of bytes spidev sends in one transfer
 
         # Strip parameters
         self.max_refresh_time_sec = 25E-6 * self.num_leds  #: the maximum time the whole strip takes to refresh
         self.__sk9822_compatibility_mode = True  #: be compatible with SK9822 chips? see: https://goo.gl/ePlcaI
 
+        # SPI message: start frame + 4 bytes per LED + (SK9822 frame) + end frame
+        start_frame = self.spi_start_frame()
+        led_frames = [self.led_prefix(self._global_brightness), 0, 0, 0] * self.num_leds
+        end_frame = self.spi_end_frame(self.num_leds)
+        if self.__sk9822_compatibility_mode:
+            end_frame = self.spi_start_frame() + end_frame
+        self.spi_message = bytearray(start_frame + led_frames + end_frame)  #: the complete message for :func:`transmit`
+
+        self.leds = memoryview(self.spi_message)[len(start_frame):len(start_frame) + len(led_frames)]
+        #: the LED frames inside :py:attr:`spi_message`
+        self.led_frames = np.frombuffer(self.leds, dtype=np.uint8).reshape(self.num_leds, 4)
+        #: a writable ``num_leds x 4`` view on :py:attr:`leds` for the batch encoder
+        self.rotation = 0
+        #: the frame of LED ``i`` is at ``(i + rotation) % num_leds`` in :py:attr:`leds` (see :func:`on_rotate`)
+
     def on_color_change(self, led_num, red: float, green: float, blue: float) -> None:
         """\
         Changes the message buffer after a pixel was changed in the global color buffer.
@@ -82,10 +163,15 @@ class APA102(LEDStrip):
         :param green: green component of the pixel (``0.0 - 255.0``)
         :param blue: blue component of the pixel (``0.0 - 255.0``)
         """
+        self.unrotate()
+        if self.hdr:  # the prefix depends on the color, too
+            self.encode_hdr_leds(slice(led_num, led_num + 1))
+            return
+
         # get correct duty cycle for desired lightness
-        r_duty = grayscale_correction(red)
-        g_duty = grayscale_correction(green)
-        b_duty = grayscale_correction(blue)
+        r_duty = self.grayscale_duty_cycle(red)
+        g_duty = self.grayscale_duty_cycle(green)
+        b_duty = self.grayscale_duty_cycle(blue)
 
         # for each led the spi message consists of 4 bytes:
         #   1. Prefix: as generated by led_prefix(brightness) - not set in this function
@@ -97,16 +183,193 @@ class APA102(LEDStrip):
         self.leds[start_index + 2] = g_duty
         self.leds[start_index + 1] = b_duty
 
+    def on_pixels_change(self, leds) -> None:
+        """\
+        Encodes the colors of several changed pixels into the message buffer in one pass.
+        To send the message buffer to the strip and show the changes, you must invoke :func:`show`
+
+        :param leds: the changed pixels, either as :py:class:`slice` or as an array of LED indices
+        """
+        self.unrotate()
+        if self.hdr:
+            self.encode_hdr_leds(leds)
+        else:
+            self.led_frames[leds, 1:] = self.encode_colors(self.color_buffer[leds])
+
+    def encoded_frame(self) -> np.ndarray:
+        """\
+        Returns a copy of the color bytes (blue, green, red) of the message buffer
+
+        :return: ``num_leds x 3`` array of bytes (``num_leds x 0`` in HDR mode, where the color bytes
+                 also depend on the brightness)
+        """
+        if self.hdr:
+            return super().encoded_frame()
+        self.unrotate()
+        return self.led_frames[:, 1:].copy()
+
+    def on_frame_load(self, encoded) -> None:
+        """\
+        Copies the color bytes of a stored frame (see :func:`encoded_frame`) into the message buffer
+
+        :param encoded: ``num_leds x 3`` array of bytes
+        """
+        self.unrotate()
+        if self.hdr:
+            self.encode_hdr_leds(slice(None))
+        else:
+            self.led_frames[:, 1:] = encoded
+
     def on_brightness_change(self, led_num: int) -> None:
         """
         For the LED at ``led_num``, regenerate the prefix and store the new prefix to the message buffer
 
         :param led_num: The index of the LED whose prefix should be regenerated
         """
+        self.unrotate()
+        if self.hdr:  # the color bytes depend on the brightness, too
+            self.encode_hdr_leds(slice(led_num, led_num + 1))
+            return
 
         brightness = self._global_brightness * self.brightness_buffer[led_num]
         self.leds[4 * led_num] = self.led_prefix(brightness)
 
+    def encode(self) -> None:
+        """\
+        Regenerates the whole message buffer :py:attr:`leds` from the color and brightness buffers in one pass.
+        """
+        self.rotation = 0  # everything is encoded again anyway
+        if self.hdr:
+            self.encode_hdr_leds(slice(None))
+            return
+        self.led_frames[:, 1:] = self.encode_colors(self.color_buffer)
+        self.led_frames[:, 0] = self.encode_brightness(self._global_brightness * self.brightness_buffer)
+
+    @staticmethod
+    def grayscale_duty_cycle(lightness: float) -> int:
+        """\
+        Looks up the grayscale corrected duty cycle for a single color component in :py:data:`GRAYSCALE_TABLE`
+
+        :param lightness: color component (``0.0 - 255.0``)
+        :return: the duty cycle byte
+        """
+        lightness = round(lightness)
+        if lightness <= 0:
+            return 0
+        elif lightness >= 255:
+            return 255
+        return int(GRAYSCALE_TABLE[lightness])
+
+    @staticmethod
+    def encode_colors(colors: np.ndarray) -> np.ndarray:
+        """\
+        Converts an array of colors into the last three bytes of the 4-byte SPI messages of the according LEDs
+
+        :param colors: ``n x 3`` array of ``(red, green, blue)`` colors (``0.0 - 255.0``)
+        :return: ``n x 3`` array of ``(blue, green, red)`` duty cycle bytes
+        """
+        lightness = np.clip(np.rint(colors), 0, 255).astype(np.uint8)
+        return GRAYSCALE_TABLE[lightness[:, ::-1]]
+
+    @staticmethod
+    def encode_brightness(brightness: np.ndarray) -> np.ndarray:
+        """\
+        Converts an array of brightness values into the first bytes of the 4-byte SPI messages of the according LEDs
+
+        Usually, all LEDs (or a few groups of them) have the same brightness. If all values are the same,
+        the prefix is computed once. Otherwise, it is computed once for each distinct value
+        and the prefixes are looked up from the resulting table.
+
+        :param brightness: array of brightness values (``0.0 - 1.0``), INCLUDING the global dim factor
+        :return: array of prefix bytes
+        """
+        brightness = np.asarray(brightness)
+        if not brightness.size:
+            return np.empty(brightness.shape, dtype=np.uint8)
+
+        first = brightness.flat[0]
+        if (brightness == first).all():  # uniform brightness
+            prefix = PREFIX_TABLE[grayscale_correction_array(np.array([first]), max_in=1, max_out=31)[0]]
+            return np.full(brightness.shape, prefix, dtype=np.uint8)
+
+        values, inverse = np.unique(brightness, return_inverse=True)
+        table = PREFIX_TABLE[grayscale_correction_array(values, max_in=1, max_out=31)]
+        return table[inverse].reshape(brightness.shape)
+
+    @staticmethod
+    def encode_hdr(colors: np.ndarray, brightness: np.ndarray) -> np.ndarray:
+        """\
+        Converts colors and brightness values into complete 4-byte SPI messages, using the 5-bit brightness
+        and the 8-bit duty cycles together:
+
+        The target intensity of each channel (the corrected color component times the corrected brightness)
+        is a 16-bit value. The 5-bit brightness of each LED is the smallest one that can show the brightest
+        channel of the LED, so the duty cycles use as many of their 256 steps as possible.
+        Everything is looked up from precomputed tables (see :py:func:`hdr_tables`).
+
+        :param colors: ``n x 3`` array of ``(red, green, blue)`` colors (``0.0 - 255.0``)
+        :param brightness: array of ``n`` brightness values (``0.0 - 1.0``), INCLUDING the global dim factor
+        :return: ``n x 4`` array of ``(prefix, blue, green, red)`` bytes
+        """
+        color_intensity, dim_factor, min_brightness, duty_cycle = hdr_tables()
+        colors = np.clip(np.rint(np.asarray(colors, dtype=np.float64) * HDR_STEPS), 0, 255 * HDR_STEPS)
+        brightness = np.clip(np.rint(np.asarray(brightness, dtype=np.float64) * (HDR_BRIGHTNESS_LEVELS - 1)),
+                             0, HDR_BRIGHTNESS_LEVELS - 1)
+
+        dim = dim_factor[brightness.astype(np.intp)]
+        intensity = (color_intensity[colors.astype(np.intp)] * dim[:, np.newaxis] + 32767) // 65535
+        brightness_bytes = min_brightness[intensity.max(axis=1)]
+
+        frames = np.empty((len(intensity), 4), dtype=np.uint8)
+        frames[:, 0] = PREFIX_TABLE[brightness_bytes]
+        frames[:, 1:] = duty_cycle[brightness_bytes[:, np.newaxis], intensity[:, ::-1]]
+        return frames
+
+    def encode_hdr_leds(self, leds) -> None:
+        """\
+        Regenerates the complete 4-byte SPI messages of several LEDs with the HDR encoder (see :func:`encode_hdr`)
+
+        :param leds: the LEDs, either as :py:class:`slice` or as an array of LED indices
+        """
+        self.led_frames[leds] = self.encode_hdr(self.color_buffer[leds],
+                                                self._global_brightness * self.brightness_buffer[leds])
+
+    def on_brightnesses_change(self, leds) -> None:
+        """\
+        Regenerates the prefixes of several LEDs in the message buffer in one pass
+
+        :param leds: the changed LEDs, either as :py:class:`slice` or as an array of LED indices
+        """
+        self.unrotate()
+        if self.hdr:
+            self.encode_hdr_leds(leds)
+        else:
+            self.led_frames[leds, 0] = self.encode_brightness(self._global_brightness * self.brightness_buffer[leds])
+
+    def on_rotate(self, positions: int) -> None:
+        """\
+        Rotates the message after the color buffer was rotated (see :py:func:`drivers.LEDStrip.rotate`).
+
+        If all LEDs have the same brightness, the encoded LED frames stay where they are and only
+        :py:attr:`rotation` changes: :func:`message` then consists of two slices of :py:attr:`leds`.
+        Nothing is encoded or copied until another change needs the LED frames in order (see :func:`unrotate`).
+        Otherwise, the colors are encoded again (the brightness of each LED does not rotate).
+
+        :param positions: the number of steps the color buffer was rotated
+        """
+        brightness = self.brightness_buffer
+        if (brightness == brightness[0]).all():
+            self.rotation = (self.rotation + positions) % self.num_leds
+        else:
+            self.on_pixels_change(slice(None))
+
+    def unrotate(self) -> None:
+        """moves the LED frames in :py:attr:`leds` back into the order of the LEDs (see :func:`on_rotate`)"""
+        if self.rotation:
+            frames = self.led_frames
+            frames[:] = np.concatenate((frames[self.rotation:], frames[:self.rotation]))
+            self.rotation = 0
+
     @classmethod
     def led_prefix(cls, brightness: float) -> int:
         """
@@ -127,7 +390,8 @@ class APA102(LEDStrip):
         return prefix_byte
 
     def close(self) -> None:
-        """Closes the SPI connection to the strip."""
+        """Sends the last frame (if :py:attr:`async_output` is used), then closes the SPI connection to the strip."""
+        self.stop_output()
         self.spi.close()
 
     @staticmethod
@@ -139,13 +403,34 @@ class APA102(LEDStrip):
         """
         return [0, 0, 0, 0]  # Start frame, 4 empty bytes <=> 32 zero bits
 
-    def show(self) -> None:
+    def transmit(self) -> None:
         """sends the buffered color and brightness values to the strip"""
-        self.spi.xfer2(self.spi_start_frame())
-        self.spi.xfer2(self.leds)  # SPI takes up to 4096 Integers. So we are fine for up to 1024 LEDs.
-        if self.__sk9822_compatibility_mode:
-            self.spi.xfer2(self.spi_start_frame())
-        self.spi.xfer2(self.spi_end_frame(self.num_leds))
+        self.transmit_message(self.message())
+
+    def message(self):
+        """\
+        :return: the complete SPI message :py:attr:`spi_message` or, if the LED frames are rotated
+                 (see :func:`on_rotate`), a :py:class:`tuple` of its parts in the order in which they are sent
+        """
+        if not self.rotation:
+            return self.spi_message
+
+        message = memoryview(self.spi_message)
+        start = len(self.spi_start_frame())  # the LED frames begin after the start frame
+        split = start + 4 * self.rotation
+        stop = start + len(self.leds)
+        return message[:start], message[split:stop], message[start:split], message[stop:]
+
+    def transmit_message(self, message) -> None:
+        """\
+        sends an SPI message to the strip
+
+        :param message: :py:attr:`spi_message`, a copy of it or a :py:class:`tuple` of its parts
+        """
+        for part in message if isinstance(message, tuple) else (message,):
+            part = memoryview(part)
+            for offset in range(0, len(part), self.max_transfer_bytes):  # spidev cannot send more in one go
+                self.spi.writebytes2(part[offset:offset + self.max_transfer_bytes])
 
     @staticmethod
     def spi_end_frame(num_leds) -> list:
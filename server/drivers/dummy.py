@@ -19,10 +19,19 @@ class DummyDriver(LEDStrip):
     def on_color_change(self, led_num, red: float, green: float, blue: float) -> None:
         pass
 
+    def on_pixels_change(self, leds) -> None:
+        pass
+
     def on_brightness_change(self, led_num: int) -> None:
         pass
 
-    def show(self) -> None:
+    def on_brightnesses_change(self, leds) -> None:
+        pass
+
+    def transmit(self) -> None:
+        if not logger.isEnabledFor(logging.DEBUG):  # formatting the whole strip state is expensive
+            return
+
         logger.debug("FAKE LED STRIP SHOWS: ")
         for led_num in range(self.num_leds):
             red, green, blue = self.get_pixel(led_num)
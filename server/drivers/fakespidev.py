@@ -0,0 +1,85 @@
+# Fake spidev module
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+A stand-in for the :py:mod:`spidev` module that records all transfers instead of talking to real hardware.
+It can replace :py:mod:`spidev` in tests and benchmarks, for example: ::
+
+    with unittest.mock.patch.object(drivers.apa102, 'spidev', drivers.fakespidev):
+        strip = drivers.apa102.APA102(num_leds=300)
+
+If :py:attr:`SpiDev.simulate_timing` is set, every transfer blocks for as long as
+the real bus would need to clock out the data at :py:attr:`SpiDev.max_speed_hz`.
+"""
+
+import time
+
+
+class Transfer:
+    """A single recorded SPI transfer"""
+
+    def __init__(self, data: bytes, start_time: float, end_time: float):
+        self.data = data  #: the bytes that were sent
+        self.start_time = start_time  #: :py:func:`time.perf_counter` timestamp when the transfer began
+        self.end_time = end_time  #: :py:func:`time.perf_counter` timestamp when the transfer was finished
+
+    @property
+    def duration_sec(self) -> float:
+        """time (in seconds) the transfer took"""
+        return self.end_time - self.start_time
+
+
+class SpiDev:
+    """Mimics :py:class:`spidev.SpiDev` and stores every transfer in :py:attr:`transfers`"""
+
+    bufsiz = 4096
+    """maximum number of bytes per transfer, like ``/sys/module/spidev/parameters/bufsiz`` of the kernel module"""
+
+    simulate_timing = True
+    """block during each transfer for the time the real bus would need"""
+
+    def __init__(self):
+        self.bus = None  #: SPI bus number given to :py:func:`open`
+        self.device = None  #: chip select given to :py:func:`open`
+        self.max_speed_hz = 500000
+        self.mode = 0
+        self.transfers = []  #: list of all :py:class:`Transfer` objects
+
+    def open(self, bus: int, device: int) -> None:
+        self.bus = bus
+        self.device = device
+
+    def close(self) -> None:
+        self.bus = None
+        self.device = None
+
+    def _transfer(self, values) -> None:
+        if self.bus is None:
+            raise OSError("SPI device is not open")
+
+        data = bytes(values)
+        if len(data) > self.bufsiz:
+            raise OSError("Message too long ({} bytes, buffer size is {})".format(len(data), self.bufsiz))
+
+        start_time = time.perf_counter()
+        if self.simulate_timing:
+            end_time = start_time + 8 * len(data) / self.max_speed_hz
+            while time.perf_counter() < end_time:
+                time.sleep(max(end_time - time.perf_counter(), 0))
+        self.transfers.append(Transfer(data, start_time, time.perf_counter()))
+
+    def writebytes(self, values) -> None:
+        self._transfer(values)
+
+    def writebytes2(self, values) -> None:
+        self._transfer(values)
+
+    def xfer2(self, values) -> list:
+        self._transfer(values)
+        return [0] * len(values)
+
+    @property
+    def sent(self) -> bytes:
+        """all bytes that were sent so far, concatenated"""
+        return b''.join(transfer.data for transfer in self.transfers)
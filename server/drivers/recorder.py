@@ -0,0 +1,183 @@
+# Recorder Driver
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+A driver that records every frame which is shown on the strip to a frame file (see :py:mod:`helpers.framefile`).
+The recordings can be played with :py:class:`lightshows.playback.Playback` or analyzed offline,
+e.g. to compare the frame timing of different versions of 102shows.
+"""
+
+import gzip
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from drivers import LEDStrip
+from helpers.framefile import BRIGHTNESS, TIMESTAMPS, FrameFileHeader
+
+logger = logging.getLogger('102shows.server.drivers.recorder')
+
+
+class RecorderDriver(LEDStrip):
+    """\
+    Records each frame that :func:`show` transmits, together with the time since the first frame,
+    the colors and the brightness of each LED (without the global brightness).
+
+    The render thread only copies the frame into a queue. A separate writer thread takes the frames
+    from the queue and appends them to the file in batches. If the writer cannot keep up and the queue is full,
+    the frame is not recorded and counted in :py:attr:`dropped_records` (the animation is never slowed down).
+
+    In tee mode, the recorder wraps another driver (e.g. APA102), so the frames are shown on a real strip
+    and recorded at the same time.
+
+    Settings that are not given (or ``None``) are read from the ``Recorder`` section of the configuration,
+    each one on its own.
+
+    :param num_leds: number of LEDs in the strip
+    :param max_clock_speed_hz: maximum clock speed (Hz) of the bus (passed to the wrapped driver)
+    :param max_global_brightness: maximum global brightness
+    :param filename: path of the recording (relative to the :file:`server` directory).
+                     ``{time}`` is replaced by the date and time when the recording starts.
+    :param compress: compress the recording with gzip
+    :param tee_driver: name of the driver to wrap (see :py:mod:`drivers.__active__`).
+                       An empty string records without a wrapped driver.
+    :param buffer_frames: maximum number of frames that wait for the writer thread
+    """
+
+    def __init__(self, num_leds: int, max_clock_speed_hz: int = 4000000, max_global_brightness: float = 1.0,
+                 filename: str = None, compress: bool = None, tee_driver: str = None, buffer_frames: int = None):
+        super().__init__(num_leds, max_clock_speed_hz, max_global_brightness)
+
+        if None in (filename, compress, tee_driver, buffer_frames):  # read the missing settings
+            from helpers.configparser import get_configuration
+            settings = get_configuration().Recorder
+            filename = settings.file if filename is None else filename
+            compress = settings.compress if compress is None else compress
+            tee_driver = settings.tee_driver if tee_driver is None else tee_driver
+            buffer_frames = settings.buffer_frames if buffer_frames is None else buffer_frames
+
+        self.filename_template = filename  #: path of the recording, may contain ``{time}``
+        self.compress = compress  #: compress the recording with gzip
+        self.buffer_frames = buffer_frames  #: maximum number of frames in :py:attr:`queue`
+
+        #: the wrapped driver that actually shows the frames (or ``None``)
+        self.output = None
+        if tee_driver:
+            from drivers.__active__ import get_driver  # not at the top, because drivers.__active__ imports us
+            self.output = get_driver(tee_driver)(num_leds=num_leds,
+                                                 max_clock_speed_hz=max_clock_speed_hz,
+                                                 max_global_brightness=max_global_brightness)
+
+        self.header = None  #: header of the recording (it is created with the first frame)
+        self.filename = None  #: path of the recording (it is opened with the first frame)
+        self.file = None
+        self.queue = None  #: the frames that wait for the writer thread
+        self.writer = None  #: the writer thread
+        self.writer_pid = None  # the writer thread belongs to this process
+        self.start_time = 0.0  # time.perf_counter() value of the first frame
+
+        self.recorded_frames = 0  #: number of frames that were put into the queue
+        self.dropped_records = 0  #: number of frames that were not recorded because the queue was full
+
+    def on_color_change(self, led_num, red: float, green: float, blue: float) -> None:
+        if self.output is not None:
+            self.output.set_pixel(led_num, red, green, blue)
+
+    def on_pixels_change(self, leds) -> None:
+        if self.output is not None:
+            self.output.set_pixels(leds, self.color_buffer[leds])
+
+    def on_brightness_change(self, led_num: int) -> None:
+        if self.output is not None:
+            self.output.set_brightness(led_num, float(self.brightness_buffer[led_num]))
+
+    def on_brightnesses_change(self, leds) -> None:
+        if self.output is not None:
+            self.output.set_brightnesses(leds, self.brightness_buffer[leds])
+
+    def encoded_frame(self) -> np.ndarray:
+        if self.output is not None:
+            return self.output.encoded_frame()
+        return super().encoded_frame()
+
+    def on_frame_load(self, encoded) -> None:
+        if self.output is not None:
+            self.output.load_frame(self.color_buffer, encoded)
+
+    def open(self) -> None:
+        """creates the recording file and starts the writer thread"""
+        self.filename = self.filename_template.format(time=time.strftime('%Y%m%d-%H%M%S'))
+        server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        path = os.path.join(server_dir, self.filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.header = FrameFileHeader(self.num_leds, self.fps, flags=BRIGHTNESS | TIMESTAMPS)
+        self.file = gzip.open(path, 'wb') if self.compress else open(path, 'wb')
+        self.file.write(self.header.pack())
+
+        self.queue = queue.Queue(maxsize=self.buffer_frames)
+        self.writer = threading.Thread(target=self.write_records, name='102shows-recorder', daemon=True)
+        self.writer_pid = os.getpid()
+        self.start_time = time.perf_counter()
+        self.writer.start()
+        logger.info("Recording to {}".format(path))
+
+    def write_records(self) -> None:
+        """the main loop of the writer thread: appends the queued frames to the file until ``None`` is queued"""
+        while True:
+            records = [self.queue.get()]
+            while True:  # take everything that is waiting, so the file is written in large blocks
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.file.write(b''.join(record.tobytes() for record in records if record is not None))
+            self.file.flush()  # so the recording is readable even if the process is killed
+            if records[-1] is None:
+                return
+
+    def record(self) -> None:
+        """puts the current frame into the queue of the writer thread"""
+        if self.writer_pid != os.getpid():  # nothing was recorded in this process yet
+            self.open()
+
+        record = np.empty((), dtype=self.header.dtype)
+        record['time'] = time.perf_counter() - self.start_time
+        record['colors'] = np.clip(np.rint(self.color_buffer), 0, 255)
+        record['brightness'] = np.rint(self.brightness_buffer * 255)
+
+        try:
+            self.queue.put_nowait(record)
+            self.recorded_frames += 1
+        except queue.Full:
+            self.dropped_records += 1
+
+    def transmit(self) -> None:
+        self.record()
+
+        if self.output is not None:
+            self.output.async_output = self.async_output
+            if self.output._global_brightness != self._global_brightness:
+                self.output.set_global_brightness(self._global_brightness)
+            self.output.show()
+
+    def close(self) -> None:
+        """waits until all queued frames are written, then closes the recording and the wrapped driver"""
+        if self.writer is not None and self.writer_pid == os.getpid():
+            if self.writer.is_alive():
+                self.queue.put(None)
+                self.writer.join()
+            self.file.close()
+            logger.info("Recorded {} frames to {} ({} dropped)".format(
+                self.recorded_frames, self.filename, self.dropped_records))
+        self.writer = None
+        self.writer_pid = None
+
+        if self.output is not None:
+            self.output.close()
@@ -0,0 +1,136 @@
+# Segmented Strip
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Installations with several physical strips (e.g. on different SPI buses or chip selects)
+can be controlled as one logical strip: the lightshows see one index space,
+and :py:class:`SegmentedStrip` maps it onto the physical strips, the *segments*.
+
+The segments are configured in the ``Strip`` section of the configuration, for example: ::
+
+    Strip:
+      driver: APA102
+      segments:
+        - {num_leds: 150, bus: 0, device: 0}
+        - {num_leds: 150, bus: 1, device: 0, reverse: true}
+
+The first segment takes the logical LEDs ``0 - 149``, the second one ``150 - 299``.
+``reverse`` means that the physical strip runs in the opposite direction.
+Each segment is sent from its own output thread, so all segments are transmitted in parallel.
+"""
+
+import inspect
+import logging
+
+from drivers import LEDStrip
+from helpers.exceptions import InvalidConf
+
+logger = logging.getLogger('102shows.server.drivers.segmented')
+
+
+class Segment:
+    """\
+    A physical strip that shows a part of the logical strip
+
+    :param strip: the driver object of the physical strip
+    :param start: logical index of the first LED of the segment
+    :param reverse: the physical strip runs in the opposite direction
+    """
+
+    def __init__(self, strip: LEDStrip, start: int, reverse: bool = False):
+        self.strip = strip  #: the driver object of the physical strip
+        self.start = start  #: logical index of the first LED of the segment
+        self.stop = start + strip.num_leds  #: logical index after the last LED of the segment
+        self.reverse = reverse  #: the physical strip runs in the opposite direction
+
+    @property
+    def leds(self) -> slice:
+        """the logical LEDs of this segment in the physical order"""
+        if self.reverse:
+            return slice(self.stop - 1, self.start - 1 if self.start else None, -1)
+        return slice(self.start, self.stop)
+
+
+class SegmentedStrip(LEDStrip):
+    """\
+    One logical strip that is made up of several physical strips (segments).
+
+    The lightshows render into the buffers of this object as usual. :func:`show` copies each segment's part of
+    the buffers to the driver of the segment and hands the frame to the driver's output thread
+    (see :py:attr:`drivers.LEDStrip.async_output`), so the segments are sent at the same time.
+    Unless :py:attr:`~drivers.LEDStrip.async_output` is set on this object, :func:`show` then waits
+    until all segments are sent.
+
+    :param driver: the driver class of the physical strips (e.g. :py:class:`drivers.apa102.APA102`)
+    :param segments: a list with the settings of each segment: ``num_leds``, optionally ``reverse``
+                     and any further keyword arguments of the driver (e.g. ``bus`` and ``device`` for APA102)
+    :param max_clock_speed_hz: maximum clock speed (Hz) of the buses
+    :param max_global_brightness: maximum global brightness
+    :raises InvalidConf: if the segments are not configured correctly
+    """
+
+    def __init__(self, driver, segments: list, max_clock_speed_hz: int = 4000000,
+                 max_global_brightness: float = 1.0):
+        self.segments = []  #: the :py:class:`Segment` objects in logical order
+
+        # check the settings before any buffers or drivers are allocated
+        if not segments:
+            raise InvalidConf("At least one segment must be configured!")
+        if not all('num_leds' in settings for settings in segments):
+            raise InvalidConf("Each segment needs a num_leds setting!")
+
+        driver_settings = []
+        for settings in segments:
+            settings = dict(settings)
+            reverse = settings.pop('reverse', False)
+            settings.setdefault('max_clock_speed_hz', max_clock_speed_hz)
+            settings.update(max_global_brightness=max_global_brightness)
+            try:
+                inspect.signature(driver).bind(**settings)
+            except TypeError as error:  # unknown setting for this driver
+                raise InvalidConf("Invalid segment settings {}: {}".format(settings, error))
+            driver_settings.append((settings, reverse))
+
+        super().__init__(sum(settings['num_leds'] for settings, _ in driver_settings),
+                         max_clock_speed_hz, max_global_brightness)
+
+        start = 0
+        for settings, reverse in driver_settings:
+            strip = driver(**settings)
+            strip.async_output = True  # every segment is sent from its own thread
+            self.segments.append(Segment(strip, start, reverse))
+            start += strip.num_leds
+
+        logger.info("Strip of {} LEDs in {} segments".format(self.num_leds, len(self.segments)))
+
+    def on_color_change(self, led_num, red: float, green: float, blue: float) -> None:
+        pass  # the segments are updated in transmit()
+
+    def on_brightness_change(self, led_num: int) -> None:
+        pass  # the segments are updated in transmit()
+
+    def on_pixels_change(self, leds) -> None:
+        pass
+
+    def on_brightnesses_change(self, leds) -> None:
+        pass
+
+    def transmit(self) -> None:
+        """copies the buffers to the segments and sends all of them in parallel"""
+        for segment in self.segments:
+            strip = segment.strip
+            strip.set_pixels(slice(None), self.color_buffer[segment.leds])
+            strip.set_brightnesses(slice(None), self.brightness_buffer[segment.leds])
+            if strip._global_brightness != self._global_brightness:
+                strip.set_global_brightness(self._global_brightness)
+            strip.show()
+
+        if not self.async_output:  # wait until every segment is sent
+            for segment in self.segments:
+                if segment.strip.output_thread is not None:
+                    segment.strip.output_thread.flush()
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.strip.close()
@@ -0,0 +1,241 @@
+# Tests for drivers.apa102
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for the message encoding and the SPI transfers of :py:class:`drivers.apa102.APA102`"""
+
+import random
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from drivers import AsyncOutput, apa102, fakespidev
+from helpers.color import grayscale_correction
+
+
+def make_strip(num_leds: int) -> apa102.APA102:
+    with mock.patch.object(apa102, 'spidev', fakespidev):
+        strip = apa102.APA102(num_leds)
+    strip.spi.simulate_timing = False
+    strip.max_transfer_bytes = strip.spi.bufsiz
+    return strip
+
+
+class TestLookupTables(unittest.TestCase):
+    def test_grayscale_table_matches_formula(self):
+        for lightness in range(256):
+            self.assertEqual(apa102.GRAYSCALE_TABLE[lightness], grayscale_correction(lightness))
+
+    def test_brightness_encoding_matches_led_prefix(self):
+        brightness = [i / 1000 for i in range(1001)]
+        encoded = apa102.APA102.encode_brightness(brightness)
+        self.assertEqual(encoded.tolist(), [apa102.APA102.led_prefix(value) for value in brightness])
+
+    def test_uniform_brightness_encoding(self):
+        encoded = apa102.APA102.encode_brightness([0.3] * 20)
+        self.assertEqual(encoded.tolist(), [apa102.APA102.led_prefix(0.3)] * 20)
+        self.assertEqual(apa102.APA102.encode_brightness([]).tolist(), [])
+
+
+class TestBatchEncoder(unittest.TestCase):
+    def setUp(self):
+        random.seed(102)
+        self.colors = [tuple(random.uniform(0, 255) for _ in range(3)) for _ in range(50)]
+
+    def test_set_pixels_equals_set_pixel(self):
+        single = make_strip(50)
+        for led_num, color in enumerate(self.colors):
+            single.set_pixel(led_num, *color)
+
+        batch = make_strip(50)
+        batch.set_pixels(slice(None), self.colors)
+
+        self.assertEqual(batch.leds, single.leds)
+
+    def test_encode_regenerates_whole_message(self):
+        strip = make_strip(50)
+        strip.set_pixels(slice(None), self.colors)
+        for led_num in range(50):
+            strip.set_brightness(led_num, random.random())
+        expected = bytes(strip.leds)
+
+        strip.leds[:] = bytes(len(strip.leds))
+        strip.encode()
+        self.assertEqual(strip.leds, expected)
+
+    def test_global_brightness_is_applied_when_shown(self):
+        strip = make_strip(50)
+        for led_num in range(50):
+            strip.set_brightness(led_num, random.random())
+        before = bytes(strip.leds)
+
+        strip.set_global_brightness(0.2)
+        strip.set_global_brightness(0.5)
+        self.assertEqual(strip.leds, before)  # nothing is encoded until the frame is shown
+
+        strip.show()
+        self.assertEqual([strip.leds[4 * led_num] for led_num in range(50)],
+                         [strip.led_prefix(0.5 * brightness) for brightness in strip.brightness_buffer])
+
+
+class TestHDREncoder(unittest.TestCase):
+    @staticmethod
+    def shown_intensity(frames) -> np.ndarray:
+        """the relative intensity (``0.0 - 1.0``) of each channel of the encoded LED frames"""
+        frames = np.asarray(frames, dtype=np.float64)
+        return (frames[:, :1] - 0b11100000) / 31 * frames[:, 1:] / 255
+
+    def test_intensity_matches_target(self):
+        random.seed(102)
+        colors = np.array([[random.uniform(0, 255) for _ in range(3)] for _ in range(200)])
+        brightness = np.array([random.random() for _ in range(200)])
+        frames = apa102.APA102.encode_hdr(colors, brightness)
+
+        target = ((colors / 255 * 100 + 16) / 116) ** 3
+        target[colors / 255 * 100 <= 8] = colors[colors / 255 * 100 <= 8] / 255 * 100 / 902.33
+        dim = np.where(brightness * 100 <= 8, brightness * 100 / 902.33, ((brightness * 100 + 16) / 116) ** 3)
+        target *= dim[:, np.newaxis]
+
+        step = (frames[:, :1] - 0b11100000) / (31 * 255)  # one duty cycle step at the chosen 5-bit brightness
+        # (plus a little for the quantization of the colors and brightness values in the lookup tables)
+        self.assertTrue((np.abs(self.shown_intensity(frames)[:, ::-1] - target) <= step / 2 + 5e-4).all())
+
+    def test_smoother_fades_at_low_brightness(self):
+        colors = np.linspace(0, 255, 1000)[:, np.newaxis].repeat(3, axis=1)
+        brightness = np.full(1000, 0.1)
+        standard = np.column_stack((apa102.APA102.encode_brightness(brightness),
+                                    apa102.APA102.encode_colors(colors)))
+        hdr = apa102.APA102.encode_hdr(colors, brightness)
+
+        hdr_levels = len(np.unique(self.shown_intensity(hdr)[:, 0]))
+        standard_levels = len(np.unique(self.shown_intensity(standard)[:, 0]))
+        self.assertGreater(hdr_levels, 2 * standard_levels)
+
+    def test_hdr_strip(self):
+        strip = make_strip(10)
+        strip.hdr = True
+        strip.set_pixels(slice(None), [(25 * led_num, 0, 255) for led_num in range(10)])
+        strip.set_brightness(3, 0.5)
+        strip.set_global_brightness(0.3)
+        strip.show()
+        self.assertEqual(bytes(strip.leds), apa102.APA102.encode_hdr(
+            strip.color_buffer, 0.3 * strip.brightness_buffer).tobytes())
+
+        single = make_strip(10)
+        single.hdr = True
+        for led_num in range(10):
+            single.set_pixel(led_num, *strip.get_pixel(led_num))
+        single.set_brightness(3, 0.5)
+        single.set_global_brightness(0.3)
+        single.show()
+        self.assertEqual(single.leds, strip.leds)
+
+
+class TestShow(unittest.TestCase):
+    def test_whole_message_in_one_transfer(self):
+        strip = make_strip(100)
+        strip.fill((255, 0, 0))
+        strip.show()
+
+        self.assertEqual(len(strip.spi.transfers), 1)
+        sent = strip.spi.sent
+        self.assertEqual(sent[:4], bytes(4))
+        self.assertEqual(sent[4:4 + 4 * 100], bytes(strip.leds))
+        self.assertEqual(sent[4 + 4 * 100:], bytes(len(sent) - 4 - 4 * 100))
+
+    def test_long_strips_are_chunked(self):
+        strip = make_strip(3000)  # more than the spidev buffer can take at once
+        strip.show()
+
+        self.assertGreater(len(strip.spi.transfers), 1)
+        for transfer in strip.spi.transfers:
+            self.assertLessEqual(len(transfer.data), strip.spi.bufsiz)
+        self.assertEqual(strip.spi.sent, bytes(strip.spi_message))
+
+    def test_message_buffer_is_reused(self):
+        strip = make_strip(10)
+        message = strip.spi_message
+        strip.set_pixel(3, 1, 2, 3)
+        strip.show()
+        self.assertIs(strip.spi_message, message)
+        self.assertEqual(strip.spi.sent, bytes(message))
+
+
+class TestRotate(unittest.TestCase):
+    def setUp(self):
+        random.seed(102)
+        self.colors = [tuple(random.uniform(0, 255) for _ in range(3)) for _ in range(20)]
+        self.strip = make_strip(20)
+        self.strip.set_pixels(slice(None), self.colors)
+        self.reference = make_strip(20)
+
+    def expected_message(self) -> bytes:
+        """the message of a strip on which the rotated colors were set directly"""
+        self.reference.set_pixels(slice(None), self.strip.color_buffer)
+        self.reference.set_brightnesses(slice(None), self.strip.brightness_buffer)
+        return bytes(self.reference.spi_message)
+
+    def test_rotation_is_not_encoded(self):
+        with mock.patch.object(apa102.APA102, 'encode_colors') as encode_colors:
+            self.strip.rotate(3)
+            self.strip.rotate(-1)
+            self.strip.show()
+        encode_colors.assert_not_called()
+        self.assertEqual(self.strip.rotation, 2)
+        self.assertEqual(self.strip.spi.sent, self.expected_message())
+
+    def test_changes_after_rotation(self):
+        self.strip.rotate(5)
+        self.strip.set_pixel(0, 1, 2, 3)
+        self.strip.set_brightness(1, 0.5)
+        self.assertEqual(self.strip.rotation, 0)
+        self.strip.show()
+        self.assertEqual(self.strip.spi.sent, self.expected_message())
+
+        self.strip.rotate(1)  # the brightness is not uniform, so the colors are encoded again
+        self.assertEqual(self.strip.rotation, 0)
+        self.strip.show()
+        self.assertEqual(self.strip.spi.sent[-len(self.strip.spi_message):], self.expected_message())
+
+    def test_rotated_async_output(self):
+        self.strip.async_output = True
+        self.strip.rotate(7)
+        self.strip.show()
+        self.strip.close()
+        self.assertEqual(self.strip.spi.sent, self.expected_message())
+
+
+class TestAsyncOutput(unittest.TestCase):
+    def test_latest_frame_wins(self):
+        sent, release = [], threading.Event()
+
+        def send(message):
+            release.wait()
+            sent.append(bytes(message))
+
+        output = AsyncOutput(send, 1)
+        output.submit(b'a')
+        while output.has_pending:  # wait until the thread is busy sending the first frame
+            time.sleep(0.001)
+        output.submit(b'b')
+        output.submit(b'c')
+        release.set()
+        output.stop()
+
+        self.assertEqual(sent, [b'a', b'c'])
+        self.assertEqual((output.submitted_frames, output.sent_frames, output.overwritten_frames), (3, 2, 1))
+
+    def test_strip_sends_copy_of_message(self):
+        strip = make_strip(10)
+        strip.async_output = True
+        strip.fill((255, 0, 0))
+        strip.show()
+        expected = bytes(strip.spi_message)
+        strip.fill((0, 0, 255))  # rendering the next frame must not change the submitted one
+        strip.stop_output()
+
+        self.assertEqual(strip.spi.sent, expected)
+        self.assertEqual(strip.transmitted_frames, 1)
@@ -0,0 +1,155 @@
+# Tests for drivers.LEDStrip
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for the buffer handling of :py:class:`drivers.LEDStrip` (run on a recording driver)"""
+
+import multiprocessing
+import unittest
+
+from drivers import LEDStrip
+
+
+class RecordingDriver(LEDStrip):
+    """driver that remembers for which pixels :py:func:`on_color_change` was called"""
+
+    def __init__(self, num_leds: int):
+        super().__init__(num_leds)
+        self.changed = []
+        self.transmissions = 0
+
+    def on_color_change(self, led_num, red: float, green: float, blue: float) -> None:
+        self.changed.append((led_num, red, green, blue))
+
+    def on_brightness_change(self, led_num: int) -> None:
+        pass
+
+    def transmit(self) -> None:
+        self.transmissions += 1
+
+    def close(self) -> None:
+        pass
+
+
+class TestSetPixel(unittest.TestCase):
+    def setUp(self):
+        self.strip = RecordingDriver(10)
+
+    def test_get_pixel_returns_tuple(self):
+        self.strip.set_pixel(3, 255, 128, 0)
+        self.assertEqual(self.strip.get_pixel(3), (255.0, 128.0, 0.0))
+
+    def test_invisible_pixels_are_ignored(self):
+        self.strip.set_pixel(-1, 1, 2, 3)
+        self.strip.set_pixel(10, 1, 2, 3)
+        self.assertEqual(self.strip.changed, [])
+
+    def test_frozen_strip_is_not_changed(self):
+        self.strip.freeze()
+        self.strip.set_pixel(0, 1, 2, 3)
+        self.strip.fill((4, 5, 6))
+        self.assertEqual(self.strip.get_pixel(0), (0.0, 0.0, 0.0))
+
+
+class TestSetPixels(unittest.TestCase):
+    def setUp(self):
+        self.strip = RecordingDriver(10)
+
+    def test_fill(self):
+        self.strip.fill((1, 2, 3))
+        self.assertEqual([self.strip.get_pixel(i) for i in range(10)], [(1.0, 2.0, 3.0)] * 10)
+        self.assertEqual(len(self.strip.changed), 10)
+
+    def test_slice_with_individual_colors(self):
+        self.strip.set_pixels(slice(2, 4), [(1, 1, 1), (2, 2, 2)])
+        self.assertEqual(self.strip.get_pixel(2), (1.0, 1.0, 1.0))
+        self.assertEqual(self.strip.get_pixel(3), (2.0, 2.0, 2.0))
+        self.assertEqual([led for led, *_ in self.strip.changed], [2, 3])
+
+    def test_index_array_skips_invisible_pixels(self):
+        self.strip.set_pixels([-1, 4, 12], [(1, 1, 1), (2, 2, 2), (3, 3, 3)])
+        self.assertEqual(self.strip.get_pixel(4), (2.0, 2.0, 2.0))
+        self.assertEqual(self.strip.changed, [(4, 2.0, 2.0, 2.0)])
+
+    def test_brightnesses_skip_invisible_leds(self):
+        self.strip.set_brightnesses([-1, 4, 12], [0.125, 0.25, 0.375])
+        self.strip.set_brightnesses([-2, 5], 0.5)
+        expected = [1.0] * 10
+        expected[4:6] = [0.25, 0.5]
+        self.assertEqual(self.strip.brightness_buffer.tolist(), expected)
+
+
+class TestRotate(unittest.TestCase):
+    def test_rotate_like_a_circular_buffer(self):
+        strip = RecordingDriver(4)
+        strip.set_pixels(slice(None), [(0, 0, 0), (1, 1, 1), (2, 2, 2), (3, 3, 3)])
+        strip.rotate(1)
+        self.assertEqual([strip.get_pixel(i)[0] for i in range(4)], [1.0, 2.0, 3.0, 0.0])
+        strip.rotate(-2)
+        self.assertEqual([strip.get_pixel(i)[0] for i in range(4)], [3.0, 0.0, 1.0, 2.0])
+
+
+class TestSkipIdenticalFrames(unittest.TestCase):
+    def setUp(self):
+        self.strip = RecordingDriver(4)
+        self.strip.skip_identical_frames = True
+
+    def test_unchanged_frame_is_skipped(self):
+        self.strip.show()
+        self.strip.show()
+        self.assertEqual(self.strip.transmissions, 1)
+        self.assertEqual(self.strip.skipped_frames, 1)
+
+    def test_every_change_is_transmitted(self):
+        changes = [lambda: self.strip.set_pixel(0, 1, 2, 3),
+                   lambda: self.strip.fill((4, 5, 6)),
+                   lambda: self.strip.set_brightness(1, 0.5),
+                   lambda: self.strip.set_global_brightness(0.5),
+                   lambda: self.strip.rotate(1)]
+        self.strip.show()
+        for change in changes:
+            change()
+            self.strip.show()
+        self.assertEqual(self.strip.transmissions, 1 + len(changes))
+
+    def test_forced_refresh(self):
+        self.strip.forced_refresh_sec = 0
+        self.strip.show()
+        self.strip.show()
+        self.assertEqual(self.strip.transmissions, 2)
+
+    def test_frames_are_not_skipped_by_default(self):
+        strip = RecordingDriver(4)
+        strip.show()
+        strip.show()
+        self.assertEqual(strip.transmissions, 2)
+
+
+class TestDriverContract(unittest.TestCase):
+    def test_overwriting_show_is_reported(self):
+        with self.assertLogs('102shows.drivers', level='WARNING') as logs:
+            class ShowingDriver(RecordingDriver):
+                def show(self) -> None:
+                    self.transmit()
+        self.assertIn('ShowingDriver', logs.output[0])
+
+
+class TestSync(unittest.TestCase):
+    def test_state_is_handed_over_between_processes(self):
+        strip = RecordingDriver(5)
+
+        def show_process():
+            strip.fill((1, 2, 3))
+            strip.set_brightness(2, 0.5)
+            strip.set_global_brightness(0.25)
+            strip.sync_up()
+
+        process = multiprocessing.get_context('fork').Process(target=show_process)
+        process.start()
+        process.join()
+
+        strip.sync_down()
+        self.assertEqual(strip.get_pixel(4), (1.0, 2.0, 3.0))
+        self.assertEqual(strip.brightness_buffer.tolist(), [1.0, 1.0, 0.5, 1.0, 1.0])
+        self.assertEqual(strip._global_brightness, 0.25)
+        self.assertEqual(len(strip.changed), 5)  # the message buffer was regenerated
@@ -0,0 +1,78 @@
+# Tests for drivers.recorder
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for recording frames with :py:class:`drivers.recorder.RecorderDriver`"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from drivers import apa102, fakespidev
+from drivers.recorder import RecorderDriver
+from drivers.test_apa102 import make_strip
+from helpers.framefile import BRIGHTNESS, TIMESTAMPS, open_frames
+
+
+class TestRecorderDriver(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'recording.102f')
+
+    def record(self, strip: RecorderDriver, num_frames: int) -> None:
+        for index in range(num_frames):
+            strip.fill((index, 2 * index, 3 * index))
+            strip.set_brightness(0, index / 10)
+            strip.show()
+        strip.close()
+
+    def test_frames_are_recorded(self):
+        for compress in (False, True):
+            strip = RecorderDriver(5, filename=self.filename, compress=compress, tee_driver='', buffer_frames=16)
+            self.record(strip, 3)
+
+            header, frames = open_frames(self.filename)
+            self.assertEqual((header.num_leds, header.flags), (5, BRIGHTNESS | TIMESTAMPS))
+            self.assertEqual(frames['colors'][:, 0].tolist(), [[0, 0, 0], [1, 2, 3], [2, 4, 6]])
+            self.assertEqual(frames['brightness'][:, 0].tolist(), [0, 26, 51])
+            self.assertTrue(np.all(np.diff(frames['time']) >= 0))
+
+    def test_full_queue_drops_frames(self):
+        strip = RecorderDriver(5, filename=self.filename, compress=False, tee_driver='', buffer_frames=1)
+        strip.open()
+        strip.queue.put(None)  # the writer thread stops, so nothing is taken from the queue anymore
+        strip.writer.join()
+        strip.show()
+        strip.show()
+
+        self.assertEqual((strip.recorded_frames, strip.dropped_records), (1, 1))
+
+    def test_tee_mode_drives_the_wrapped_strip(self):
+        with mock.patch.object(apa102, 'spidev', fakespidev):
+            strip = RecorderDriver(20, filename=self.filename, compress=False, tee_driver='apa102', buffer_frames=16)
+        strip.output.spi.simulate_timing = False
+        reference = make_strip(20)
+
+        for target in (strip, reference):
+            target.set_global_brightness(0.5)
+            target.set_pixels(slice(None), np.linspace(0, 255, 60).reshape(20, 3))
+            target.set_brightnesses(slice(0, 10), 0.25)
+            target.show()
+
+        self.assertEqual(bytes(strip.output.leds), bytes(reference.leds))
+        self.assertEqual(strip.output.transmitted_frames, 1)
+        strip.close()
+
+    def test_unset_settings_are_read_from_configuration(self):
+        configuration = mock.Mock()
+        configuration.Recorder.tee_driver = 'apa102'
+        with mock.patch('helpers.configparser.get_configuration', return_value=configuration), \
+                mock.patch.object(apa102, 'spidev', fakespidev):
+            strip = RecorderDriver(5, filename=self.filename, compress=False, buffer_frames=16)
+        self.assertIsInstance(strip.output, apa102.APA102)
+        self.assertEqual((strip.compress, strip.buffer_frames), (False, 16))
+        strip.close()
@@ -0,0 +1,56 @@
+# Tests for drivers.segmented
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for mapping one logical strip onto several physical strips with :py:class:`drivers.segmented.SegmentedStrip`"""
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from drivers import apa102, fakespidev
+from drivers.dummy import DummyDriver
+from drivers.segmented import SegmentedStrip
+from drivers.test_apa102 import make_strip
+from helpers.exceptions import InvalidConf
+
+
+def make_segmented_strip(segments: list) -> SegmentedStrip:
+    with mock.patch.object(apa102, 'spidev', fakespidev):
+        strip = SegmentedStrip(apa102.APA102, segments)
+    for segment in strip.segments:
+        segment.strip.spi.simulate_timing = False
+    return strip
+
+
+class TestSegmentedStrip(unittest.TestCase):
+    def test_segments_show_their_part_of_the_strip(self):
+        strip = make_segmented_strip([{'num_leds': 3, 'bus': 0, 'device': 0},
+                                      {'num_leds': 4, 'bus': 1, 'device': 0, 'reverse': True}])
+        colors = np.arange(21).reshape(7, 3) * 10
+        strip.set_pixels(slice(None), colors)
+        strip.set_brightness(6, 0.5)
+        strip.show()
+
+        first, second = (segment.strip for segment in strip.segments)
+        self.assertEqual((first.spi.bus, second.spi.bus), (0, 1))
+        np.testing.assert_array_equal(first.color_buffer, colors[:3])
+        np.testing.assert_array_equal(second.color_buffer, colors[:2:-1])
+        self.assertEqual(second.brightness_buffer[0], 0.5)  # the last logical LED is the first physical one
+
+        reference = make_strip(4)
+        reference.set_pixels(slice(None), colors[:2:-1])
+        reference.set_brightness(0, 0.5)
+        self.assertEqual(second.spi.sent, bytes(reference.spi_message))  # show() waited for the transfer
+        strip.close()
+
+    def test_segments_need_num_leds(self):
+        self.assertRaises(InvalidConf, SegmentedStrip, DummyDriver, [{'bus': 0}])
+        self.assertRaises(InvalidConf, SegmentedStrip, DummyDriver, [{'num_leds': 3, 'bus': 0}])  # Dummy has no bus
+
+    def test_settings_are_checked_before_allocation(self):
+        with mock.patch('drivers.SharedMemory') as shared_memory:
+            self.assertRaises(InvalidConf, SegmentedStrip, DummyDriver, [])
+            self.assertRaises(InvalidConf, SegmentedStrip, DummyDriver, [{'num_leds': 3, 'bus': 0}])
+        shared_memory.assert_not_called()
@@ -0,0 +1,100 @@
+# Tests for drivers.zone
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for running lightshows on zones of a strip (see :py:mod:`drivers.zone`)"""
+
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from drivers import LEDStrip
+from drivers.dummy import DummyDriver
+from drivers.zone import ZoneCompositor
+from helpers.exceptions import InvalidConf
+
+
+class CountingDriver(DummyDriver):
+    def __init__(self, num_leds: int):
+        super().__init__(num_leds)
+        self.transmitted = 0
+        self.transmitted_event = threading.Event()
+
+    def transmit(self) -> None:
+        self.transmitted += 1
+        self.transmitted_event.set()
+
+
+class TestZoneView(unittest.TestCase):
+    def setUp(self):
+        self.strip = CountingDriver(10)
+        self.compositor = ZoneCompositor(self.strip, {'left': {'start': 0, 'stop': 4},
+                                                      'scattered': {'leds': [9, 5, 7]}})
+
+    def test_zones_are_strips(self):
+        self.assertIsInstance(self.compositor.zones['left'], LEDStrip)
+        self.assertEqual(self.compositor.zones['left'].num_leds, 4)
+        self.assertEqual(self.compositor.zones['scattered'].num_leds, 3)
+
+    def test_show_copies_the_frame_into_the_strip(self):
+        left, scattered = self.compositor.zones['left'], self.compositor.zones['scattered']
+        left.fill((255, 0, 0))
+        scattered.set_pixels(slice(None), [(1, 2, 3), (4, 5, 6), (7, 8, 9)])
+        scattered.set_brightness(0, 0.5)
+        left.show()
+        self.compositor.compose()
+        np.testing.assert_array_equal(self.strip.color_buffer[4:], 0)  # scattered has not shown anything yet
+
+        scattered.show()
+        self.compositor.compose()
+        np.testing.assert_array_equal(self.strip.color_buffer[:4], [(255, 0, 0)] * 4)
+        np.testing.assert_array_equal(self.strip.color_buffer[[9, 5, 7]], [(1, 2, 3), (4, 5, 6), (7, 8, 9)])
+        np.testing.assert_array_equal(self.strip.color_buffer[[4, 6, 8]], 0)
+        self.assertEqual(self.strip.brightness_buffer[9], 0.5)
+        self.assertEqual(self.strip.transmitted, 0)  # only the compositor sends the strip
+
+    def test_layers_are_blended_in_order(self):
+        compositor = ZoneCompositor(self.strip, {'base': {'start': 0, 'stop': 10},
+                                                 'overlay': {'start': 2, 'stop': 4, 'blend': 'add', 'opacity': 0.5},
+                                                 'mask': {'leds': [3], 'blend': 'multiply'}})
+        compositor.zones['base'].fill((100, 100, 100))
+        compositor.zones['overlay'].fill((200, 0, 0))
+        compositor.zones['mask'].fill((0, 255, 127.5))
+        for zone in compositor.zones.values():
+            zone.show()
+        compositor.compose()
+
+        np.testing.assert_allclose(self.strip.color_buffer[:3], [(100, 100, 100)] * 2 + [(177.5, 100, 100)])
+        np.testing.assert_allclose(self.strip.color_buffer[3], (0, 100, 50))
+
+    def test_global_brightness_is_shared(self):
+        self.compositor.zones['left'].set_global_brightness(0.3)
+        self.assertAlmostEqual(self.strip._global_brightness, 0.3)
+
+
+class TestZoneCompositor(unittest.TestCase):
+    def test_compositor_shows_the_strip(self):
+        strip = CountingDriver(10)
+        compositor = ZoneCompositor(strip, {'all': {'start': 0, 'stop': 10}})
+        compositor.start()
+        self.assertTrue(strip.transmitted_event.wait(1))
+        compositor.stop()
+        self.assertFalse(compositor.running)
+
+        transmitted = strip.transmitted
+        time.sleep(0.05)
+        self.assertEqual(strip.transmitted, transmitted)
+
+    def test_invalid_zones(self):
+        strip = CountingDriver(10)
+        self.assertRaises(InvalidConf, ZoneCompositor, strip, {'blend': {'start': 0, 'stop': 5, 'blend': 'xor'}})
+        self.assertRaises(InvalidConf, ZoneCompositor, strip, {'opaque': {'start': 0, 'stop': 5, 'opacity': 2}})
+        self.assertRaises(InvalidConf, ZoneCompositor, strip, {'nothing': {}})
+        self.assertRaises(InvalidConf, ZoneCompositor, strip, {'outside': {'leds': [3, 10]}})
+        self.assertRaises(InvalidConf, ZoneCompositor, strip, {'empty': {'start': 5, 'stop': 5}})
+
+
+if __name__ == '__main__':
+    unittest.main()
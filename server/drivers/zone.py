@@ -0,0 +1,229 @@
+# Zones
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Zones are parts of the strip on which different lightshows can run at the same time.
+
+Each zone is a :py:class:`ZoneView`: an :py:class:`drivers.LEDStrip` of its own, so any lightshow can run on it.
+When the show calls :py:func:`~drivers.LEDStrip.show`, the zone takes a snapshot of its buffers, its *layer*.
+Once per frame, the :py:class:`ZoneCompositor` merges the layers of all zones into the buffers of the
+physical strip and sends them with a single :py:func:`~drivers.LEDStrip.show`.
+
+The zones are configured in the ``Zones`` section of the configuration, either as a range of LEDs
+or as a list of LED indices, for example: ::
+
+    Zones:
+      window: {start: 0, stop: 60}
+      door: {leds: [60, 61, 62, 63, 90, 91, 92, 93]}
+
+Zones may overlap. The layers are merged in the order of the configuration, each one with its
+``blend`` mode (``normal``, ``add``, ``multiply`` or ``max``, see :py:func:`helpers.color.blend_layer`)
+and its ``opacity`` (``0.0 - 1.0``). For example, a highlight can run on top of another show: ::
+
+    Zones:
+      background: {start: 0, stop: 100}
+      highlight: {start: 0, stop: 100, blend: add, opacity: 0.8}
+
+The layers are merged with the brightness of each LED applied to its color. LEDs without a layer are dark.
+"""
+
+import logging
+import threading
+
+import numpy as np
+
+from drivers import LEDStrip
+from helpers.color import BLEND_MODES, blend_layer
+from helpers.configparser import ConfigTree
+from helpers.exceptions import InvalidConf, ShowStopped
+from helpers.scheduler import FrameScheduler
+
+logger = logging.getLogger('102shows.server.drivers.zone')
+
+
+class ZoneView(LEDStrip):
+    """\
+    A part of a physical strip that behaves like a strip of its own
+
+    :param strip: the physical strip
+    :param leds: the LEDs of the physical strip that belong to the zone,
+                 either as :py:class:`slice` or as a sequence of LED indices (in the order of the zone)
+    :param lock: is held while the layer of the zone is updated or merged
+    :param blend: the blend mode of the layer (see :py:func:`helpers.color.blend_layer`)
+    :param opacity: the opacity of the layer (``0.0 - 1.0``)
+    """
+
+    def __init__(self, strip: LEDStrip, leds, lock: threading.Lock, blend: str = 'normal', opacity: float = 1.0):
+        if isinstance(leds, slice):
+            num_leds = len(range(strip.num_leds)[leds])
+        else:
+            leds = np.asarray(leds, dtype=np.intp)
+            num_leds = len(leds)
+        super().__init__(num_leds)
+
+        self.strip = strip  #: the physical strip
+        self.leds = leds  #: the LEDs of the physical strip that belong to the zone
+        self.lock = lock
+        self.blend = blend  #: the blend mode of the layer
+        self.opacity = opacity  #: the opacity of the layer
+        self.layer_colors = np.zeros_like(self.color_buffer)  #: the colors of the last frame that was shown
+        self.layer_brightness = np.zeros_like(self.brightness_buffer)  #: the brightness of the last frame
+        self.layer_generation = 0  #: the number of frames that were shown (0: the zone has no layer yet)
+        self.fps = strip.fps
+        self.max_refresh_time_sec = strip.max_refresh_time_sec
+        self.skip_identical_frames = strip.skip_identical_frames
+        self.forced_refresh_sec = strip.forced_refresh_sec
+        self._global_brightness = strip._global_brightness
+
+    def on_color_change(self, led_num, red: float, green: float, blue: float) -> None:
+        pass  # the layer is updated in transmit()
+
+    def on_brightness_change(self, led_num: int) -> None:
+        pass  # the layer is updated in transmit()
+
+    def on_pixels_change(self, leds) -> None:
+        pass
+
+    def on_brightnesses_change(self, leds) -> None:
+        pass
+
+    def set_global_brightness(self, brightness: float) -> None:
+        """\
+        Sets the global brightness of the physical strip (the global brightness is the same for all zones)
+
+        :param brightness: the global brightness (``0.0 - 1.0``) multiplicator to be set
+        """
+        with self.lock:
+            self.strip.set_global_brightness(brightness)
+        self._global_brightness = self.strip._global_brightness
+        self.frame_generation += 1
+
+    def transmit(self) -> None:
+        """copies the frame of the zone into its layer, which the compositor merges with the next frame"""
+        with self.lock:
+            np.copyto(self.layer_colors, self.color_buffer)
+            np.copyto(self.layer_brightness, self.brightness_buffer)
+            self.layer_generation += 1
+
+    def close(self) -> None:
+        pass
+
+
+class ZoneCompositor:
+    """\
+    Manages the zones of a strip and sends their composited frame to the strip.
+
+    While it is running (see :py:func:`start`), a thread merges the layers of the zones (see :py:func:`compose`)
+    and calls :py:func:`drivers.LEDStrip.show` on the physical strip at its frame rate.
+    The layers are only merged again if one of the zones has shown a new frame.
+
+    :param strip: the physical strip
+    :param zones: the ``Zones`` section of the configuration (see above)
+    :raises InvalidConf: if a zone is not configured correctly
+    """
+
+    def __init__(self, strip: LEDStrip, zones: ConfigTree = None):
+        self.strip = strip  #: the physical strip
+        self.lock = threading.Lock()  #: is held while a zone changes the buffers of the strip
+        self.zones = {}  #: maps the zone names to the :py:class:`ZoneView` objects
+        self.stop_event = threading.Event()
+        self.thread = None  #: the thread that shows the composited frames
+        self.composed_generations = None  # the layer generations of the last composition
+        self.colors = np.zeros_like(strip.color_buffer)  # the composited colors (with the brightness applied)
+        self.brightness = np.zeros_like(strip.brightness_buffer)  # the composited brightness
+
+        for name, settings in (zones or {}).items():
+            if 'leds' in settings:
+                leds = settings['leds']
+            elif 'start' in settings and 'stop' in settings:
+                leds = slice(settings['start'], settings['stop'])
+            else:
+                raise InvalidConf("Zone \"{}\" needs either start and stop or a list of leds!".format(name))
+            self.add_zone(name, leds, settings.get('blend', 'normal'), settings.get('opacity', 1.0))
+
+    def add_zone(self, name: str, leds, blend: str = 'normal', opacity: float = 1.0) -> ZoneView:
+        """\
+        creates a zone. Its layer is merged after the layers of the existing zones.
+
+        :param name: name of the zone
+        :param leds: the LEDs of the zone (see :py:class:`ZoneView`)
+        :param blend: the blend mode of the layer (see :py:func:`helpers.color.blend_layer`)
+        :param opacity: the opacity of the layer (``0.0 - 1.0``)
+        :return: the zone
+        :raises InvalidConf: if the LEDs are not on the strip or the blend mode or opacity are invalid
+        """
+        if not isinstance(leds, slice) and not all(0 <= led < self.strip.num_leds for led in leds):
+            raise InvalidConf("Zone \"{}\" contains LEDs that are not on the strip!".format(name))
+        if blend not in BLEND_MODES:
+            raise InvalidConf("Zone \"{}\" has an unknown blend mode: {}".format(name, blend))
+        if not 0 <= opacity <= 1:
+            raise InvalidConf("The opacity of zone \"{}\" must be between 0 and 1!".format(name))
+        zone = ZoneView(self.strip, leds, self.lock, blend, opacity)
+        if not zone.num_leds:
+            raise InvalidConf("Zone \"{}\" contains no LEDs!".format(name))
+        self.zones[name] = zone
+        return zone
+
+    @property
+    def running(self) -> bool:
+        """is the compositor thread running?"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> None:
+        """starts the thread that shows the composited frames (if it is not running yet)"""
+        if self.running:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='102shows-zones', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """stops the thread that shows the composited frames and discards the layers of the zones"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+        with self.lock:  # the next shows in the zones must not be merged with old layers
+            for zone in self.zones.values():
+                zone.layer_generation = 0
+            self.composed_generations = None
+
+    def compose(self) -> None:
+        """\
+        merges the layers of all zones into the buffers of the physical strip
+        (unless no zone has shown a new frame since the last composition)
+        """
+        with self.lock:
+            generations = [zone.layer_generation for zone in self.zones.values()]
+            if generations == self.composed_generations:
+                return
+            self.composed_generations = generations
+
+            self.colors.fill(0)
+            self.brightness.fill(0)
+            for zone in self.zones.values():
+                if not zone.layer_generation:  # nothing shown yet
+                    continue
+                layer = zone.layer_colors * zone.layer_brightness[:, np.newaxis]
+                self.colors[zone.leds] = blend_layer(self.colors[zone.leds], layer, zone.blend, zone.opacity)
+                self.brightness[zone.leds] = np.maximum(self.brightness[zone.leds], zone.layer_brightness)
+
+            # the brightest layer keeps its brightness, so drivers with a per-LED brightness do not lose resolution
+            lit = self.brightness > 0
+            self.colors[lit] /= self.brightness[lit, np.newaxis]
+            self.strip.set_pixels(slice(None), np.minimum(self.colors, 255))
+            self.strip.set_brightnesses(slice(None), self.brightness)
+
+    def run(self) -> None:
+        """the main loop of the compositor thread"""
+        scheduler = FrameScheduler(self.strip.fps, interrupt=self.stop_event)
+        try:
+            while True:
+                self.compose()
+                with self.lock:
+                    self.strip.show()
+                scheduler.wait_for_next_frame()
+        except ShowStopped:
+            logger.debug("zone compositor stopped")
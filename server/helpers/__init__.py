@@ -20,7 +20,8 @@ For example:
     - getting the colored 102shows logo: :py:func:`helpers.get_version`
 """
 
-__all__ = ['color', 'exceptions', 'mqtt', 'preprocessors', 'verify']
+__all__ = ['color', 'exceptions', 'fakebroker', 'framecache', 'framefile', 'mqtt', 'preprocessors', 'scheduler',
+           'schema', 'verify']
 
 
 def get_logo(filename: str ='../logo') -> str:
@@ -4,20 +4,27 @@
 #
 # This module provides helper functions and classes for the lightshows:
 #     - grayscale_correction(lightness, max_in, max_out)
+#     - grayscale_correction_array(lightness, max_in, max_out)
 #     - linear_dim(undimmed, factor)
 #     - is_rgb_color_tuple(to_check)
 #     - add_tuples(tuple1, tuple2)
 #     - blend_whole_strip_to_color(strip, color, fadetime_sec)
 #     - wheel(wheel_pos)
+#     - wheel_array(wheel_pos)
+#     - easing_curve(blend_function, num_frames)
+#     - blend_layer(base, layer, mode, opacity)
 #
 #     - SmoothBlend
 
-import types
+import functools
 import logging
-import time
+import types
+
+import numpy as np
 
 from drivers import LEDStrip
 from helpers import verify, exceptions
+from helpers.scheduler import FrameScheduler
 
 
 def grayscale_correction(lightness: float, max_in: float = 255.0, max_out: int = 255):
@@ -85,6 +92,21 @@ def grayscale_correction(lightness: float, max_in: float = 255.0, max_out: int =
     return round(duty_cycle * max_out)  # this will be an integer!
 
 
+def grayscale_correction_array(lightness: np.ndarray, max_in: float = 255.0, max_out: int = 255) -> np.ndarray:
+    """\
+    Applies :py:func:`grayscale_correction` to a whole array of lightness values at once
+
+    :param lightness: array of linear brightness values between 0 and max_in
+    :param max_in: maximum value for lightness
+    :param max_out: maximum output integer value (255 for 8-bit LED drivers)
+
+    :return: array of the correct PWM duty cycles as integers
+    """
+    l_star = np.clip(np.asarray(lightness, dtype=np.float64) / max_in, 0, 1) * 100  # map to 0..100
+    duty_cycle = np.where(l_star <= 8, l_star / 902.33, ((l_star + 16) / 116) ** 3)
+    return np.rint(duty_cycle * max_out).astype(np.intp)
+
+
 def wheel(wheel_pos: float):
     """\
     Get a color from a color wheel: Green -> Red -> Blue -> Green
@@ -108,6 +130,26 @@ def wheel(wheel_pos: float):
     return color
 
 
+def wheel_array(wheel_pos) -> np.ndarray:
+    """\
+    Like :py:func:`wheel`, but for a whole array of wheel positions at once
+
+    :param wheel_pos: array of numerics from 0 to 254
+
+    :return: ``len(wheel_pos) x 3`` array of RGB colors
+    """
+    wheel_pos = np.minimum(np.asarray(wheel_pos, dtype=np.float64).ravel(), 254)  # Safeguard
+    segment = np.searchsorted([85, 170], wheel_pos, side='right')  # 0: Green -> Red, 1: Red -> Blue, 2: Blue -> Green
+    rising = (wheel_pos - 85 * segment) * 3
+    falling = 255 - rising
+
+    colors = np.zeros((wheel_pos.size, 3))
+    positions = np.arange(wheel_pos.size)
+    colors[positions, -segment % 3] = rising  # the rising component is red, blue, green
+    colors[positions, (1 - segment) % 3] = falling  # the falling component is green, red, blue
+    return colors
+
+
 def linear_dim(undimmed: tuple, factor: float) -> tuple:
     """\
     Multiply all components of undimmed with factor
@@ -117,11 +159,7 @@ def linear_dim(undimmed: tuple, factor: float) -> tuple:
 
     :return: resulting RGB color vector
     """
-    dimmed = ()
-    for i in undimmed:
-        i *= factor
-        dimmed += i,  # merge tuples
-    return dimmed
+    return tuple(component * factor for component in undimmed)
 
 
 def add_tuples(tuple1: tuple, tuple2: tuple):
@@ -143,6 +181,71 @@ def add_tuples(tuple1: tuple, tuple2: tuple):
     return tuple(sum_of_two)
 
 
+BLEND_MODES = ('normal', 'add', 'multiply', 'max')  #: the blend modes of :py:func:`blend_layer`
+
+
+def blend_layer(base: np.ndarray, layer: np.ndarray, mode: str = 'normal', opacity: float = 1.0) -> np.ndarray:
+    """\
+    Blends a layer of colors over a base (both arrays of RGB colors from 0 to 255)
+
+    The blend modes are:
+
+    - ``normal``: the layer covers the base
+    - ``add``: the colors are added (up to 255)
+    - ``multiply``: the colors are multiplied (white keeps the base, black makes it black)
+    - ``max``: the brighter color of each component
+
+    :param base: the colors below the layer
+    :param layer: the colors of the layer
+    :param mode: the blend mode (see above)
+    :param opacity: how much the blended colors replace the base (``0.0 - 1.0``)
+
+    :return: the resulting colors (a new array)
+    :raises InvalidParameters: if the blend mode is unknown
+    """
+    if mode == 'normal':
+        blended = layer
+    elif mode == 'add':
+        blended = np.minimum(base + layer, 255)
+    elif mode == 'multiply':
+        blended = base * layer / 255
+    elif mode == 'max':
+        blended = np.maximum(base, layer)
+    else:
+        raise exceptions.InvalidParameters("Unknown blend mode: {}".format(mode))
+
+    if opacity >= 1:
+        return np.array(blended, dtype=np.float64)
+    return base + opacity * (blended - base)
+
+
+@functools.lru_cache(maxsize=64)
+def easing_curve(blend_function, num_frames: int) -> tuple:
+    """\
+    Samples a blend function (see :py:class:`SmoothBlend.BlendFunctions`) for each frame of a blend.
+
+    The blend function must return a weighted sum of the start color and the end color
+    (like all functions in :py:class:`SmoothBlend.BlendFunctions` do).
+    Its weights are found by evaluating the function with unit colors, once per frame.
+    The results are cached, so repeated blends of the same length do not evaluate the function again.
+
+    :param blend_function: a function :samp:`{blend_function}(start_color, end_color, fade_progress)`
+    :param num_frames: number of frames of the blend. Frame ``k`` has the ``fade_progress`` ``1 - k / num_frames``.
+
+    :return: two read-only arrays of length ``num_frames``: the weights of the start color and of the end color
+    """
+    start_weights = np.empty(num_frames)
+    end_weights = np.empty(num_frames)
+    for frame in range(num_frames):
+        fade_progress = 1 - frame / num_frames
+        start_weights[frame] = blend_function((1, 0, 0), (0, 0, 0), fade_progress)[0]
+        end_weights[frame] = blend_function((0, 0, 0), (1, 0, 0), fade_progress)[0]
+
+    start_weights.setflags(write=False)
+    end_weights.setflags(write=False)
+    return start_weights, end_weights
+
+
 class SmoothBlend:
     """\
     This class lets the user define a specific state of the strip (:py:attr:`target_colors`)
@@ -153,7 +256,7 @@ class SmoothBlend:
 
     def __init__(self, strip: LEDStrip):
         self.strip = strip
-        self.target_colors = [(0.0, 0.0, 0.0)] * self.strip.num_leds  #: an array of float tuples
+        self.target_colors = np.zeros((self.strip.num_leds, 3))  #: ``num_leds x 3`` array of the target colors
 
     def set_pixel(self, led_num: int, red: float, green: float, blue: float):
         """ set the desired state of a given pixel after the blending is finished """
@@ -166,18 +269,34 @@ class SmoothBlend:
         # store in buffer
         self.target_colors[led_num] = (red, green, blue)
 
+    def set_pixels(self, leds, colors):
+        """\
+        set the desired state of several pixels after the blending is finished
+
+        :param leds: the pixels to be set, either as :py:class:`slice` or as a sequence of LED indices
+        :param colors: either a single ``(red, green, blue)`` color for all of the given pixels
+                       or a ``len(leds) x 3`` array with an individual color for each pixel (``0.0 - 255.0``)
+        """
+        colors = np.asarray(colors, dtype=np.float64)
+        if np.any(colors < 0) or np.any(colors > 255):
+            self.logger.error("Parameter must be an RGB color tuple!")
+
+        self.target_colors[leds] = colors
+
     def set_color_for_whole_strip(self, red: float, green: float, blue: float):
         """ set the same color for all LEDs in the strip """
-        for led_num in range(self.strip.num_leds):
-            self.set_pixel(led_num, red, green, blue)
+        self.set_pixels(slice(None), (red, green, blue))
 
     class BlendFunctions:
         """\
         .. todo:: Include blend pictures directly in documentation
 
         An internal class which provides functions to blend between two colors by a parameter fade_progress
-        for ``fade_progress == 0`` the function should return the start_color
-        for ``fade_progress == 1`` the function should return the end_color
+        for ``fade_progress == 1`` the function should return the start_color
+        for ``fade_progress == 0`` the function should return the end_color
+
+        Custom blend functions can be used, too.
+        They must return a weighted sum of the two colors (see :py:func:`easing_curve`).
         """
 
         def __init__(self):
@@ -205,27 +324,44 @@ class SmoothBlend:
             target_component = linear_dim(end_color, (1 - fade_progress) ** power)
             return add_tuples(start_component, target_component)
 
-    def blend(self, time_sec: float = 2, blend_function: types.FunctionType = BlendFunctions.linear_blend):
-        """ blend the current LED state to the desired state """
+    def blend(self, time_sec: float = 2, blend_function: types.FunctionType = BlendFunctions.linear_blend,
+              fps: float = None):
+        """\
+        blend the current LED state to the desired state
+
+        The blend has a fixed number of frames (``time_sec * fps``). The weights of the start and target colors
+        are precomputed for every frame (see :py:func:`easing_curve`),
+        so each frame is just a weighted sum of two arrays for the whole strip.
+        If frames are late, the blend skips the frames whose deadlines are over,
+        so it still ends after ``time_sec`` seconds.
+
+        :param time_sec: duration of the blend
+        :param blend_function: one of the functions in :py:class:`BlendFunctions`
+        :param fps: frame rate of the blend (default: :py:attr:`drivers.LEDStrip.fps` of the strip)
+        """
+        fps = fps or self.strip.fps
+        num_frames = max(int(np.ceil(time_sec * fps)), 0)
+        start_weights, end_weights = easing_curve(blend_function, num_frames)
+
         # buffer current status
-        initial_colors = []
-        for led_num in range(self.strip.num_leds):
-            initial_colors.append(self.strip.get_pixel(led_num))
+        initial_colors = self.strip.color_buffer.astype(np.float64)
+        frame = np.empty_like(initial_colors)
+        target_component = np.empty_like(initial_colors)
 
         # do the actual fadeout
-        now = time.perf_counter()
-        end_time = time.perf_counter() + time_sec
-        while now < end_time:
-            fade_progress = (end_time - now) / time_sec
-            for led_num in range(self.strip.num_leds):
-                color = blend_function(initial_colors[led_num], self.target_colors[led_num], fade_progress)
-                self.strip.set_pixel(led_num, *color)
+        scheduler = FrameScheduler(fps)
+        frame_num = 0
+        while frame_num < num_frames:
+            np.multiply(initial_colors, start_weights[frame_num], out=frame)
+            np.multiply(self.target_colors, end_weights[frame_num], out=target_component)
+            frame += target_component
+            self.strip.set_pixels(slice(None), frame)
             self.strip.show()
-            now = time.perf_counter()
+            scheduler.wait_for_next_frame()
+            frame_num = scheduler.frame_count + scheduler.dropped_frames  # position on the frame grid
 
         # set to final target state
-        for led_num in range(self.strip.num_leds):
-            self.strip.set_pixel(led_num, *(self.target_colors[led_num]))
+        self.strip.set_pixels(slice(None), self.target_colors)
         self.strip.show()
 
 
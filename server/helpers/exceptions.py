@@ -64,3 +64,15 @@ class InvalidParameters(DescriptiveException):
         else:
             debug_str = "Parameter is missing!"
         return InvalidParameters(debug_str)
+
+
+class ShowStopped(Exception):
+    """\
+    Raised inside a running lightshow after :py:func:`lightshows.templates.base.Lightshow.stop` was called,
+    so the animation ends wherever it currently is.
+
+    It is raised by :py:func:`drivers.LEDStrip.show` if the strip is frozen
+    and by :py:class:`helpers.scheduler.FrameScheduler` if its ``interrupt`` event is set.
+    """
+
+    pass
@@ -0,0 +1,327 @@
+# Fake MQTT Broker
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+A small in-process stand-in for an MQTT broker (like Mosquitto), so that tests and benchmarks
+can run the MQTT parts of 102shows without a broker on the network. For example: ::
+
+    with FakeBroker() as broker:
+        client = paho.mqtt.client.Client()
+        client.connect(broker.host, broker.port)
+        ...
+
+The broker speaks the parts of MQTT 3.1/3.1.1 that 102shows uses:
+connections (without authentication), subscriptions with the wildcards ``+`` and ``#``,
+publishing with QoS 0, 1 and 2, retained messages and pings.
+Messages are delivered to the subscribers with at most QoS 1.
+Every published message is also recorded in :py:attr:`FakeBroker.messages`.
+"""
+
+import asyncio
+import logging
+import struct
+import threading
+import time
+
+logger = logging.getLogger('102shows.server.helpers.fakebroker')
+
+# MQTT control packet types
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """\
+    checks if a topic matches a subscription filter (which may contain the wildcards ``+`` and ``#``)
+
+    :param topic_filter: the subscribed topic filter, e.g. ``led/+/show/#``
+    :param topic: the topic of a message
+    :return: ``True`` if the message belongs to the subscription
+    """
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for index, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != '+' and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def encode_packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    """\
+    puts the fixed header (type, flags and remaining length) in front of a packet body
+
+    :param packet_type: one of the control packet types (e.g. :py:data:`PUBLISH`)
+    :param flags: the four flag bits of the fixed header
+    :param body: variable header and payload of the packet
+    :return: the complete packet
+    """
+    header = bytearray([packet_type << 4 | flags])
+    length = len(body)
+    while True:
+        digit, length = length % 128, length // 128
+        header.append(digit | 0x80 if length else digit)
+        if not length:
+            break
+    return bytes(header) + body
+
+
+def encode_string(text: str) -> bytes:
+    """encodes a string with its 2-byte length prefix"""
+    data = text.encode()
+    return struct.pack('!H', len(data)) + data
+
+
+class Message:
+    """A message that was published to the broker"""
+
+    def __init__(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        self.topic = topic  #: topic of the message
+        self.payload = payload  #: payload of the message (as :py:class:`bytes`)
+        self.qos = qos  #: QoS level the message was published with
+        self.retain = retain  #: was the message published as retained message?
+        self.time = time.perf_counter()  #: :py:func:`time.perf_counter` timestamp when the broker received it
+
+    def __repr__(self):
+        return 'Message(topic={!r}, payload={!r}, qos={}, retain={})'.format(
+            self.topic, self.payload, self.qos, self.retain)
+
+
+class Session:
+    """The connection of a single client to the broker"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer  #: stream to the client
+        self.client_id = None  #: ID the client sent in its CONNECT packet
+        self.subscriptions = {}  #: maps the topic filters of the client to the granted QoS
+        self.next_packet_id = 1  #: packet ID for the next message with QoS > 0
+
+    def send(self, packet_type: int, flags: int, body: bytes = b'') -> None:
+        self.writer.write(encode_packet(packet_type, flags, body))
+
+    def deliver(self, message: Message, qos: int, retain: bool = False) -> None:
+        """\
+        sends a PUBLISH packet to the client
+
+        :param message: the message to be sent
+        :param qos: QoS level for this delivery
+        :param retain: set the retain flag (only for retained messages that are sent on subscription)
+        """
+        body = encode_string(message.topic)
+        if qos:
+            body += struct.pack('!H', self.next_packet_id)
+            self.next_packet_id = self.next_packet_id % 0xFFFF + 1
+        self.send(PUBLISH, qos << 1 | int(retain), body + message.payload)
+
+
+class FakeBroker:
+    """\
+    An MQTT broker that runs in a background thread of the current process.
+
+    :param host: address the broker listens on
+    :param port: port the broker listens on. If it is ``0``, the operating system chooses a free port
+                 (which can be read from :py:attr:`port` after :py:func:`start`).
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host  #: address the broker listens on
+        self.port = port  #: port the broker listens on
+
+        self.messages = []  #: all :py:class:`Message` objects that were published so far
+        self.retained = {}  #: maps topics to their retained :py:class:`Message`
+        self.sessions = set()  #: all connected :py:class:`Session` objects
+
+        self.loop = None  #: the asyncio event loop of the broker thread
+        self.server = None  #: the asyncio server
+        self.thread = None  #: the broker thread
+        self.received = threading.Condition()  #: notified whenever a message is published
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self) -> None:
+        """starts the broker thread and returns as soon as the broker accepts connections"""
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.serve, args=(ready,), name='fake-mqtt-broker', daemon=True)
+        self.thread.start()
+        ready.wait()
+        logger.debug("fake broker listening on {}:{}".format(self.host, self.port))
+
+    def stop(self) -> None:
+        """closes all connections and ends the broker thread"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop = None
+
+    def serve(self, ready: threading.Event) -> None:
+        """the main function of the broker thread"""
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, self.host, self.port))
+        self.port = self.server.sockets[0].getsockname()[1]
+        ready.set()
+
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            for session in list(self.sessions):
+                session.writer.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+
+    def publish(self, topic: str, payload=b'', qos: int = 0, retain: bool = False) -> None:
+        """\
+        publishes a message to all subscribers, as if a client had published it.
+        This method can be called from any thread.
+
+        :param topic: topic of the message
+        :param payload: payload of the message (:py:class:`bytes` or :py:class:`str`)
+        :param qos: QoS level of the message
+        :param retain: store the message as retained message
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.loop.call_soon_threadsafe(self.route, Message(topic, payload, qos, retain))
+
+    def wait_for_message(self, topic: str, timeout_sec: float = 1, after: float = None) -> Message:
+        """\
+        waits until a message with the given topic is published
+
+        :param topic: topic (or topic filter) of the message
+        :param timeout_sec: maximum waiting time
+        :param after: only messages received after this :py:func:`time.perf_counter` timestamp count
+                      (default: all messages, including those that were published before the call)
+        :return: the first matching message or ``None`` if there was none within ``timeout_sec``
+        """
+        def find():
+            for message in self.messages:
+                if (after is None or message.time > after) and topic_matches(topic, message.topic):
+                    return message
+
+        with self.received:
+            self.received.wait_for(find, timeout_sec)
+            return find()
+
+    def route(self, message: Message) -> None:
+        """records a published message, stores it if it is retained and delivers it to the subscribers"""
+        with self.received:
+            self.messages.append(message)
+            self.received.notify_all()
+
+        if message.retain:
+            if message.payload:
+                self.retained[message.topic] = message
+            else:  # an empty retained message deletes the retained message of this topic
+                self.retained.pop(message.topic, None)
+
+        for session in self.sessions:
+            granted = [qos for topic_filter, qos in session.subscriptions.items()
+                       if topic_matches(topic_filter, message.topic)]
+            if granted:
+                session.deliver(message, min(message.qos, max(granted), 1))
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """serves a single client connection"""
+        session = Session(writer)
+        self.sessions.add(session)
+        try:
+            while True:
+                first_byte = await reader.readexactly(1)
+                packet_type, flags = first_byte[0] >> 4, first_byte[0] & 0x0F
+
+                length, shift = 0, 0
+                while True:
+                    digit = (await reader.readexactly(1))[0]
+                    length += (digit & 0x7F) << shift
+                    shift += 7
+                    if not digit & 0x80:
+                        break
+                body = await reader.readexactly(length)
+
+                if packet_type == DISCONNECT:
+                    break
+                self.dispatch(session, packet_type, flags, body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # the client is gone
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    def dispatch(self, session: Session, packet_type: int, flags: int, body: bytes) -> None:
+        """reacts to a single packet from a client"""
+        if packet_type == CONNECT:
+            name_length, = struct.unpack_from('!H', body, 0)
+            payload_start = 2 + name_length + 4  # protocol name, level, connect flags and keep alive
+            id_length, = struct.unpack_from('!H', body, payload_start)
+            session.client_id = body[payload_start + 2:payload_start + 2 + id_length].decode()
+            session.send(CONNACK, 0, b'\x00\x00')
+
+        elif packet_type == PUBLISH:
+            qos, retain = (flags >> 1) & 0x03, bool(flags & 0x01)
+            topic_length, = struct.unpack_from('!H', body, 0)
+            topic = body[2:2 + topic_length].decode()
+            position = 2 + topic_length
+            if qos:
+                packet_id = body[position:position + 2]
+                position += 2
+                session.send(PUBACK if qos == 1 else PUBREC, 0, packet_id)
+            self.route(Message(topic, body[position:], qos, retain))
+
+        elif packet_type == PUBREL:
+            session.send(PUBCOMP, 0, body[:2])
+
+        elif packet_type == SUBSCRIBE:
+            packet_id, position = body[:2], 2
+            granted = bytearray()
+            new_filters = []
+            while position < len(body):
+                filter_length, = struct.unpack_from('!H', body, position)
+                topic_filter = body[position + 2:position + 2 + filter_length].decode()
+                qos = min(body[position + 2 + filter_length], 1)
+                position += 3 + filter_length
+                session.subscriptions[topic_filter] = qos
+                new_filters.append((topic_filter, qos))
+                granted.append(qos)
+            session.send(SUBACK, 0, packet_id + bytes(granted))
+
+            for topic, message in self.retained.items():
+                for topic_filter, qos in new_filters:
+                    if topic_matches(topic_filter, topic):
+                        session.deliver(message, min(message.qos, qos), retain=True)
+                        break
+
+        elif packet_type == UNSUBSCRIBE:
+            packet_id, position = body[:2], 2
+            while position < len(body):
+                filter_length, = struct.unpack_from('!H', body, position)
+                session.subscriptions.pop(body[position + 2:position + 2 + filter_length].decode(), None)
+                position += 2 + filter_length
+            session.send(UNSUBACK, 0, packet_id)
+
+        elif packet_type == PINGREQ:
+            session.send(PINGRESP, 0)
+
+        # PUBACK, PUBREC and PUBCOMP for messages that the broker delivered need no answer:
+        # the broker does not resend messages
@@ -0,0 +1,214 @@
+# Frame Cache
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Many lightshows paint exactly the same frames every time they run with the same parameters
+on the same strip (e.g. :py:class:`lightshows.rainbow.Rainbow`).
+The :py:class:`FrameCache` stores such frame sequences, so they have to be rendered only once
+and can be replayed afterwards.
+
+Each frame is stored as the colors of all LEDs (as bytes) plus the driver-specific encoding
+of these colors (see :py:func:`drivers.LEDStrip.encoded_frame`), so replaying a frame
+does not even need to encode the colors again.
+
+The cache holds the sequences in memory and evicts the least recently used ones if it grows too large.
+Optionally, it also stores them in a directory. These files are memory-mapped when they are used again,
+so the frames survive a restart of 102shows.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from drivers import LEDStrip
+from helpers.configparser import ConfigTree
+
+logger = logging.getLogger('102shows.server.helpers.framecache')
+
+
+class FrameSequence:
+    """\
+    A sequence of stored frames.
+
+    :param frames: ``num_frames x num_leds x (3 + n)`` array of bytes: for each LED the color (red, green, blue)
+                   and the ``n`` bytes of the driver-specific encoding
+    """
+
+    def __init__(self, frames: np.ndarray):
+        self.frames = frames  #: all frames in one array
+
+    @classmethod
+    def empty(cls, num_frames: int, strip: LEDStrip):
+        """\
+        creates a sequence that can take ``num_frames`` frames of the given strip
+
+        :param num_frames: number of frames in the sequence
+        :param strip: the strip (its driver determines the size of the encoded frames)
+        :return: the new sequence
+        """
+        encoded_size = strip.encoded_frame().shape[1]
+        return cls(np.zeros((num_frames, strip.num_leds, 3 + encoded_size), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def nbytes(self) -> int:
+        """size of the sequence in bytes"""
+        return self.frames.nbytes
+
+    def store(self, index: int, strip: LEDStrip) -> None:
+        """\
+        stores the current frame of the strip in the sequence
+
+        :param index: position of the frame in the sequence
+        :param strip: the strip
+        """
+        self.frames[index, :, :3] = np.clip(np.rint(strip.color_buffer), 0, 255)
+        self.frames[index, :, 3:] = strip.encoded_frame()
+
+    def load(self, index: int, strip: LEDStrip) -> None:
+        """\
+        puts a frame of the sequence on the strip (see :py:func:`drivers.LEDStrip.load_frame`)
+
+        :param index: position of the frame in the sequence
+        :param strip: the strip
+        """
+        frame = self.frames[index]
+        strip.load_frame(frame[:, :3], frame[:, 3:])
+
+
+class FrameCache:
+    """\
+    Stores frame sequences under a key (see :py:func:`key`).
+
+    :param max_bytes: the cache evicts the least recently used sequences from memory
+                      if they take up more than this many bytes together
+    :param directory: if it is given, the sequences are also stored in this directory
+    :param max_disk_bytes: the cache deletes the least recently used files
+                           if the directory takes up more than this many bytes
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2 ** 20, directory: str = None, max_disk_bytes: int = 512 * 2 ** 20):
+        self.max_bytes = max_bytes  #: maximum size of all sequences in memory
+        self.directory = directory  #: the directory for the stored sequences (or ``None``)
+        self.max_disk_bytes = max_disk_bytes  #: maximum size of all files in :py:attr:`directory`
+
+        self.sequences = collections.OrderedDict()  #: maps the keys to the sequences, least recently used first
+        self.size_bytes = 0  #: size of all sequences in memory
+
+        self.hits = 0  #: number of successful lookups
+        self.misses = 0  #: number of lookups that did not find a sequence
+        self.evictions = 0  #: number of sequences that were evicted from memory
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(show_name: str, parameters: dict, strip: LEDStrip) -> str:
+        """\
+        builds the key of a frame sequence
+
+        :param show_name: name of the lightshow
+        :param parameters: the parameters of the show that determine its frames
+        :param strip: the strip (its length, its driver and the layout of its encoded frames are part of the key)
+        :return: the key (a hex string)
+        """
+        encoded = strip.encoded_frame()  # e.g. an APA102 in HDR mode encodes the frames differently
+        description = json.dumps([show_name, parameters, strip.num_leds, type(strip).__name__,
+                                  list(encoded.shape[1:]), str(encoded.dtype)],
+                                 sort_keys=True, default=str)
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        """path of the file for a given key in :py:attr:`directory`"""
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key: str):
+        """\
+        looks up a frame sequence
+
+        :param key: the key of the sequence
+        :return: the :py:class:`FrameSequence` or ``None`` if there is none for this key
+        """
+        if key in self.sequences:
+            self.sequences.move_to_end(key)
+            self.hits += 1
+            return self.sequences[key]
+
+        if self.directory is not None and os.path.exists(self.path(key)):
+            sequence = FrameSequence(np.load(self.path(key), mmap_mode='r'))
+            os.utime(self.path(key))  # mark as recently used
+            self.remember(key, sequence)
+            self.hits += 1
+            return sequence
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, sequence: FrameSequence) -> None:
+        """\
+        stores a frame sequence
+
+        :param key: the key of the sequence
+        :param sequence: the sequence
+        """
+        self.remember(key, sequence)
+
+        if self.directory is not None:
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as file:
+                np.save(file, sequence.frames)
+            os.replace(file.name, self.path(key))  # so other processes never read a half-written file
+            self.prune_directory()
+
+    def remember(self, key: str, sequence: FrameSequence) -> None:
+        """keeps a sequence in memory and evicts the least recently used sequences if the cache is too large"""
+        if key in self.sequences:
+            self.size_bytes -= self.sequences.pop(key).nbytes
+        if sequence.nbytes > self.max_bytes:
+            logger.debug("frame sequence {} is too large for the cache".format(key))
+            return
+
+        self.sequences[key] = sequence
+        self.size_bytes += sequence.nbytes
+        while self.size_bytes > self.max_bytes:
+            _, evicted = self.sequences.popitem(last=False)
+            self.size_bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def prune_directory(self) -> None:
+        """deletes the least recently used files if :py:attr:`directory` is too large"""
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.npy')]
+        paths.sort(key=os.path.getmtime)
+        size = sum(os.path.getsize(path) for path in paths)
+        while paths and size > self.max_disk_bytes:
+            path = paths.pop(0)
+            size -= os.path.getsize(path)
+            os.remove(path)
+
+
+_frame_cache = None
+
+
+def get_frame_cache(config: ConfigTree):
+    """\
+    Returns the frame cache of this process. It is created on the first call.
+
+    :param config: the configuration tree (the ``FrameCache`` section is used)
+    :return: the :py:class:`FrameCache` or ``None`` if the cache is disabled in the configuration
+    """
+    global _frame_cache
+    if _frame_cache is None:
+        settings = config.FrameCache
+        if not settings.max_size_mb and settings.directory is None:
+            return None
+        _frame_cache = FrameCache(max_bytes=int(settings.max_size_mb * 2 ** 20),
+                                  directory=settings.directory,
+                                  max_disk_bytes=int(settings.max_disk_size_mb * 2 ** 20))
+    return _frame_cache
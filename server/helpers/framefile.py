@@ -0,0 +1,164 @@
+# Frame Files
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Reading and writing frame files: recorded or pre-rendered animations that
+:py:class:`lightshows.playback.Playback` can play.
+
+A frame file starts with a header of :py:data:`HEADER_SIZE` bytes (all values little-endian):
+
+    ========  ======  ===========================================================
+    offset    type    content
+    ========  ======  ===========================================================
+    0         4s      magic bytes ``b'102F'``
+    4         uint16  format version (currently ``1``)
+    6         uint16  flags: :py:data:`BRIGHTNESS` and :py:data:`TIMESTAMPS`
+    8         uint32  number of LEDs per frame
+    12        float32 frame rate (frames per second)
+    16        16x     reserved
+    ========  ======  ===========================================================
+
+Then the frames follow, each of them with the same size (see :py:func:`frame_dtype`):
+
+    - if the :py:data:`TIMESTAMPS` flag is set: the time (in seconds) of the frame as ``float64``
+    - ``(red, green, blue)`` of each LED as bytes
+    - if the :py:data:`BRIGHTNESS` flag is set: the brightness of each LED as a byte (``255`` means ``1.0``)
+
+Because of the fixed frame size, the frames of a file can be memory-mapped
+and accessed as a NumPy array (see :py:func:`open_frames`).
+The whole file may also be compressed with gzip. Such files cannot be memory-mapped
+and are decompressed into memory instead.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+from helpers.exceptions import InvalidParameters
+
+MAGIC = b'102F'  #: the first bytes of every frame file
+VERSION = 1  #: the current version of the format
+HEADER_SIZE = 32  #: size of the header in bytes
+HEADER_FORMAT = '<4sHHIf16x'  #: :py:mod:`struct` format of the header
+
+BRIGHTNESS = 0x01  #: flag: each frame contains the brightness of each LED
+TIMESTAMPS = 0x02  #: flag: each frame starts with its timestamp
+
+GZIP_MAGIC = b'\x1f\x8b'  #: the first bytes of a gzip-compressed file
+
+
+class FrameFileHeader:
+    """\
+    The header of a frame file
+
+    :param num_leds: number of LEDs per frame
+    :param fps: frame rate (frames per second)
+    :param flags: combination of :py:data:`BRIGHTNESS` and :py:data:`TIMESTAMPS`
+    """
+
+    def __init__(self, num_leds: int, fps: float, flags: int = 0):
+        self.num_leds = num_leds  #: number of LEDs per frame
+        self.fps = fps  #: frame rate (frames per second)
+        self.flags = flags  #: combination of :py:data:`BRIGHTNESS` and :py:data:`TIMESTAMPS`
+
+    def pack(self) -> bytes:
+        """:return: the header as bytes"""
+        return struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.flags, self.num_leds, self.fps)
+
+    @classmethod
+    def unpack(cls, data: bytes):
+        """\
+        reads a header
+
+        :param data: the first :py:data:`HEADER_SIZE` bytes of a frame file
+        :return: the :py:class:`FrameFileHeader`
+        :raises InvalidParameters: if the data is not a valid header
+        """
+        if len(data) < HEADER_SIZE:
+            raise InvalidParameters("Not a frame file (too short)")
+        magic, version, flags, num_leds, fps = struct.unpack(HEADER_FORMAT, data[:HEADER_SIZE])
+        if magic != MAGIC:
+            raise InvalidParameters("Not a frame file (wrong magic bytes)")
+        if version != VERSION:
+            raise InvalidParameters("Unsupported frame file version {}".format(version))
+        return cls(num_leds, fps, flags)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """the NumPy data type of a single frame"""
+        return frame_dtype(self.num_leds, self.flags)
+
+
+def frame_dtype(num_leds: int, flags: int = 0) -> np.dtype:
+    """\
+    builds the NumPy data type of a single frame. Its fields are ``time`` (only with :py:data:`TIMESTAMPS`),
+    ``colors`` (``num_leds x 3`` bytes) and ``brightness`` (``num_leds`` bytes, only with :py:data:`BRIGHTNESS`).
+
+    :param num_leds: number of LEDs per frame
+    :param flags: combination of :py:data:`BRIGHTNESS` and :py:data:`TIMESTAMPS`
+    :return: the data type
+    """
+    fields = []
+    if flags & TIMESTAMPS:
+        fields.append(('time', '<f8'))
+    fields.append(('colors', 'u1', (num_leds, 3)))
+    if flags & BRIGHTNESS:
+        fields.append(('brightness', 'u1', (num_leds,)))
+    return np.dtype(fields)
+
+
+def open_frames(filename: str) -> tuple:
+    """\
+    memory-maps the frames of a frame file (read-only). Compressed files are decompressed into memory.
+
+    :param filename: path of the file
+    :return: the :py:class:`FrameFileHeader` and an array of all frames (see :py:func:`frame_dtype`).
+             The array is empty if the file contains no frames.
+    :raises InvalidParameters: if the file is not a valid frame file
+    """
+    with open(filename, 'rb') as file:
+        if file.read(len(GZIP_MAGIC)) == GZIP_MAGIC:
+            file.seek(0)
+            return read_compressed_frames(file.read())
+        file.seek(0)
+        header = FrameFileHeader.unpack(file.read(HEADER_SIZE))
+        file.seek(0, 2)
+        num_frames = (file.tell() - HEADER_SIZE) // header.dtype.itemsize  # an incomplete last frame is ignored
+
+    if num_frames == 0:
+        return header, np.empty(0, dtype=header.dtype)
+    return header, np.memmap(filename, dtype=header.dtype, mode='r', offset=HEADER_SIZE, shape=(num_frames,))
+
+
+def read_compressed_frames(data: bytes) -> tuple:
+    """\
+    decompresses a gzip-compressed frame file. A truncated file (e.g. of a recording that was killed)
+    is read up to its last complete frame.
+
+    :param data: contents of the file
+    :return: the :py:class:`FrameFileHeader` and an array of all frames (see :py:func:`open_frames`)
+    :raises InvalidParameters: if the data is not a valid frame file
+    """
+    try:
+        data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data)
+    except zlib.error as error:
+        raise InvalidParameters("Could not decompress the frame file: {}".format(error))
+
+    header = FrameFileHeader.unpack(data[:HEADER_SIZE])
+    num_frames = (len(data) - HEADER_SIZE) // header.dtype.itemsize
+    return header, np.frombuffer(data, dtype=header.dtype, count=num_frames, offset=HEADER_SIZE)
+
+
+def write_frames(filename: str, header: FrameFileHeader, frames: np.ndarray) -> None:
+    """\
+    writes a complete frame file
+
+    :param filename: path of the file
+    :param header: the header
+    :param frames: array of frames with the data type :py:attr:`FrameFileHeader.dtype`
+    """
+    with open(filename, 'wb') as file:
+        file.write(header.pack())
+        file.write(np.ascontiguousarray(frames, dtype=header.dtype).tobytes())
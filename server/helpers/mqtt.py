@@ -4,9 +4,12 @@
 
 """A couple of helper functions (big surprise!) for MQTTControl"""
 
+import asyncio
 import json
 import logging
 
+import paho.mqtt.client
+
 logger = logging.getLogger('102shows.server.helpers.mqtt')
 
 
@@ -33,6 +36,30 @@ def get_from_topic(hierarchy_level: int, topic: str) -> str:
     return hierarchy[hierarchy_level]
 
 
+def parse_topic(template: str, topic: str):
+    """\
+    matches a topic against a template with placeholders on whole hierarchy levels,
+    e.g. ``led/sys/zone/{zone}/show/start``
+
+    :param template: the topic template
+    :param topic: the topic to be analyzed
+    :return: a :py:class:`dict` that maps the placeholder names to their values in the topic
+             or ``None`` if the topic does not match the template
+    """
+    template_levels = template.split(sep="/")
+    topic_levels = topic.split(sep="/")
+    if len(template_levels) != len(topic_levels):
+        return None
+
+    values = {}
+    for template_level, topic_level in zip(template_levels, topic_levels):
+        if template_level.startswith('{') and template_level.endswith('}'):
+            values[template_level[1:-1]] = topic_level
+        elif template_level != topic_level:
+            return None
+    return values
+
+
 def parse_json_safely(payload: str) -> dict:
     """\
     parse a string as JSON object
@@ -55,3 +82,62 @@ def parse_json_safely(payload: str) -> dict:
     else:
         logger.debug("Payload is empty!")
         return {}
+
+
+class AsyncioClient:
+    """\
+    Drives a Paho MQTT client from an asyncio event loop instead of a network thread of its own:
+    the loop watches the socket of the client and calls the read, write and housekeeping functions of Paho.
+    If the connection is lost, the client reconnects.
+
+    All calls to the client (e.g. :py:func:`paho.mqtt.client.Client.publish`) must happen in the thread
+    that runs the event loop.
+
+    :param client: the Paho MQTT client
+    :param loop: the asyncio event loop
+    :param misc_interval_sec: time between two calls of the housekeeping function (keepalive, reconnects)
+    """
+
+    def __init__(self, client: paho.mqtt.client.Client, loop: asyncio.AbstractEventLoop,
+                 misc_interval_sec: float = 1):
+        self.client = client
+        self.loop = loop
+        self.misc_interval_sec = misc_interval_sec
+        self.misc = None  # the scheduled call of housekeeping()
+
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock) -> None:
+        self.loop.add_reader(sock, client.loop_read)
+        if self.misc is None:
+            self.misc = self.loop.call_later(self.misc_interval_sec, self.housekeeping)
+
+    def on_socket_close(self, client, userdata, sock) -> None:
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def on_socket_register_write(self, client, userdata, sock) -> None:
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock) -> None:
+        self.loop.remove_writer(sock)
+
+    def housekeeping(self) -> None:
+        """sends pings and reconnects (it is called every ``misc_interval_sec`` until :py:func:`stop` is called)"""
+        if self.client.loop_misc() == paho.mqtt.client.MQTT_ERR_NO_CONN:
+            try:
+                self.client.reconnect()
+            except OSError as error:
+                logger.warning("Could not reconnect to the MQTT broker: {}".format(error))
+        self.misc = self.loop.call_later(self.misc_interval_sec, self.housekeeping)
+
+    def stop(self) -> None:
+        """disconnects the client and ends the housekeeping"""
+        if self.misc is not None:
+            self.misc.cancel()
+            self.misc = None
+        self.client.disconnect()
+        self.client.loop_write()  # send the DISCONNECT packet right away, the loop might not run again
@@ -0,0 +1,121 @@
+# Frame Scheduler
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Timing for animations: :py:class:`FrameScheduler` paces a loop to a fixed frame rate
+by sleeping until the deadline of the next frame instead of busy-waiting.
+"""
+
+import threading
+import time
+
+from helpers.exceptions import ShowStopped
+
+
+class FrameScheduler:
+    """\
+    Paces an animation loop to a target frame rate.
+
+    The deadlines of the frames lie on a fixed grid (``start_time + n * frame_period``),
+    so the time spent on rendering a frame does not add up over the course of an animation.
+    If a frame is finished so late that one or more deadlines have already passed,
+    these frames are counted in :py:attr:`dropped_frames` and the grid is moved forward.
+
+    Usage: ::
+
+        scheduler = FrameScheduler(fps=60)
+        while animation_running:
+            render_frame()
+            strip.show()
+            scheduler.wait_for_next_frame()
+
+    :param fps: target frame rate (frames per second)
+    :param spin_sec: the scheduler sleeps until ``spin_sec`` seconds before a deadline
+                     and busy-waits only for the rest of the time. This costs a little CPU time
+                     but makes the frame timing more precise than :py:func:`time.sleep` alone.
+    :param interrupt: if this event is set, all waiting methods raise
+                      :py:class:`helpers.exceptions.ShowStopped` immediately
+    """
+
+    def __init__(self, fps: float, spin_sec: float = 0.0, interrupt: threading.Event = None):
+        self.frame_period = 1 / fps  #: time (in seconds) between two frames
+        self.spin_sec = spin_sec  #: busy-wait for this time (in seconds) before each deadline
+        self.interrupt = interrupt  #: event that ends all waiting
+
+        self.start_time = 0.0  #: :py:func:`time.perf_counter` value when the scheduler was started
+        self.next_deadline = 0.0  #: :py:func:`time.perf_counter` value of the upcoming deadline
+        self.frame_count = 0  #: number of frames since the start
+        self.dropped_frames = 0  #: number of deadlines that were missed completely
+        self.late_frames = 0  #: number of frames that were finished after their deadline
+
+        self.start()
+
+    @property
+    def fps(self) -> float:
+        """the target frame rate (frames per second)"""
+        return 1 / self.frame_period
+
+    @fps.setter
+    def fps(self, value: float) -> None:
+        self.frame_period = 1 / value
+
+    @property
+    def actual_fps(self) -> float:
+        """the frame rate that was actually achieved since the start"""
+        elapsed = time.perf_counter() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+        return self.frame_count / elapsed
+
+    def start(self) -> None:
+        """(Re-)starts the frame grid at the current time and resets all counters"""
+        self.start_time = time.perf_counter()
+        self.next_deadline = self.start_time
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self.late_frames = 0
+
+    def wait_for_next_frame(self) -> None:
+        """\
+        Sleeps until the deadline of the next frame.
+        If this deadline has already passed, the method returns immediately.
+
+        :raises ShowStopped: if the :py:attr:`interrupt` event is set
+        """
+        self.next_deadline += self.frame_period
+        self.frame_count += 1
+
+        lateness = time.perf_counter() - self.next_deadline
+        if lateness > 0:
+            self.late_frames += 1
+            missed = int(lateness // self.frame_period)
+            if missed:  # whole frames were missed, so do not try to catch up on them
+                self.dropped_frames += missed
+                self.next_deadline += missed * self.frame_period
+
+        self.sleep_until(self.next_deadline)
+
+    def sleep_until(self, deadline: float) -> None:
+        """\
+        Sleeps until the given point in time
+
+        :param deadline: :py:func:`time.perf_counter` value when the method should return
+        :raises ShowStopped: if the :py:attr:`interrupt` event is set
+        """
+        remaining = deadline - time.perf_counter()
+        if self.interrupt is None:
+            if remaining > self.spin_sec:
+                time.sleep(remaining - self.spin_sec)
+        elif self.interrupt.wait(max(remaining - self.spin_sec, 0)):
+            raise ShowStopped()
+        while time.perf_counter() < deadline:  # spin for the rest of the time
+            pass
+
+    def sleep(self, time_sec: float) -> None:
+        """\
+        Sleeps for ``time_sec`` seconds (with the same precision as :py:func:`sleep_until`)
+
+        :param time_sec: duration of the break
+        """
+        self.sleep_until(time.perf_counter() + time_sec)
@@ -0,0 +1,243 @@
+# Parameter Schemas
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Compiled parameter schemas for the lightshows.
+
+A :py:class:`ParameterSchema` collects the parameters that a lightshow class registers
+(see :py:func:`lightshows.templates.base.Lightshow.register`). Each parameter is compiled once per show class
+into a check that returns ``True`` or ``False`` instead of raising an exception, so a valid parameter set
+is verified without building any error message. Only if a value is invalid, its verifier is called again
+to produce the message.
+
+The schema can also be described as a `JSON Schema <http://json-schema.org>`_ object, which 102shows publishes
+via MQTT, so user interfaces can validate the parameters before they send them.
+"""
+
+import json
+
+from helpers import verify
+from helpers.exceptions import InvalidParameters
+
+NUMBER = (float, int)  #: the types of numeric parameters
+
+
+def number_check(types: tuple, minimum: float = None, maximum: float = None, exclusive_minimum: bool = False):
+    """\
+    builds a check for numbers of the given types between minimum and maximum
+
+    :param types: the allowed types
+    :param minimum: minimum (``None`` means no minimum)
+    :param maximum: maximum (``None`` means no maximum)
+    :param exclusive_minimum: the minimum itself is not allowed
+    :return: a function that returns ``True`` for valid values
+    """
+    if minimum is None and maximum is None:
+        return lambda value: type(value) in types
+    if maximum is None and exclusive_minimum:
+        return lambda value: type(value) in types and value > minimum
+    if maximum is None:
+        return lambda value: type(value) in types and value >= minimum
+    if minimum is None:
+        return lambda value: type(value) in types and value <= maximum
+    return lambda value: type(value) in types and minimum <= value <= maximum
+
+
+def number_description(json_type: str, minimum: float = None, maximum: float = None,
+                       exclusive_minimum: bool = False) -> dict:
+    """\
+    :param json_type: ``"number"`` or ``"integer"``
+    :param minimum: minimum (``None`` means no minimum)
+    :param maximum: maximum (``None`` means no maximum)
+    :param exclusive_minimum: the minimum itself is not allowed
+    :return: the JSON Schema of the numbers
+    """
+    description = {'type': json_type}
+    if minimum is not None:
+        description['exclusiveMinimum' if exclusive_minimum else 'minimum'] = minimum
+    if maximum is not None:
+        description['maximum'] = maximum
+    return description
+
+
+def is_rgb_color_tuple(value) -> bool:
+    """the check of :py:func:`helpers.verify.rgb_color_tuple`"""
+    return type(value) is tuple and len(value) == 3 and \
+        all(type(component) in NUMBER and 0 <= component <= 255 for component in value)
+
+
+def is_file_name(value) -> bool:
+    """the check of :py:func:`helpers.verify.file_name`"""
+    return type(value) is str and value not in ('', '.', '..') and '/' not in value and '\\' not in value
+
+
+COMPILERS = {
+    verify.numeric: lambda minimum=None, maximum=None: (
+        number_check(NUMBER, minimum, maximum), number_description('number', minimum, maximum)),
+    verify.not_negative_numeric: lambda: (
+        number_check(NUMBER, 0), number_description('number', 0)),
+    verify.positive_numeric: lambda: (
+        number_check(NUMBER, 0, exclusive_minimum=True), number_description('number', 0, exclusive_minimum=True)),
+    verify.integer: lambda minimum=None, maximum=None: (
+        number_check((int,), minimum, maximum), number_description('integer', minimum, maximum)),
+    verify.not_negative_integer: lambda: (
+        number_check((int,), 0), number_description('integer', 0)),
+    verify.positive_integer: lambda: (
+        number_check((int,), 1), number_description('integer', 1)),
+    verify.boolean: lambda: (
+        lambda value: type(value) is bool, {'type': 'boolean'}),
+    verify.rgb_color_tuple: lambda: (
+        is_rgb_color_tuple, {'type': 'array', 'minItems': 3, 'maxItems': 3,
+                             'items': number_description('number', 0, 255)}),
+    verify.file_name: lambda: (
+        is_file_name, {'type': 'string', 'pattern': r'^(?!\.\.?$)[^/\\]+$'}),
+}
+"""\
+maps the verifiers of :py:mod:`helpers.verify` to functions that compile them:
+these are called with the arguments of the verifier and return a check and the JSON Schema of the parameter
+"""
+
+
+class CompiledParameter:
+    """\
+    A parameter of a :py:class:`ParameterSchema`
+
+    :param name: name of the parameter
+    :param verifier: the verifier function (see :py:func:`lightshows.templates.base.Lightshow.register`)
+    :param args: further positional arguments of the verifier
+    :param kwargs: further keyword arguments of the verifier
+    :param preprocessor: is called with the value before it is checked
+    """
+
+    def __init__(self, name: str, verifier, args: list, kwargs: dict, preprocessor):
+        self.name = name
+        self.definition = (verifier, list(args), dict(kwargs), preprocessor)  #: the arguments of the constructor
+        self.preprocessor = preprocessor
+
+        if verifier in COMPILERS:
+            self.check, self.description = COMPILERS[verifier](*args, **kwargs)
+        else:  # an unknown verifier: call it and catch its exception
+            self.check, self.description = self.verifier_check, {}
+
+    def verifier_check(self, value) -> bool:
+        """the check of an unknown verifier function"""
+        try:
+            self.raise_error(value)
+        except InvalidParameters:
+            return False
+        return True
+
+    def raise_error(self, value) -> None:
+        """\
+        calls the verifier, which raises the exception with the error message for an invalid value
+
+        :param value: the (pre-processed) value
+        """
+        verifier, args, kwargs, _ = self.definition
+        verifier(value, self.name, *args, **kwargs)
+
+
+class ParameterSchema:
+    """\
+    The compiled parameters of a lightshow class.
+
+    Parameters whose verifier arguments differ between the objects of a class (e.g. a maximum that depends
+    on the length of the strip) cannot be shared: such an object uses a :py:func:`copy` of the schema
+    with its own version of the parameter.
+    """
+
+    def __init__(self):
+        self.parameters = {}  #: maps the parameter names to their :py:class:`CompiledParameter`
+        self.__json = None  # cached JSON representation of the schema
+
+    def add(self, name: str, verifier, args: list, kwargs: dict, preprocessor) -> bool:
+        """\
+        adds a parameter to the schema. A parameter that is already in the schema is not compiled again
+        and not changed.
+
+        :param name: name of the parameter
+        :param verifier: the verifier function
+        :param args: further positional arguments of the verifier
+        :param kwargs: further keyword arguments of the verifier
+        :param preprocessor: is called with the value before it is checked
+        :return: ``True`` if the parameter in the schema has these arguments,
+                 ``False`` if it was added before with other arguments
+        """
+        known = self.parameters.get(name)
+        if known is not None:
+            return known.definition == (verifier, list(args), dict(kwargs), preprocessor)
+        self.put(CompiledParameter(name, verifier, args, kwargs, preprocessor))
+        return True
+
+    def put(self, compiled: CompiledParameter) -> None:
+        """\
+        stores a compiled parameter in the schema (and replaces a parameter with the same name)
+
+        :param compiled: the parameter
+        """
+        self.parameters[compiled.name] = compiled
+        self.__json = None
+
+    def copy(self):
+        """\
+        :return: a new schema with the same (compiled) parameters
+        """
+        schema = ParameterSchema()
+        schema.parameters = dict(self.parameters)
+        return schema
+
+    def validate(self, parameters: dict) -> dict:
+        """\
+        pre-processes and checks a set of parameters
+
+        :param parameters: maps the parameter names to the new values
+        :return: the pre-processed values
+        :raises InvalidParameters: if any of the parameters is unknown or invalid (the message contains all errors)
+        """
+        values = {}
+        invalid = []
+        for name, value in parameters.items():
+            compiled = self.parameters.get(name)
+            if compiled is None:
+                invalid.append((name, value))
+                continue
+            value = compiled.preprocessor(value)
+            if compiled.check(value):
+                values[name] = value
+            else:
+                invalid.append((name, value))
+
+        if invalid:
+            raise InvalidParameters(" ".join(self.error_message(name, value) for name, value in invalid))
+        return values
+
+    def error_message(self, name: str, value) -> str:
+        """\
+        :param name: name of an invalid parameter
+        :param value: its (pre-processed) value
+        :return: the error message for the invalid value
+        """
+        if name not in self.parameters:
+            return "Parameter {} is unknown!".format(name)
+        try:
+            self.parameters[name].raise_error(value)
+        except InvalidParameters as error_message:
+            return str(error_message)
+        return "Parameter {} is invalid!".format(name)  # the check and the verifier disagree
+
+    def describe(self) -> dict:
+        """\
+        :return: the schema as JSON Schema object
+        """
+        return {'type': 'object',
+                'properties': {name: compiled.description for name, compiled in self.parameters.items()},
+                'additionalProperties': False}
+
+    def to_json(self) -> str:
+        """\
+        :return: :py:func:`describe` as JSON string
+        """
+        if self.__json is None:
+            self.__json = json.dumps(self.describe())
+        return self.__json
@@ -0,0 +1,109 @@
+# Tests for helpers.color
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for the array versions of the color functions and the blend engine in :py:mod:`helpers.color`"""
+
+import unittest
+
+import numpy as np
+
+from drivers.dummy import DummyDriver
+from helpers.color import SmoothBlend, blend_layer, easing_curve, wheel, wheel_array
+from helpers.exceptions import InvalidParameters
+
+
+class RecordingDriver(DummyDriver):
+    """remembers the color buffer of every transmitted frame"""
+
+    def __init__(self, num_leds: int):
+        super().__init__(num_leds)
+        self.frames = []
+
+    def transmit(self) -> None:
+        self.frames.append(self.color_buffer.copy())
+
+
+class TestWheelArray(unittest.TestCase):
+    def test_equals_wheel(self):
+        positions = np.concatenate([np.linspace(0, 300, 3001), np.arange(255)])
+        expected = [wheel(float(position)) for position in positions]
+        self.assertEqual(wheel_array(positions).tolist(), [list(color) for color in expected])
+
+    def test_segment_borders(self):
+        self.assertEqual(wheel_array([84, 85, 169, 170]).tolist(),
+                         [list(wheel(84)), list(wheel(85)), list(wheel(169)), list(wheel(170))])
+
+
+class TestBlendLayer(unittest.TestCase):
+    def test_blend_modes(self):
+        base = np.array([(100., 200., 0.)])
+        layer = np.array([(200., 51., 10.)])
+        np.testing.assert_allclose(blend_layer(base, layer, 'normal'), layer)
+        np.testing.assert_allclose(blend_layer(base, layer, 'add'), [(255, 251, 10)])
+        np.testing.assert_allclose(blend_layer(base, layer, 'multiply'), [(200 * 100 / 255, 40, 0)])
+        np.testing.assert_allclose(blend_layer(base, layer, 'max'), [(200, 200, 10)])
+        self.assertRaises(InvalidParameters, blend_layer, base, layer, 'xor')
+
+    def test_opacity(self):
+        base = np.array([(100., 200., 0.)])
+        layer = np.array([(200., 0., 10.)])
+        np.testing.assert_allclose(blend_layer(base, layer, 'normal', 0.25), [(125, 150, 2.5)])
+        np.testing.assert_allclose(blend_layer(base, layer, 'normal', 0), base)
+
+
+class TestEasingCurve(unittest.TestCase):
+    def test_power_blends(self):
+        blend_functions = SmoothBlend.BlendFunctions
+        for power, blend_function in enumerate([blend_functions.linear_blend, blend_functions.parabolic_blend,
+                                                blend_functions.cubic_blend], start=1):
+            start_weights, end_weights = easing_curve(blend_function, 10)
+            progress = 1 - np.arange(10) / 10
+            np.testing.assert_allclose(start_weights, progress ** power)
+            np.testing.assert_allclose(end_weights, (1 - progress) ** power)
+
+    def test_custom_blend_function_is_cached(self):
+        calls = []
+
+        def half_way(start_color, end_color, fade_progress):
+            calls.append(fade_progress)
+            return tuple(0.5 * start + 0.5 * end for start, end in zip(start_color, end_color))
+
+        start_weights, end_weights = easing_curve(half_way, 4)
+        easing_curve(half_way, 4)
+        self.assertEqual(start_weights.tolist(), [0.5] * 4)
+        self.assertEqual(end_weights.tolist(), [0.5] * 4)
+        self.assertEqual(len(calls), 2 * 4)
+        self.assertFalse(start_weights.flags.writeable)
+
+
+class TestSmoothBlend(unittest.TestCase):
+    def test_frames_equal_per_pixel_blend(self):
+        strip = RecordingDriver(20)
+        initial = np.linspace(0, 255, 60).reshape(20, 3)
+        strip.set_pixels(slice(None), initial)
+        transition = SmoothBlend(strip)
+        transition.set_color_for_whole_strip(10, 200, 30)
+
+        transition.blend(time_sec=0.1, blend_function=SmoothBlend.BlendFunctions.parabolic_blend, fps=50)
+
+        expected = []
+        for frame in range(5):
+            progress = 1 - frame / 5
+            expected.append([SmoothBlend.BlendFunctions.parabolic_blend(tuple(color), (10, 200, 30), progress)
+                             for color in np.float32(initial).tolist()])
+        expected.append([(10, 200, 30)] * 20)
+
+        self.assertLessEqual(len(strip.frames), 6)  # late frames are skipped, but never added
+        self.assertEqual(strip.frames[-1].tolist(), [[10, 200, 30]] * 20)
+        remaining = iter(expected)
+        for frame in strip.frames:  # each transmitted frame is one of the expected frames, in order
+            self.assertTrue(any(np.allclose(frame, candidate, atol=1e-3) for candidate in remaining))
+
+    def test_zero_time_sets_target(self):
+        strip = RecordingDriver(5)
+        transition = SmoothBlend(strip)
+        transition.set_pixel(2, 255, 0, 0)
+        transition.blend(time_sec=0)
+        self.assertEqual(len(strip.frames), 1)
+        self.assertEqual(strip.get_pixel(2), (255, 0, 0))
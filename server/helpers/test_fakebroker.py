@@ -0,0 +1,76 @@
+# Tests for helpers.fakebroker
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for :py:class:`helpers.fakebroker.FakeBroker` with a real Paho MQTT client"""
+
+import threading
+import unittest
+
+import paho.mqtt.client
+
+from helpers.fakebroker import FakeBroker, topic_matches
+
+
+class TestTopicMatches(unittest.TestCase):
+    def test_wildcards(self):
+        self.assertTrue(topic_matches('led/+/show/start', 'led/tree/show/start'))
+        self.assertTrue(topic_matches('led/#', 'led/tree/show/start'))
+        self.assertTrue(topic_matches('led/#', 'led'))
+        self.assertFalse(topic_matches('led/+', 'led/tree/show'))
+        self.assertFalse(topic_matches('led/tree/show', 'led/tree'))
+
+
+class TestFakeBroker(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+        self.broker.start()
+        self.addCleanup(self.broker.stop)  # runs after the cleanup of the clients
+        self.received = []
+        self.arrived = threading.Event()
+
+    def connect(self, subscription: str = None) -> paho.mqtt.client.Client:
+        connected = threading.Event()
+        subscribed = threading.Event()
+
+        def on_message(client, userdata, msg):
+            self.received.append((msg.topic, msg.payload, msg.retain))
+            self.arrived.set()
+
+        client = paho.mqtt.client.Client()
+        client.on_message = on_message
+        client.on_connect = lambda *args: connected.set()
+        client.on_subscribe = lambda *args: subscribed.set()
+        client.connect(self.broker.host, self.broker.port)
+        client.loop_start()
+        self.addCleanup(client.loop_stop)
+        self.addCleanup(client.disconnect)
+        self.assertTrue(connected.wait(1))
+        if subscription is not None:
+            client.subscribe(subscription, qos=1)
+            self.assertTrue(subscribed.wait(1))
+        return client
+
+    def test_publish_and_subscribe(self):
+        self.connect('led/+/show/start')
+        publisher = self.connect()
+        publisher.publish('led/tree/show/start', b'{"name": "clear"}', qos=1)
+
+        self.assertTrue(self.arrived.wait(1))
+        self.assertEqual(self.received, [('led/tree/show/start', b'{"name": "clear"}', False)])
+        self.assertEqual(self.broker.wait_for_message('led/tree/show/start').payload, b'{"name": "clear"}')
+
+    def test_retained_message_on_subscription(self):
+        publisher = self.connect()
+        publisher.publish('led/tree/show/current', b'rainbow', qos=1, retain=True)
+        self.assertIsNotNone(self.broker.wait_for_message('led/tree/show/current'))
+
+        self.connect('led/tree/show/current')
+        self.assertTrue(self.arrived.wait(1))
+        self.assertEqual(self.received, [('led/tree/show/current', b'rainbow', True)])
+
+    def test_injected_message(self):
+        self.connect('led/#')
+        self.broker.publish('led/tree/global-brightness/set', '0.5')
+        self.assertTrue(self.arrived.wait(1))
+        self.assertEqual(self.received[0][:2], ('led/tree/global-brightness/set', b'0.5'))
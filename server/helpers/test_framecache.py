@@ -0,0 +1,111 @@
+# Tests for helpers.framecache
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for :py:class:`helpers.framecache.FrameCache` and the replay of cached color cycles"""
+
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from drivers.dummy import DummyDriver
+from drivers.test_apa102 import make_strip
+from helpers.framecache import FrameCache, FrameSequence
+from lightshows.rainbow import Rainbow
+
+
+def make_sequence(strip, num_frames: int) -> FrameSequence:
+    sequence = FrameSequence.empty(num_frames, strip)
+    for index in range(num_frames):
+        strip.fill((index, 2 * index, 3 * index))
+        sequence.store(index, strip)
+    return sequence
+
+
+class TestFrameSequence(unittest.TestCase):
+    def test_replay_restores_message_buffer(self):
+        strip = make_strip(20)
+        strip.set_pixels(slice(None), np.linspace(0, 255, 60).reshape(20, 3))
+        expected_colors, expected_message = np.rint(strip.color_buffer), bytes(strip.leds)
+
+        sequence = FrameSequence.empty(1, strip)
+        sequence.store(0, strip)
+        strip.fill((0, 0, 0))
+        sequence.load(0, strip)
+
+        self.assertEqual(bytes(strip.leds), expected_message)
+        np.testing.assert_array_equal(strip.color_buffer, expected_colors)
+
+    def test_load_on_frozen_strip(self):
+        strip = DummyDriver(5)
+        sequence = make_sequence(strip, 2)
+        strip.freeze()
+        sequence.load(1, strip)
+        self.assertEqual(strip.get_pixel(0), (1, 2, 3))  # the last filled color, not changed by load
+
+
+class TestFrameCache(unittest.TestCase):
+    def setUp(self):
+        self.strip = DummyDriver(10)
+
+    def test_lru_eviction(self):
+        sequence_bytes = make_sequence(self.strip, 4).nbytes
+        cache = FrameCache(max_bytes=2 * sequence_bytes)
+        cache.put('a', make_sequence(self.strip, 4))
+        cache.put('b', make_sequence(self.strip, 4))
+        cache.get('a')  # now 'b' is the least recently used sequence
+        cache.put('c', make_sequence(self.strip, 4))
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.size_bytes, 2 * sequence_bytes)
+
+    def test_too_large_sequence_is_not_kept(self):
+        cache = FrameCache(max_bytes=10)
+        cache.put('a', make_sequence(self.strip, 4))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size_bytes, 0)
+
+    def test_directory_survives_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sequence = make_sequence(self.strip, 4)
+            FrameCache(directory=directory).put('a', sequence)
+
+            restored = FrameCache(directory=directory).get('a')
+            self.assertIsInstance(restored.frames, np.memmap)
+            np.testing.assert_array_equal(restored.frames, sequence.frames)
+
+    def test_key(self):
+        key = FrameCache.key('rainbow', {'num_steps_per_cycle': 255}, self.strip)
+        self.assertEqual(key, FrameCache.key('rainbow', {'num_steps_per_cycle': 255}, DummyDriver(10)))
+        self.assertNotEqual(key, FrameCache.key('rainbow', {'num_steps_per_cycle': 255}, DummyDriver(11)))
+        self.assertNotEqual(key, FrameCache.key('rainbow', {'num_steps_per_cycle': 100}, self.strip))
+
+    def test_key_depends_on_encoding(self):
+        strip, hdr_strip = make_strip(10), make_strip(10)
+        hdr_strip.hdr = True
+        self.assertNotEqual(FrameCache.key('rainbow', {}, strip), FrameCache.key('rainbow', {}, hdr_strip))
+
+
+class TestCachedColorCycle(unittest.TestCase):
+    def test_replayed_cycle_equals_rendered_cycle(self):
+        cache = FrameCache()
+        strip = make_strip(30)
+        show = Rainbow(strip, {'num_steps_per_cycle': 10, 'num_cycles': 2},
+                       mqtt_client=mock.Mock(), config=mock.Mock())
+
+        with mock.patch('lightshows.templates.colorcycle.get_frame_cache', return_value=cache), \
+                mock.patch.object(strip, 'fps', 10000):
+            show.run()
+
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 1)
+        sent = strip.spi.sent
+        message_length = len(strip.spi_message)
+        frames = [sent[i:i + message_length] for i in range(0, len(sent), message_length)]
+        self.assertEqual(len(frames), 1 + 2 * 10)  # the initial frame plus two cycles
+        self.assertEqual(frames[1:11], frames[11:])  # the second cycle was replayed from the cache
@@ -0,0 +1,49 @@
+# Tests for helpers.framefile
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for reading and writing frame files"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from helpers.exceptions import InvalidParameters
+from helpers.framefile import BRIGHTNESS, TIMESTAMPS, FrameFileHeader, open_frames, write_frames
+
+
+class TestFrameFile(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'test.102f')
+
+    def test_round_trip(self):
+        header = FrameFileHeader(num_leds=5, fps=30.0, flags=BRIGHTNESS | TIMESTAMPS)
+        frames = np.zeros(4, dtype=header.dtype)
+        frames['time'] = np.arange(4) / 30
+        frames['colors'] = np.arange(4 * 5 * 3).reshape(4, 5, 3)
+        frames['brightness'] = 255
+        write_frames(self.filename, header, frames)
+
+        read_header, read_frames = open_frames(self.filename)
+        self.assertEqual((read_header.num_leds, read_header.fps, read_header.flags),
+                         (5, 30.0, BRIGHTNESS | TIMESTAMPS))
+        self.assertEqual(os.path.getsize(self.filename), 32 + 4 * (8 + 5 * 3 + 5))  # fixed stride
+        np.testing.assert_array_equal(read_frames, frames)
+
+    def test_incomplete_last_frame_is_ignored(self):
+        header = FrameFileHeader(num_leds=2, fps=10.0)
+        write_frames(self.filename, header, np.ones(3, dtype=header.dtype))
+        with open(self.filename, 'ab') as file:
+            file.write(b'\x01\x02')
+
+        self.assertEqual(len(open_frames(self.filename)[1]), 3)
+
+    def test_wrong_magic_fails(self):
+        with open(self.filename, 'wb') as file:
+            file.write(b'\x00' * 64)
+
+        self.assertRaises(InvalidParameters, open_frames, self.filename)
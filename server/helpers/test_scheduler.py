@@ -0,0 +1,51 @@
+# Tests for helpers.scheduler
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for :py:class:`helpers.scheduler.FrameScheduler`"""
+
+import time
+import unittest
+from unittest import mock
+
+from helpers.scheduler import FrameScheduler
+
+
+class TestFrameScheduler(unittest.TestCase):
+    def test_deadlines_do_not_drift(self):
+        scheduler = FrameScheduler(fps=100)
+        for _ in range(10):
+            time.sleep(0.002)  # "render" a frame
+            scheduler.wait_for_next_frame()
+        self.assertAlmostEqual(time.perf_counter() - scheduler.start_time, 0.1, delta=0.02)
+        self.assertEqual(scheduler.frame_count, 10)
+        self.assertEqual(scheduler.dropped_frames, 0)
+
+    def test_missed_deadlines_are_dropped(self):
+        clock = [100.0]
+        with mock.patch('time.perf_counter', lambda: clock[0]):
+            scheduler = FrameScheduler(fps=100)
+            clock[0] += 0.035  # a slow frame: the deadlines at 10, 20 and 30 ms are gone
+            scheduler.wait_for_next_frame()
+        self.assertEqual(scheduler.late_frames, 1)
+        self.assertEqual(scheduler.dropped_frames, 2)
+        self.assertGreater(scheduler.next_deadline, scheduler.start_time + 0.025)
+
+    def test_late_frame_does_not_wait(self):
+        scheduler = FrameScheduler(fps=100)
+        time.sleep(0.015)
+        before = time.perf_counter()
+        scheduler.wait_for_next_frame()
+        self.assertLess(time.perf_counter() - before, 0.005)
+
+    def test_sleep_with_spinning(self):
+        scheduler = FrameScheduler(fps=60, spin_sec=0.001)
+        before = time.perf_counter()
+        scheduler.sleep(0.01)
+        self.assertGreaterEqual(time.perf_counter() - before, 0.01)
+
+    def test_fps_property(self):
+        scheduler = FrameScheduler(fps=50)
+        self.assertAlmostEqual(scheduler.frame_period, 0.02)
+        scheduler.fps = 25
+        self.assertAlmostEqual(scheduler.frame_period, 0.04)
@@ -0,0 +1,88 @@
+# Tests for helpers.schema
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Tests that the compiled parameter checks of :py:mod:`helpers.schema` agree with the verifiers
+of :py:mod:`helpers.verify`
+"""
+
+import json
+import unittest
+
+from helpers import verify
+from helpers.exceptions import *
+from helpers.preprocessors import list_to_tuple
+from helpers.schema import ParameterSchema
+
+
+def unchanged(value):
+    return value
+
+
+class TestParameterSchema(unittest.TestCase):
+    candidates = [0, 1, -1, 0.0, 0.5, 255, 256, 3, 10, 11, True, False, None, "1", "", "..", "file", "a/b",
+                  (0, 0, 0), (255, 128.5, 0), (0, 256, 0), (0, 0), [1, 2, 3], float('inf')]
+
+    definitions = [(verify.numeric, [], {}),
+                   (verify.numeric, [], {'minimum': 0, 'maximum': 10}),
+                   (verify.not_negative_numeric, [], {}),
+                   (verify.positive_numeric, [], {}),
+                   (verify.integer, [], {'minimum': 1}),
+                   (verify.integer, [], {'maximum': 10}),
+                   (verify.integer, [3, 10], {}),
+                   (verify.not_negative_integer, [], {}),
+                   (verify.positive_integer, [], {}),
+                   (verify.boolean, [], {}),
+                   (verify.rgb_color_tuple, [], {}),
+                   (verify.file_name, [], {})]
+
+    def test_checks_agree_with_verifiers(self):
+        for verifier, args, kwargs in self.definitions:
+            schema = ParameterSchema()
+            schema.add('value', verifier, args, kwargs, unchanged)
+            for candidate in self.candidates:
+                try:
+                    verifier(candidate, 'value', *args, **kwargs)
+                except InvalidParameters:
+                    valid = False
+                else:
+                    valid = True
+                self.assertEqual(schema.parameters['value'].check(candidate), valid,
+                                 msg="{} {} {}: {!r}".format(verifier.__name__, args, kwargs, candidate))
+
+    def test_all_errors_are_reported(self):
+        schema = ParameterSchema()
+        schema.add('color', verify.rgb_color_tuple, [], {}, list_to_tuple)
+        schema.add('time_sec', verify.positive_numeric, [], {}, unchanged)
+
+        self.assertEqual(schema.validate({'color': [1, 2, 3], 'time_sec': 2}), {'color': (1, 2, 3), 'time_sec': 2})
+        with self.assertRaises(InvalidParameters) as context:
+            schema.validate({'color': [1, 2], 'time_sec': 2, 'speed': 3})
+        self.assertIn('color', str(context.exception))
+        self.assertIn('speed', str(context.exception))
+        self.assertNotIn('time_sec', str(context.exception))
+
+    def test_custom_verifier(self):
+        def even(candidate, param_name):
+            if candidate % 2:
+                raise InvalidParameters("Parameter {} must be even!".format(param_name))
+
+        schema = ParameterSchema()
+        schema.add('number', even, [], {}, unchanged)
+        self.assertEqual(schema.validate({'number': 4}), {'number': 4})
+        self.assertRaises(InvalidParameters, schema.validate, {'number': 5})
+
+    def test_description(self):
+        schema = ParameterSchema()
+        schema.add('velocity', verify.integer, [], {'minimum': 1, 'maximum': 10}, unchanged)
+        schema.add('fadeout', verify.boolean, [], {}, unchanged)
+        self.assertEqual(json.loads(schema.to_json()),
+                         {'type': 'object',
+                          'properties': {'velocity': {'type': 'integer', 'minimum': 1, 'maximum': 10},
+                                         'fadeout': {'type': 'boolean'}},
+                          'additionalProperties': False})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -140,3 +140,17 @@ class TestVerifyRGBColorTuple(unittest.TestCase):
 
     def test_int_passes(self):
         self.assertIsNone(verify.rgb_color_tuple(candidate=(123, 234, 12)))
+
+
+class TestVerifyFileName(unittest.TestCase):
+    def test_path_fails(self):
+        self.assertRaises(InvalidParameters, verify.file_name, candidate="../secret.102f")
+
+    def test_parent_directory_fails(self):
+        self.assertRaises(InvalidParameters, verify.file_name, candidate="..")
+
+    def test_number_fails(self):
+        self.assertRaises(InvalidParameters, verify.file_name, candidate=42)
+
+    def test_name_passes(self):
+        self.assertIsNone(verify.file_name(candidate="sunrise.102f"))
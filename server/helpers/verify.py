@@ -10,19 +10,33 @@ InvalidParameters exceptions if the input does not fit the requirements. #fixme:
 from helpers.exceptions import InvalidParameters
 
 
-def numeric(candidate, param_name: str = None, minimum: float = None, maximum: float = None):
+def in_range(candidate, minimum: float = None, maximum: float = None) -> bool:
+    """\
+    :param candidate: the number to be tested
+    :param minimum: minimum (``None`` means no minimum)
+    :param maximum: maximum (``None`` means no maximum)
+    :return: ``True`` if the number lies between minimum and maximum
     """
-    number (between minimum and maximum)
+    return (minimum is None or candidate >= minimum) and (maximum is None or candidate <= maximum)
 
-    :param candidate: the object to be tested
+
+def range_error_message(kind: str, candidate, param_name: str = None, minimum: float = None,
+                        maximum: float = None) -> str:
+    """\
+    builds the error message for a value that is not a number of the given kind in the given range.
+    The verifiers only call this if the value is invalid.
+
+    :param kind: the expected kind of number, e.g. ``"an integer"``
+    :param candidate: the invalid value
     :param param_name: name of the parameter (to be included in the error message)
-    :param minimum: minimum (of a closed set)
-    :param maximum: maximum (of a closed set)
+    :param minimum: minimum
+    :param maximum: maximum
+    :return: the error message
     """
     if param_name:
-        debug_str = "Parameter \"{name}\" must be a number".format(name=param_name)
+        debug_str = "Parameter \"{name}\" must be {kind}".format(name=param_name, kind=kind)
     else:
-        debug_str = "Parameter must be a number"
+        debug_str = "Parameter must be {kind}".format(kind=kind)
 
     if minimum is not None and maximum is not None:
         debug_str += " between {min} and {max}".format(min=minimum, max=maximum)
@@ -31,14 +45,20 @@ def numeric(candidate, param_name: str = None, minimum: float = None, maximum: f
     elif maximum is not None:
         debug_str += " <= {}".format(maximum)
 
-    debug_str += "! (got: {})".format(candidate)
+    return debug_str + "! (got: {})".format(candidate)
 
-    if type(candidate) not in (float, int):
-        raise InvalidParameters(debug_str)
-    if minimum is not None and candidate < minimum:
-        raise InvalidParameters(debug_str)
-    if maximum is not None and candidate > maximum:
-        raise InvalidParameters(debug_str)
+
+def numeric(candidate, param_name: str = None, minimum: float = None, maximum: float = None):
+    """
+    number (between minimum and maximum)
+
+    :param candidate: the object to be tested
+    :param param_name: name of the parameter (to be included in the error message)
+    :param minimum: minimum (of a closed set)
+    :param maximum: maximum (of a closed set)
+    """
+    if type(candidate) not in (float, int) or not in_range(candidate, minimum, maximum):
+        raise InvalidParameters(range_error_message("a number", candidate, param_name, minimum, maximum))
 
 
 def not_negative_numeric(candidate, param_name: str = None):
@@ -80,26 +100,8 @@ def integer(candidate, param_name: str = None, minimum: float = None, maximum: f
     :param minimum: minimum
     :param maximum: maximum
     """
-    if param_name:
-        debug_str = "Parameter \"{name}\" must be an integer".format(name=param_name)
-    else:
-        debug_str = "Parameter must be an integer"
-
-    if minimum is not None and maximum is not None:
-        debug_str += " between {min} and {max}".format(min=minimum, max=maximum)
-    elif minimum is not None:
-        debug_str += " >= {}".format(minimum)
-    elif maximum is not None:
-        debug_str += " <= {}".format(maximum)
-
-    debug_str += "! (got: {})".format(candidate)
-
-    if type(candidate) is not int:
-        raise InvalidParameters(debug_str)
-    if minimum is not None and candidate < minimum:
-        raise InvalidParameters(debug_str)
-    if maximum is not None and candidate > maximum:
-        raise InvalidParameters(debug_str)
+    if type(candidate) is not int or not in_range(candidate, minimum, maximum):
+        raise InvalidParameters(range_error_message("an integer", candidate, param_name, minimum, maximum))
 
 
 def not_negative_integer(candidate, param_name: str = None):
@@ -154,19 +156,26 @@ def rgb_color_tuple(candidate, param_name: str = None):
     :param candidate: the object to be tested
     :param param_name: name of the parameter (to be included in the error message)
     """
-    if param_name:
-        debug_str = "Parameter \"{name}\" must be an RGB color tuple!".format(name=param_name)
-    else:
-        debug_str = "Parameter must be an RGB color tuple!"
-
-    if type(candidate) is not tuple:
+    # an rgb tuple has three numeric components
+    if type(candidate) is not tuple or len(candidate) != 3 or \
+            not all(type(component) in (float, int) and 0 <= component <= 255 for component in candidate):
+        if param_name:
+            debug_str = "Parameter \"{name}\" must be an RGB color tuple!".format(name=param_name)
+        else:
+            debug_str = "Parameter must be an RGB color tuple!"
         raise InvalidParameters(debug_str)
 
-    if len(candidate) != 3:  # an rgb tuple has three components
-        raise InvalidParameters(debug_str)
 
-    for component in candidate:
-        try:
-            numeric(component, minimum=0, maximum=255)
-        except InvalidParameters:
-            raise InvalidParameters(debug_str)
+def file_name(candidate, param_name: str = None):
+    """
+    The name of a file inside a given directory: a non-empty string without any path separators
+
+    :param candidate: the object to be tested
+    :param param_name: name of the parameter (to be included in the error message)
+    """
+    if type(candidate) is not str or candidate in ('', '.', '..') or '/' in candidate or '\\' in candidate:
+        if param_name:
+            debug_str = "Parameter \"{name}\" must be a file name without a path!".format(name=param_name)
+        else:
+            debug_str = "Parameter must be a file name without a path!"
+        raise InvalidParameters(debug_str)
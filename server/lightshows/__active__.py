@@ -7,6 +7,7 @@ from lightshows import *
 
 shows = {'christmas': christmas.Christmas,  # A list of available shows
          'clear': clear.Clear,
+         'playback': playback.Playback,
          'rainbow': rainbow.Rainbow,
          'rgbtest': rgbtest.RGBTest,
          'spinthebottle': spinthebottle.SpinTheBottle,
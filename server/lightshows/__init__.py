@@ -10,6 +10,7 @@ and displays animations on an LED strip.
 
 __all__ = ['christmas',
            'clear',
+           'playback',
            'rainbow',
            'rgbtest',
            'solidcolor',
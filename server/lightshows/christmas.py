@@ -7,30 +7,14 @@
 from lightshows.templates.base import *
 from helpers.color import SmoothBlend, blend_whole_strip_to_color
 from helpers import verify
-from helpers.exceptions import InvalidParameters
 
 
 class Christmas(Lightshow):
     def init_parameters(self):
-        self.velocity = 5
-        self.num_cycles = {"merry_go_round": 3,
-                           "chunk_blendover": 5,
-                           "whole_blendover": 5}
-
-    def set_parameter(self, param_name: str, value, **kwargs):
-        if param_name == "merry_go_round":
-            verify.not_negative_integer(value, "merry_go_round")
-            self.num_cycles["merry_go_round"] = value
-        elif param_name == "chunk_blendover":
-            verify.not_negative_integer(value, "chunk_blendover")
-            self.num_cycles["chunk_blendover"] = value
-        elif param_name == "whole_blendover":
-            verify.not_negative_integer(value, "whole_blendover")
-        elif param_name == "velocity":
-            verify.integer(value, "velocity", minimum=1, maximum=10)
-            self.velocity = value
-        else:
-            super(Christmas, self).set_parameter(param_name, value, **kwargs)
+        self.register('velocity', 5, verify.integer, kwargs={'minimum': 1, 'maximum': 10})
+        self.register('merry_go_round', 3, verify.not_negative_integer)
+        self.register('chunk_blendover', 5, verify.not_negative_integer)
+        self.register('whole_blendover', 5, verify.not_negative_integer)
 
     def check_runnable(self):
         pass
@@ -39,9 +23,9 @@ class Christmas(Lightshow):
         self.mqtt.parse_parameter_changes = True
 
         while True:
-            self.merry_go_round(self.num_cycles["merry_go_round"])
-            self.chunk_blendover(self.num_cycles["chunk_blendover"])
-            self.whole_blendover(self.num_cycles["whole_blendover"])
+            self.merry_go_round(self.p.value['merry_go_round'])
+            self.chunk_blendover(self.p.value['chunk_blendover'])
+            self.whole_blendover(self.p.value['whole_blendover'])
 
     def chunk_blendover(self, num_cycles: int = 1):
         transition = SmoothBlend(self.strip)
@@ -49,8 +33,8 @@ class Christmas(Lightshow):
         chunk_size = 60
         red = 255, 0, 0
         green = 0, 255, 0
-        blendtime_sec = lambda: self.velocity
-        pause_sec = lambda: 3 * self.velocity
+        blendtime_sec = lambda: self.p.value['velocity']
+        pause_sec = lambda: 3 * self.p.value['velocity']
 
         for _ in range(num_cycles):
             for led_num in range(self.strip.num_leds):
@@ -70,8 +54,8 @@ class Christmas(Lightshow):
             self.sleep(pause_sec())
 
     def whole_blendover(self, num_cycles: int = 1):
-        blendtime_sec = lambda: self.velocity
-        pause_sec = lambda: 3 * self.velocity
+        blendtime_sec = lambda: self.p.value['velocity']
+        pause_sec = lambda: 3 * self.p.value['velocity']
 
         for _ in range(num_cycles):
             blend_whole_strip_to_color(self.strip, (255, 20, 10), fadetime_sec=blendtime_sec())
@@ -97,7 +81,7 @@ class Christmas(Lightshow):
         transition.blend()
 
     def merry_go_round(self, num_cycles: int = 1):
-        pause_sec = lambda: 0.5 / self.velocity
+        pause_sec = lambda: 0.5 / self.p.value['velocity']
 
         self.static_red_green()
         self.strip.show()
@@ -0,0 +1,154 @@
+# Playback
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+import os
+import time
+
+import numpy as np
+
+from helpers.framefile import BRIGHTNESS, TIMESTAMPS, open_frames
+from lightshows.templates.base import *
+
+
+class Playback(Lightshow):
+    """\
+    Plays a recorded or pre-rendered animation from a frame file (see :py:mod:`helpers.framefile`).
+    The file is memory-mapped (unless it is compressed), so only the frames that are actually shown are read
+    from the disk.
+
+    Parameters:
+       =====================================================================
+       ||                     ||    python     ||   JSON representation   ||
+       || file:               ||      str      ||         string          ||
+       || loop:               ||     bool      ||          bool           ||
+       || rate:               ||    numeric    ||        numeric          ||
+       || seek_sec:           ||    numeric    ||        numeric          ||
+       =====================================================================
+
+    ``file`` is the name of the frame file in the playback directory (see the ``Playback`` section of the
+    configuration). ``rate`` is the playback speed (``2.0`` plays twice as fast) and setting ``seek_sec``
+    jumps to this position of the animation. If the file has fewer LEDs than the strip,
+    the other LEDs stay dark. If it has more, the surplus LEDs are ignored.
+    """
+
+    def init_parameters(self):
+        # MQTT-settable
+        self.register('file', None, verify.file_name)
+        self.register('loop', True, verify.boolean)
+        self.register('rate', 1.0, verify.positive_numeric)
+        self.register('seek_sec', 0.0, verify.not_negative_numeric)
+
+        # private
+        self.header = None  # header of the opened file
+        self.frames = None  # memory-mapped frames of the opened file
+        self.opened_file = None  # value of the "file" parameter when the file was opened
+        self.seek_requested = True  # jump to seek_sec before the next frame
+
+    def commit_parameters(self, values: dict, send_mqtt_update: bool = True) -> None:
+        super().commit_parameters(values, send_mqtt_update)
+        if 'seek_sec' in values:
+            self.seek_requested = True
+
+    def path(self, file: str) -> str:
+        """path of a frame file in the playback directory"""
+        server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(server_dir, self.mqtt.global_conf.Playback.directory, file)
+
+    def open(self) -> None:
+        """\
+        memory-maps the frame file that the ``file`` parameter names
+
+        :raises InvalidParameters: if the file does not exist or is not a valid frame file
+        """
+        file = self.p.value['file']
+        try:
+            header, frames = open_frames(self.path(file))
+        except OSError as error:
+            raise InvalidParameters("Could not open the frame file \"{}\": {}".format(file, error.strerror))
+        if not len(frames):
+            raise InvalidParameters("The frame file \"{}\" contains no frames".format(file))
+        if not header.flags & TIMESTAMPS and header.fps <= 0:
+            raise InvalidParameters("The frame file \"{}\" has no valid frame rate".format(file))
+
+        self.header, self.frames, self.opened_file = header, frames, file
+        self.logger.debug("opened {} with {} frames of {} LEDs".format(file, len(frames), header.num_leds))
+
+    def check_runnable(self):
+        if self.p.value['file'] is None:
+            raise InvalidParameters.missing('file')
+        self.open()
+
+    @property
+    def duration_sec(self) -> float:
+        """length of the animation in the opened file (in seconds)"""
+        frame_period = 1 / self.header.fps if self.header.fps > 0 else 0.0
+        if self.header.flags & TIMESTAMPS:
+            times = self.frames['time']
+            return float(times[-1] - times[0]) + frame_period  # the last frame is visible for one period
+        return len(self.frames) * frame_period
+
+    def frame_index(self, position_sec: float) -> int:
+        """\
+        :param position_sec: position in the animation (in seconds)
+        :return: index of the frame that is visible at this position
+        """
+        if self.header.flags & TIMESTAMPS:
+            times = self.frames['time']
+            return max(int(np.searchsorted(times, times[0] + position_sec, side='right')) - 1, 0)
+        return min(int(position_sec * self.header.fps), len(self.frames) - 1)
+
+    def show_frame(self, index: int) -> None:
+        """puts a frame of the file into the strip buffer"""
+        frame = self.frames[index]
+        num_leds = min(self.header.num_leds, self.strip.num_leds)
+        self.strip.set_pixels(slice(0, num_leds), frame['colors'][:num_leds])
+        if self.header.flags & BRIGHTNESS:
+            self.strip.set_brightnesses(slice(0, num_leds), frame['brightness'][:num_leds] / 255)
+
+    def clear_uncovered_leds(self) -> None:
+        """switches off the LEDs at the end of the strip if the opened file has fewer LEDs than the strip"""
+        if self.strip.num_leds > self.header.num_leds:
+            self.strip.set_pixels(slice(self.header.num_leds, None), (0, 0, 0))
+
+    def run(self):
+        if self.frames is None:
+            self.open()
+        self.clear_uncovered_leds()
+
+        scheduler = FrameScheduler(self.strip.fps, interrupt=self.stop_event)
+        position_sec = 0.0
+        last_time = scheduler.start_time
+
+        while True:
+            if self.p.value['file'] != self.opened_file:  # another file was set via MQTT
+                try:
+                    self.open()
+                    self.clear_uncovered_leds()
+                    self.seek_requested = True
+                except InvalidParameters as error_message:
+                    self.logger.error(error_message)
+                    self.p.update({'file': self.opened_file})
+
+            if self.seek_requested:
+                position_sec = self.p.value['seek_sec']
+                self.seek_requested = False
+
+            if position_sec >= self.duration_sec:  # the end of the animation
+                if not self.p.value['loop'] or self.duration_sec <= 0:
+                    self.show_frame(len(self.frames) - 1)
+                    self.strip.show()
+                    return
+                position_sec %= self.duration_sec
+
+            self.show_frame(self.frame_index(position_sec))
+            self.strip.show()
+
+            # no need to paint more frames per second than the file contains
+            if self.header.fps > 0:
+                scheduler.fps = min(self.strip.fps, self.header.fps * self.p.value['rate'])
+            scheduler.wait_for_next_frame()
+
+            now = time.perf_counter()
+            position_sec += (now - last_time) * self.p.value['rate']
+            last_time = now
@@ -5,8 +5,7 @@
 from abc import ABCMeta, abstractmethod
 import json
 import logging
-import os
-import signal
+import threading
 import time
 
 import paho.mqtt.client
@@ -14,8 +13,15 @@ import paho.mqtt.client
 import helpers.mqtt
 import helpers.verify as verify
 from drivers import LEDStrip
-from helpers.configparser import get_configuration
+from helpers.configparser import ConfigTree, get_configuration
 from helpers.exceptions import *
+from helpers.scheduler import FrameScheduler
+from helpers.schema import CompiledParameter, ParameterSchema
+
+
+def unchanged(value):
+    """the standard preprocessor of the show parameters: returns the value as it is"""
+    return value
 
 
 class LightshowParameters:
@@ -26,12 +32,40 @@ class LightshowParameters:
        - preprocessor method references
        - verifier method references
        
+    The values should be changed with :py:func:`update`, so the JSON representation of the parameters
+    (see :py:func:`to_json`) is only serialized again for the parameters that changed.
     """
 
     def __init__(self):
         self.value = {}  #: maps the show parameter names to their current values
         self.verifier = {}  #: maps the show parameter names to their verifier functions
         self.preprocessor = {}  #: maps the show parameter names to their preprocessor functions
+        self.generation = 0  #: is increased every time parameter values are changed by :py:func:`update`
+        self.serialized = {}  #: maps the show parameter names to the JSON representations of their values
+        self.__json = None  # cached JSON representation of all values
+
+    def update(self, values: dict) -> None:
+        """\
+        Changes several parameter values at once
+
+        :param values: maps the parameter names to their new (already verified) values
+        """
+        self.value.update(values)
+        for name, value in values.items():
+            self.serialized[name] = json.dumps(value)
+        self.__json = None
+        self.generation += 1
+
+    def to_json(self) -> str:
+        """\
+        :return: the current values as JSON object (the same as :samp:`json.dumps({p}.value)`)
+        """
+        if self.__json is None:
+            for name in self.value.keys() - self.serialized.keys():  # set without update()
+                self.serialized[name] = json.dumps(self.value[name])
+            self.__json = '{' + ', '.join(json.dumps(name) + ': ' + self.serialized[name]
+                                          for name in self.value) + '}'
+        return self.__json
 
 
 class Lightshow(metaclass=ABCMeta):
@@ -45,24 +79,33 @@ class Lightshow(metaclass=ABCMeta):
 
                            parameters = {'example_rgb_color': (255,127,8),
                                          'an_arbitrary_fade_time_sec': 1.5}
+    :param mqtt_client: An already connected Paho MQTT client that the show should use for publishing.
+                        If it is not given, the show opens its own connection to the broker.
+    :param config: The configuration tree. If it is not given, it is read from the configuration files.
     """
 
     # Attributes
     p = None  #: The object that stores all show parameters
+    schema = None  #: the compiled parameters: the schema of the class, unless they depend on this object
 
     logger = None  #: The logger object this show will use for debug output
     mqtt = None  #: represents the MQTT connection for parsing parameter changes #FIXME: type annotation
     strip = None  #: the object representing the LED strip (driver) #FIXME: type annotation
 
-    def __init__(self, strip: LEDStrip, parameters: dict):
+    def __init__(self, strip: LEDStrip, parameters: dict, mqtt_client: paho.mqtt.client.Client = None,
+                 config: ConfigTree = None):
         # logger
         self.logger = logging.getLogger('102shows.server.lightshows.' + self.name)
 
         # MQTT listener
-        self.mqtt = self.MQTTListener(self)
+        self.mqtt = self.MQTTListener(self, mqtt_client, config)
+
+        # is set by stop()
+        self.stop_event = threading.Event()
 
         # Parameters
         self.p = LightshowParameters()
+        self.schema = self.class_schema()
         self.strip = strip
         self.init_parameters()  # let the child class set its own default parameters
 
@@ -76,21 +119,32 @@ class Lightshow(metaclass=ABCMeta):
         return subclass_name.lower()
 
     def start(self) -> None:
-        """invokes the :py:func:`run` method and after that synchronizes the shared buffer"""
-        # before
-        signal.signal(signal.SIGINT, self.stop)  # attach stop() to SIGINT
-        self.strip.sync_down()
+        """\
+        Invokes the :py:func:`run` method and after that :py:func:`idle_forever`.
+        This method returns when the show is stopped (see :py:func:`stop`).
+
+        While the show runs, brightness and parameter changes from MQTT are applied
+        at the frame boundaries (see :py:func:`MQTTListener.apply_pending_updates`).
+        """
         self.mqtt.start_listening()
+        self.strip.frame_hooks.append(self.mqtt.apply_pending_updates)
 
-        self.run()  # run the show
+        try:
+            self.run()  # run the show
 
-        # loop and listen to brightness changes until the end
-        self.idle_forever()
+            # loop and listen to brightness changes until the end
+            self.idle_forever()
+        except ShowStopped:
+            self.logger.debug("show was stopped")
+        finally:
+            self.strip.frame_hooks.remove(self.mqtt.apply_pending_updates)
+            self.mqtt.stop_listening()
 
     def idle_forever(self, delay_sec: float = -1) -> None:
         """\
         Just does nothing and invokes :py:func:`drivers.LEDStrip.show` until the end of time
-        (or a call of :py:func:`stop`)
+        (or a call of :py:func:`stop`).
+        If a brightness or parameter change arrives, the strip is shown earlier (but at most once per frame).
 
         :param delay_sec: Time between two calls of :py:func:`drivers.LEDStrip.show`
         """
@@ -98,46 +152,43 @@ class Lightshow(metaclass=ABCMeta):
         if delay_sec < 0:
             delay_sec = self.mqtt.global_conf.Strip.refresh_time_sec
 
+        scheduler = FrameScheduler(self.strip.fps, interrupt=self.stop_event)
         while True:
             self.strip.show()
-            time.sleep(delay_sec)  # do not refresh in this time
+            self.mqtt.updates_pending.wait(delay_sec)  # do not refresh in this time
+            scheduler.wait_for_next_frame()
 
     def sleep(self, time_sec: float) -> None:
         """\
-        Does nothing (but refreshing the strip a few times) for ``time_sec`` seconds
+        Does nothing (but refreshing the strip once per frame) for ``time_sec`` seconds.
+        Between the frames the process really sleeps, so it does not block a CPU core.
 
         :param time_sec: duration of the break
         """
-        stop_time = time.perf_counter() + time_sec  # when the delay should be over
+        scheduler = FrameScheduler(self.strip.fps, interrupt=self.stop_event)
+        stop_time = scheduler.start_time + time_sec  # when the delay should be over
         final_refresh = stop_time - self.strip.max_refresh_time_sec  # when show() should be invoked for the last time
 
-        while final_refresh > time.perf_counter():  # spend (hopefully most of) the time refreshing the strip
-            self.strip.show()
+        self.strip.show()
+        while scheduler.next_deadline + scheduler.frame_period < final_refresh:
+            scheduler.wait_for_next_frame()
+            self.strip.show()  # shows e.g. brightness changes
 
-        while stop_time > time.perf_counter():  # wait until the end
-            pass
+        scheduler.sleep_until(stop_time)  # wait until the end
 
-    def stop(self, signum=None, frame=None) -> None:
+    def stop(self) -> None:
         """\
-        .. todo:: include link for SIGINT
-
-        This should be called to stop the show with a graceful ending.
+        This should be called (from another thread) to stop the show with a graceful ending.
         It guarantees that the last strip state is uploaded to the global inter-process buffer.
-        This method is called when SIGINT is sent to the show process.
-        The arguments have no influence on the function.
 
-        :param signum: The integer-code of the signal sent to the show process.
-            This has no influence on how the function works.
-        :param frame: #fixme
+        The strip is frozen, so the running animation raises :py:class:`helpers.exceptions.ShowStopped`
+        on its next call of :py:func:`drivers.LEDStrip.show` or :py:func:`sleep` and :py:func:`start` returns.
         """
         self.strip.freeze()
+        self.stop_event.set()
+        self.mqtt.updates_pending.set()  # wakes up idle_forever()
         self.cleanup()  # give the show a chance to clean up (but without changing the buffer)
         self.strip.sync_up()
-        self.suicide()  # then kill all running threads in this process
-
-    def suicide(self) -> None:
-        """terminates its own process"""
-        os.kill(os.getpid(), signal.SIGKILL)
 
     def register(self, parameter_name: str, default_val, verifier, args: list = None, kwargs: dict = None,
                  preprocessor=None) -> None:
@@ -165,38 +216,84 @@ class Lightshow(metaclass=ABCMeta):
         if kwargs is None:
             kwargs = {}
 
-        # standard preprocessor
-        def empty_preprocessor(val):
-            return val
-
         if preprocessor is None:
-            preprocessor = empty_preprocessor
+            preprocessor = unchanged
 
         # check if already registered
         if parameter_name in self.p.value:
             raise InvalidParameters("Parameter {} was already registered".format(parameter_name))
 
         # store parameter
-        self.p.value[parameter_name] = default_val
         self.p.verifier[parameter_name] = (verifier, args, kwargs)
         self.p.preprocessor[parameter_name] = preprocessor
+        self.p.update({parameter_name: default_val})
+
+        # compile the parameter (only once per class)
+        class_schema = self.class_schema()
+        if not class_schema.add(parameter_name, verifier, args, kwargs, preprocessor):
+            # the verifier arguments depend on this object (e.g. on the length of its strip)
+            if self.schema is class_schema:
+                self.schema = class_schema.copy()
+            self.schema.put(CompiledParameter(parameter_name, verifier, args, kwargs, preprocessor))
+        elif self.schema is not class_schema:
+            self.schema.put(class_schema.parameters[parameter_name])
+
+    @classmethod
+    def class_schema(cls) -> ParameterSchema:
+        """\
+        The compiled parameters of the lightshow class.
+        It is built by the first show object of the class and shared by all later ones
+        (see :py:attr:`schema`).
+
+        :return: the schema of the parameters
+        """
+        if '_parameter_schema' not in cls.__dict__:  # not inherited: subclasses have their own parameters
+            cls._parameter_schema = ParameterSchema()
+        return cls._parameter_schema
+
+    def verify_parameter_set(self, parameters: dict) -> dict:
+        """\
+        Pre-processes and verifies a set of parameters without applying them (see :py:class:`helpers.schema`).
+
+        :param parameters: Parameter JSON Object, represented as a Python :py:class:`dict`
+        :return: the pre-processed values of the parameters
+        :raises InvalidParameters: if any of the parameters is unknown or invalid (the message contains all errors)
+        """
+        return self.schema.validate(parameters)
+
+    def commit_parameters(self, values: dict, send_mqtt_update: bool = True) -> None:
+        """\
+        Stores a set of verified parameters (see :py:func:`verify_parameter_set`) in p.value all at once.
+        Lightshows can extend this method to react to parameter changes.
+
+        :param values: maps the parameter names to their new values
+        :param send_mqtt_update: Send the updated parameter array to the MQTT current parameter path after update
+        """
+        self.p.update(values)
+        if send_mqtt_update:
+            self.mqtt.send_current_parameter_state()
 
     def apply_parameter_set(self, parameters: dict) -> None:
         """\
-        Applies a set of parameters to the show.
+        Applies a set of parameters to the show as one transaction:
+        if any of the parameters is invalid, none of them is applied.
+        The current parameter state is published once afterwards.
         
         :param parameters: Parameter JSON Object, represented as a Python :py:class:`dict`
-        :return: ``True`` if successful, ``False`` if not
+        :raises InvalidParameters: if the parameters are not given as :py:class:`dict`
         """
-        if type(parameters) is dict:
-            for param_name in parameters:
-                self.set_parameter(param_name, value=parameters[param_name], send_mqtt_update=False)
-            self.mqtt.send_current_parameter_state()
-        else:
+        if type(parameters) is not dict:
             raise InvalidParameters("Parameters payload must be given as JSON like this: " +
                                     "{\"param_name\": 42, \"param2_name\": [255,125,0]}  " +
                                     "(instead received: " + str(parameters) + " ).")
 
+        try:
+            values = self.verify_parameter_set(parameters)
+        except InvalidParameters as error_message:
+            self.logger.warning(error_message)
+        else:
+            self.commit_parameters(values)
+
     def set_parameter(self, param_name: str, value, send_mqtt_update: bool = True) -> None:
         """\
         Take a parameter by name and new value and store it to p.value.
@@ -205,22 +302,12 @@ class Lightshow(metaclass=ABCMeta):
         :param value: new value of the parameter to be stored
         :param send_mqtt_update: Send the updated parameter array to the MQTT current parameter path after update
         """
-
-        # pre-process the value
-        preprocessor = self.p.preprocessor[param_name]
-        value = preprocessor(value)
-
         try:
-            verifier, args, kwargs = self.p.verifier[param_name]
-            verifier(value, param_name, *args, **kwargs)  # run verifier
-        except KeyError:  # param_name not found in p.verifier => unknown
-            self.logger.warning("Parameter {} is unknown!".format_map(param_name))
-        except InvalidParameters as error_message:  # verifier raised an exception
+            values = self.verify_parameter_set({param_name: value})
+        except InvalidParameters as error_message:
             self.logger.warning(error_message)
         else:
-            self.p.value[param_name] = value
-            if send_mqtt_update:
-                self.mqtt.send_current_parameter_state()
+            self.commit_parameters(values, send_mqtt_update)
 
     # next we have the abstract methods that classes MUST implement:
 
@@ -252,7 +339,7 @@ class Lightshow(metaclass=ABCMeta):
     def cleanup(self) -> None:
         """\
         This is called before the show gets terminated.
-        Lightshows can use it to clean up resources before their process is killed.
+        Lightshows can use it to clean up resources before the show ends.
         """
         pass
 
@@ -260,16 +347,49 @@ class Lightshow(metaclass=ABCMeta):
         """\
         This class collects the functions that receive incoming MQTT messages
         and parse them as parameter changes.
+
+        The changes are not applied immediately: only the latest brightness and the latest value of each parameter
+        are kept until the next frame boundary of the show (see :py:func:`apply_pending_updates`).
+        :py:attr:`coalesced_updates` counts the changes that were replaced by a newer one before they were applied,
+        :py:attr:`applied_updates` counts the changes that were actually applied.
+        """
+
+        min_publish_interval_sec = 0.2
+        """\
+        The minimum time (in *seconds*) between two publications of the current brightness and parameter state.
+        Changes in between are collected and the latest state is published at the end of the interval.
         """
 
-        def __init__(self, lightshow):
+        def __init__(self, lightshow, client: paho.mqtt.client.Client = None, global_conf: ConfigTree = None):
             self.logger = logging.getLogger('102shows.server.lightshows.{}.MQTTListener'.format(lightshow.name))
             self.lightshow = lightshow
-            self.global_conf = get_configuration()
+            self.global_conf = global_conf or get_configuration()
+            self.parse_parameter_changes = False
+
+            # changes that wait for the next frame
+            self.lock = threading.Lock()  # messages arrive in another thread than the frames are drawn
+            self.pending_brightness = None
+            self.pending_parameters = {}
+            self.updates_pending = threading.Event()  #: is set if there are changes that wait for the next frame
+            self.coalesced_updates = 0  #: number of changes that were replaced by a newer one before the next frame
+            self.applied_updates = 0  #: number of changes that were applied to the show
+
+            # rate limit for the published state
+            self.publish_lock = threading.Lock()
+            self.unpublished_states = {}  # maps the topics to the payloads that are not published yet
+            self.publish_timer = None
+            self.last_publish_time = -self.min_publish_interval_sec
+
+            if client is not None:
+                # use the given connection: incoming messages are handed to parse_message() by its owner
+                self.client = client
+                self.owns_client = False
+                return
+
             self.client = paho.mqtt.client.Client()
             self.client.on_connect = self.subscribe
             self.client.on_message = self.parse_message
-            self.parse_parameter_changes = False
+            self.owns_client = True
 
             # connect
             if self.global_conf.MQTT.username is not None:
@@ -306,8 +426,8 @@ class Lightshow(metaclass=ABCMeta):
         def parse_message(self, client, userdata, msg) -> None:
             """\
             Function to be executed as ``on_message`` hook of the Paho MQTT client.
-            If the message commands a brightness or parameter change the corresponding
-            hook (:py:func:`set_brightness` or :py:func:`set_parameter`) is called.
+            If the message commands a brightness or parameter change, the change is verified and stored
+            until the next frame of the show (see :py:func:`apply_pending_updates`).
 
             .. todo::
                 - include link to the paho mqtt lib
@@ -328,18 +448,57 @@ class Lightshow(metaclass=ABCMeta):
 
                 try:  # verify that the number is in the defined range
                     verify.numeric(new_brightness, "brightness", minimum=0.0, maximum=1.0)
-                    self.lightshow.strip.set_global_brightness(new_brightness)
                 except helpers.exceptions.InvalidParameters as error_msg:
                     self.logger.error(error_msg)
                     return
 
-                self.set_brightness(new_brightness)  # apply to the strip
+                with self.lock:
+                    if self.pending_brightness is not None:
+                        self.coalesced_updates += 1
+                    self.pending_brightness = new_brightness
+                    self.updates_pending.set()
 
             else:  # must be a show parameter
+                if not self.parse_parameter_changes:
+                    return
+
                 parameters = json.loads(msg.payload.decode())
+                if type(parameters) is not dict:
+                    self.logger.error("Parameters payload must be given as JSON like this: " +
+                                      "{\"param_name\": 42, \"param2_name\": [255,125,0]}  " +
+                                      "(instead received: " + str(parameters) + " ).")
+                    return
 
-                if self.parse_parameter_changes:
-                    self.lightshow.apply_parameter_set(parameters)
+                try:  # a transaction is applied completely or not at all
+                    values = self.lightshow.verify_parameter_set(parameters)
+                except helpers.exceptions.InvalidParameters as error_msg:
+                    self.logger.error(error_msg)
+                    return
+
+                with self.lock:
+                    self.coalesced_updates += len(self.pending_parameters.keys() & values.keys())
+                    self.pending_parameters.update(values)
+                    self.updates_pending.set()
+
+        def apply_pending_updates(self) -> None:
+            """\
+            Applies the brightness and parameter changes that arrived since the last frame.
+            The show calls this at every frame boundary (it is one of the :py:attr:`drivers.LEDStrip.frame_hooks`).
+            """
+            if not self.updates_pending.is_set():  # the usual case: nothing happened
+                return
+
+            with self.lock:
+                brightness, self.pending_brightness = self.pending_brightness, None
+                parameters, self.pending_parameters = self.pending_parameters, {}
+                self.updates_pending.clear()
+
+            if brightness is not None:
+                self.set_brightness(brightness)
+                self.applied_updates += 1
+            if parameters:  # all changes since the last frame at once (they are already verified)
+                self.lightshow.commit_parameters(parameters)
+                self.applied_updates += len(parameters)
 
         def set_brightness(self, brightness: float) -> None:
             """\
@@ -359,18 +518,54 @@ class Lightshow(metaclass=ABCMeta):
             # finally: set brightness of the strip
             self.lightshow.strip.set_global_brightness(brightness)
 
-            self.client.publish(topic=self.global_conf.MQTT.Path.global_brightness_current,
-                                payload=str(brightness),
-                                qos=1,
-                                retain=True)
+            self.publish_state(self.global_conf.MQTT.Path.global_brightness_current, str(brightness))
 
         def send_current_parameter_state(self):
             path = self.global_conf.MQTT.Path.show_parameter_current.format(show_name=self.lightshow.name)
-            self.client.publish(
-                topic=path,
-                payload=json.dumps(self.lightshow.p.value),
-                qos=1,
-                retain=True)
+            self.publish_state(path, self.lightshow.p.to_json())
+
+        def send_parameter_schema(self) -> None:
+            """\
+            Publishes the JSON Schema of the show parameters (see :py:func:`helpers.schema.ParameterSchema.describe`),
+            so user interfaces can validate parameter changes before they send them.
+            """
+            path = self.global_conf.MQTT.Path.show_parameter_schema.format(show_name=self.lightshow.name)
+            self.client.publish(topic=path, payload=self.lightshow.schema.to_json(), qos=1, retain=True)
+
+        def publish_state(self, topic: str, payload: str) -> None:
+            """\
+            Publishes a (retained) state message, but not more often than every :py:attr:`min_publish_interval_sec`.
+            If the last publication is too recent, the message is published at the end of the interval
+            (or replaced by a newer state for the same topic).
+
+            :param topic: topic of the message
+            :param payload: payload of the message
+            """
+            with self.publish_lock:
+                self.unpublished_states[topic] = payload
+                if self.publish_timer is not None:  # the timer will publish the message
+                    return
+
+                wait_sec = self.last_publish_time + self.min_publish_interval_sec - time.perf_counter()
+                if wait_sec > 0:
+                    self.publish_timer = threading.Timer(wait_sec, self.flush_states)
+                    self.publish_timer.daemon = True
+                    self.publish_timer.start()
+                    return
+
+            self.flush_states()
+
+        def flush_states(self) -> None:
+            """publishes the state messages that are waiting (see :py:func:`publish_state`) right now"""
+            with self.publish_lock:
+                if self.publish_timer is not None:
+                    self.publish_timer.cancel()
+                    self.publish_timer = None
+                states, self.unpublished_states = self.unpublished_states, {}
+                self.last_publish_time = time.perf_counter()
+
+            for topic, payload in states.items():
+                self.client.publish(topic=topic, payload=payload, qos=1, retain=True)
 
         def start_listening(self) -> None:
             """\
@@ -378,12 +573,20 @@ class Lightshow(metaclass=ABCMeta):
             given they have the path ``$prefix/$sys_name/$show_name/$parameter``
             ``$parameter`` and the ``$payload`` will be given to
             :py:func:`lightshow.templates.base.Lightshow.set_parameter`
+
+            The schema of the show parameters is published (see :py:func:`send_parameter_schema`).
             """
-            self.client.loop_start()
+            if self.owns_client:
+                self.client.loop_start()
+            self.send_parameter_schema()
 
         def stop_listening(self) -> None:
             """\
             Ends the connection to the MQTT broker.
             Messages from the subscribed topics are not parsed anymore.
+            The state messages that are still waiting are published before.
             """
-            self.client.loop_stop()
+            self.flush_states()
+            if self.owns_client:
+                self.client.disconnect()
+                self.client.loop_stop()
@@ -2,6 +2,8 @@
 # (c) 2015 Martin Erzberger, 2016-2017 Simon Leiner
 # licensed under the GNU Public License, version 2
 
+from helpers.framecache import FrameSequence, get_frame_cache
+from helpers.scheduler import FrameScheduler
 from lightshows.templates.base import *
 
 
@@ -16,6 +18,14 @@ class ColorCycle(Lightshow):
     .. todo:: Write a tutorial on how to write a color cycle
     """
 
+    cacheable = False
+    """\
+    Set this to ``True`` if the frames of a cycle depend only on the parameters, the strip and the step
+    (and not on the previous content of the strip, the time or random numbers).
+    Then the frames are rendered only in the first cycle and replayed from the frame cache
+    (see :py:mod:`helpers.framecache`) afterwards, even in later runs of the show.
+    """
+
     def init_parameters(self) -> None:
         """initializes the default parameters"""
         self.register('pause_sec', 0, verify.not_negative_numeric)
@@ -43,7 +53,8 @@ class ColorCycle(Lightshow):
 
         The following parameters are already set in :py:attribute:`p.value` (but can be changed):
          - ``pause_sec`` (:py:type:`float`): The time (in seconds) between two frames of the color cycle
-            is pre-set to 0.
+            is pre-set to 0, which means that the cycle runs with the frame rate of the strip
+            (:py:attr:`drivers.LEDStrip.fps`).
          - ``num_cycles`` (:py:type:`int`): The number of times the color cycle runs through
             if the lightshow is started.
             After so many complete cycles the lightshow ends.
@@ -72,17 +83,52 @@ class ColorCycle(Lightshow):
         """
         raise NotImplementedError("Please implement the update() method")
 
+    def frame_parameters(self) -> dict:
+        """\
+        Returns the parameters that determine the frames of the cycle (all but the timing parameters).
+        They are part of the key in the frame cache.
+        """
+        return {name: value for name, value in self.p.value.items() if name not in ('pause_sec', 'num_cycles')}
+
     def run(self) -> None:
         """Shows the color cycle on the strip."""
         self.before_start()  # Call the subclasses before_start method
         self.strip.show()
+        scheduler = FrameScheduler(self.strip.fps, interrupt=self.stop_event)
+        cache = get_frame_cache(self.mqtt.global_conf) if self.cacheable else None
         current_cycle = 0
         while True:  # Loop forever (for would not work for num_cycles = infinity)
-            for currentStep in range(self.p.value['num_steps_per_cycle']):
-                need_repaint = self.update(currentStep, current_cycle)  # Call the subclasses update method
+            num_steps = self.p.value['num_steps_per_cycle']
+            cached_frames, recorded_frames = None, None
+            if cache is not None:
+                key = cache.key(self.name, self.frame_parameters(), self.strip)
+                cached_frames = cache.get(key)
+                if cached_frames is None:  # render this cycle and record it
+                    recorded_frames = FrameSequence.empty(num_steps, self.strip)
+            parameter_generation = self.p.generation
+
+            for currentStep in range(num_steps):
+                if self.p.generation != parameter_generation:  # the frames of this cycle are not valid anymore
+                    cached_frames, recorded_frames = None, None
+
+                if cached_frames is not None:
+                    cached_frames.load(currentStep, self.strip)
+                    need_repaint = True
+                else:
+                    need_repaint = self.update(currentStep, current_cycle)  # Call the subclasses update method
+                    if recorded_frames is not None:
+                        recorded_frames.store(currentStep, self.strip)
                 if need_repaint:
                     self.strip.show()  # Display, only if required
-                self.sleep(self.p.value['pause_sec'])  # Pause until the next step
+                # Pause until the next step, but keep refreshing the strip at its frame rate
+                step_end = scheduler.next_deadline + self.p.value['pause_sec']
+                scheduler.wait_for_next_frame()
+                while scheduler.next_deadline < step_end:
+                    self.strip.show()  # shows e.g. brightness changes
+                    scheduler.wait_for_next_frame()
+
+            if recorded_frames is not None and self.p.generation == parameter_generation:
+                cache.put(key, recorded_frames)
             current_cycle += 1
             if current_cycle >= self.p.value['num_cycles']:
                 break
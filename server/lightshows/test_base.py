@@ -0,0 +1,179 @@
+# Tests for the lightshow base template
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Tests for the parameter transactions of the lightshows and for the
+:py:class:`lightshows.templates.base.Lightshow.MQTTListener`, which collects
+brightness and parameter changes and applies them at the frame boundaries
+"""
+
+import json
+import time
+import unittest
+from unittest import mock
+
+import paho.mqtt.client
+
+from benchmarks import get_benchmark_configuration
+from drivers.dummy import DummyDriver
+from helpers.preprocessors import list_to_tuple
+from lightshows.templates.base import *
+
+
+class Counter(Lightshow):
+    """a show with a single parameter that listens to parameter changes"""
+
+    def init_parameters(self):
+        self.register('step', 0, verify.integer, kwargs={'minimum': 0})
+        self.register('color', (255, 0, 0), verify.rgb_color_tuple, preprocessor=list_to_tuple)
+        self.mqtt.parse_parameter_changes = True
+
+    def check_runnable(self):
+        pass
+
+    def run(self):
+        pass
+
+
+class LEDIndex(Counter):
+    """a show with a parameter that depends on the length of the strip"""
+
+    def init_parameters(self):
+        self.register('led', 0, verify.integer, kwargs={'minimum': 0, 'maximum': self.strip.num_leds - 1})
+        self.register('color', (255, 0, 0), verify.rgb_color_tuple, preprocessor=list_to_tuple)
+
+
+def message(topic: str, payload: str) -> paho.mqtt.client.MQTTMessage:
+    msg = paho.mqtt.client.MQTTMessage(topic=topic.encode())
+    msg.payload = payload.encode()
+    return msg
+
+
+class TestParameterTransactions(unittest.TestCase):
+    def setUp(self):
+        self.strip = DummyDriver(10)
+        self.client = mock.Mock()
+        self.show = Counter(self.strip, {}, mqtt_client=self.client, config=get_benchmark_configuration(10))
+
+    def tearDown(self):
+        del self.strip
+
+    def test_parameter_set_is_applied_completely(self):
+        generation = self.show.p.generation
+        self.show.apply_parameter_set({'step': 3, 'color': [0, 255, 0]})
+        self.assertEqual(self.show.p.value, {'step': 3, 'color': (0, 255, 0)})
+        self.assertEqual(self.show.p.generation, generation + 1)
+
+    def test_invalid_parameter_set_is_not_applied(self):
+        for parameters in ({'step': 3, 'color': [0, 256, 0]}, {'step': 3, 'unknown': 1}):
+            self.show.apply_parameter_set(parameters)
+            self.assertEqual(self.show.p.value, {'step': 0, 'color': (255, 0, 0)})
+
+        with self.assertRaises(InvalidParameters):
+            self.show.apply_parameter_set([1, 2, 3])
+
+    def test_json_equals_values(self):
+        self.assertEqual(self.show.p.to_json(), json.dumps(self.show.p.value))
+        for step in range(3):
+            self.show.set_parameter('step', step)
+            self.assertEqual(self.show.p.to_json(), json.dumps(self.show.p.value))
+        self.show.p.update({'color': (1, 2, 3)})
+        self.assertEqual(self.show.p.to_json(), json.dumps(self.show.p.value))
+
+    def test_schema_is_built_once_per_class(self):
+        schema = self.show.schema
+        compiled = schema.parameters['step']
+        other = Counter(self.strip, {}, mqtt_client=self.client, config=get_benchmark_configuration(10))
+        self.assertIs(other.schema, schema)
+        self.assertIs(Counter.class_schema(), schema)
+        self.assertIs(schema.parameters['step'], compiled)
+        self.assertEqual(set(schema.parameters), {'step', 'color'})
+
+    def test_schema_with_object_dependent_bounds(self):
+        config = get_benchmark_configuration(10)
+        short_strip, long_strip = DummyDriver(5), DummyDriver(20)
+        short = LEDIndex(short_strip, {}, mqtt_client=self.client, config=config)
+        long = LEDIndex(long_strip, {}, mqtt_client=self.client, config=config)
+
+        long.apply_parameter_set({'led': 15})
+        self.assertEqual(long.p.value['led'], 15)
+        short.apply_parameter_set({'led': 15})
+        self.assertEqual(short.p.value['led'], 0)
+        short.apply_parameter_set({'led': 4})
+        self.assertEqual(short.p.value['led'], 4)
+        self.assertIs(short.schema.parameters['color'], long.schema.parameters['color'])  # compiled only once
+
+    def test_schema_is_published(self):
+        self.show.mqtt.start_listening()
+        path = self.show.mqtt.global_conf.MQTT.Path.show_parameter_schema.format(show_name='counter')
+        self.client.publish.assert_called_with(topic=path, payload=self.show.schema.to_json(), qos=1, retain=True)
+
+
+class TestMQTTListener(unittest.TestCase):
+    config = get_benchmark_configuration(10)
+
+    def setUp(self):
+        self.strip = DummyDriver(10)
+        self.client = mock.Mock()
+        self.show = Counter(self.strip, {}, mqtt_client=self.client, config=self.config)
+        self.show.mqtt.min_publish_interval_sec = 0
+        self.strip.frame_hooks.append(self.show.mqtt.apply_pending_updates)
+        self.brightness_path = self.config.MQTT.Path.global_brightness_set
+        self.parameter_path = self.config.MQTT.Path.show_parameter_set.format(show_name='counter')
+
+    def tearDown(self):
+        del self.strip
+
+    def test_brightness_is_applied_at_the_next_frame(self):
+        for brightness in ('0.1', '0.2', '0.3'):
+            self.show.mqtt.parse_message(None, None, message(self.brightness_path, brightness))
+        self.assertEqual(self.strip._global_brightness, 1.0)
+
+        self.strip.show()
+        self.assertAlmostEqual(self.strip._global_brightness, 0.3)
+        self.assertEqual(self.show.mqtt.coalesced_updates, 2)
+        self.assertEqual(self.show.mqtt.applied_updates, 1)
+
+    def test_invalid_brightness_is_ignored(self):
+        self.show.mqtt.parse_message(None, None, message(self.brightness_path, '1.5'))
+        self.show.mqtt.parse_message(None, None, message(self.brightness_path, 'bright'))
+        self.strip.show()
+        self.assertEqual(self.strip._global_brightness, 1.0)
+        self.assertEqual(self.show.mqtt.applied_updates, 0)
+
+    def test_parameters_are_merged(self):
+        for step in range(5):
+            self.show.mqtt.parse_message(None, None, message(self.parameter_path, json.dumps({'step': step})))
+        self.assertEqual(self.show.p.value['step'], 0)
+
+        self.strip.show()
+        self.assertEqual(self.show.p.value['step'], 4)
+        self.assertEqual(self.show.mqtt.coalesced_updates, 4)
+        self.assertEqual(self.show.mqtt.applied_updates, 1)
+
+    def test_invalid_parameters_are_dropped(self):
+        parameters = json.dumps({'step': 2, 'color': 'red'})
+        self.show.mqtt.parse_message(None, None, message(self.parameter_path, parameters))
+        self.assertFalse(self.show.mqtt.updates_pending.is_set())
+        self.strip.show()
+        self.assertEqual(self.show.p.value['step'], 0)
+
+    def test_published_state_is_rate_limited(self):
+        self.show.mqtt.min_publish_interval_sec = 0.05
+        self.show.mqtt.flush_states()
+        self.client.reset_mock()
+        state_path = self.config.MQTT.Path.show_parameter_current.format(show_name='counter')
+
+        for step in range(1, 4):
+            self.show.mqtt.parse_message(None, None, message(self.parameter_path, json.dumps({'step': step})))
+            self.strip.show()
+        self.assertEqual(self.client.publish.call_count, 0)  # the last publication is too recent
+
+        time.sleep(0.2)
+        state = json.dumps({'step': 3, 'color': [255, 0, 0]})
+        self.client.publish.assert_called_once_with(topic=state_path, payload=state, qos=1, retain=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
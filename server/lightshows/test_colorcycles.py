@@ -0,0 +1,79 @@
+# Tests for the color cycle lightshows
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+Tests that the array-based color cycles (:py:class:`lightshows.rainbow.Rainbow` and
+:py:class:`lightshows.theaterchase.TheaterChase`) paint the same frames as the classic per-pixel versions
+"""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import paho.mqtt.client
+
+from benchmarks import get_benchmark_configuration
+from drivers.dummy import DummyDriver
+from helpers.color import wheel
+from lightshows.rainbow import Rainbow
+from lightshows.theaterchase import TheaterChase
+
+
+def make_show(show_class, num_leds: int):
+    strip = DummyDriver(num_leds)
+    show = show_class(strip, {}, mqtt_client=mock.Mock(), config=mock.Mock())
+    show.before_start()
+    return show
+
+
+class TestRainbow(unittest.TestCase):
+    def test_frames_equal_per_pixel_version(self):
+        for num_leds in (1, 7, 300):
+            show = make_show(Rainbow, num_leds)
+            for step in (0, 1, 100, 254):
+                show.update(step, 0)
+
+                scale_factor = 255 / num_leds
+                start_index = 255 / show.p.value['num_steps_per_cycle'] * step
+                expected = [wheel((start_index + i * scale_factor) % 255) for i in range(num_leds)]
+                self.assertEqual([show.strip.get_pixel(i) for i in range(num_leds)],
+                                 [tuple(np.float32(color).tolist()) for color in expected])  # the strip stores float32
+
+
+class TestTheaterChase(unittest.TestCase):
+    def test_frames_equal_per_pixel_version(self):
+        show = make_show(TheaterChase, 50)
+        for step in range(show.p.value['num_steps_per_cycle']):
+            show.update(step, 0)
+
+            start_index = step % 7
+            color = wheel(int(round(255 / show.p.value['num_steps_per_cycle'] * step, 0)))
+            for pixel in range(50):
+                expected = (0, 0, 0) if (pixel + start_index) % 7 in (0, 1) else color
+                self.assertEqual(show.strip.get_pixel(pixel), tuple(np.float32(expected).tolist()))
+
+
+class TestPause(unittest.TestCase):
+    def test_brightness_changes_are_shown_during_the_pause(self):
+        config = get_benchmark_configuration(10)
+        strip = DummyDriver(10)
+        show = TheaterChase(strip, {'pause_sec': 10}, mqtt_client=mock.Mock(), config=config)
+        thread = threading.Thread(target=show.start, daemon=True)
+        thread.start()
+        try:
+            time.sleep(0.1)  # the show is in the pause after its first step
+            message = paho.mqtt.client.MQTTMessage(topic=config.MQTT.Path.global_brightness_set.encode())
+            message.payload = b'0.25'
+            show.mqtt.parse_message(None, None, message)
+
+            deadline = time.perf_counter() + 1
+            while strip._global_brightness != 0.25 and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(strip._global_brightness, 0.25)
+        finally:
+            show.stop()
+            thread.join(1)
+        self.assertFalse(thread.is_alive())
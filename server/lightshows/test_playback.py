@@ -0,0 +1,65 @@
+# Tests for the playback lightshow
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for :py:class:`lightshows.playback.Playback`"""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from drivers.dummy import DummyDriver
+from helpers.exceptions import InvalidParameters
+from helpers.framefile import BRIGHTNESS, FrameFileHeader, write_frames
+from lightshows.playback import Playback
+
+
+class TestPlayback(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.config = mock.Mock()
+        self.config.Playback.directory = directory.name
+
+        # frame i paints all LEDs in (i, 2i, 3i) with a brightness of i/255
+        header = FrameFileHeader(num_leds=4, fps=100.0, flags=BRIGHTNESS)
+        frames = np.zeros(10, dtype=header.dtype)
+        frames['colors'] = np.arange(10)[:, np.newaxis, np.newaxis] * [1, 2, 3]
+        frames['brightness'] = np.arange(10)[:, np.newaxis]
+        write_frames(os.path.join(directory.name, 'count.102f'), header, frames)
+
+    def make_show(self, num_leds: int, **parameters):
+        strip = DummyDriver(num_leds)
+        strip.fps = 1000
+        return Playback(strip, parameters, mqtt_client=mock.Mock(), config=self.config)
+
+    def test_missing_file_fails(self):
+        self.assertRaises(InvalidParameters, self.make_show(4).check_runnable)
+        self.assertRaises(InvalidParameters, self.make_show(4, file='nothing.102f').check_runnable)
+
+    def test_seek_shows_frame(self):
+        show = self.make_show(6, file='count.102f')
+        show.check_runnable()
+
+        show.set_parameter('seek_sec', 0.05, send_mqtt_update=False)
+        show.show_frame(show.frame_index(show.p.value['seek_sec']))
+        show.clear_uncovered_leds()
+
+        self.assertEqual(show.strip.get_pixel(3), (5, 10, 15))
+        self.assertEqual(show.strip.get_pixel(4), (0, 0, 0))  # beyond the end of the file
+        self.assertAlmostEqual(float(show.strip.brightness_buffer[0]), 5 / 255, places=6)
+
+    def test_plays_to_last_frame_without_loop(self):
+        show = self.make_show(4, file='count.102f', loop=False, rate=5.0)
+        show.check_runnable()
+
+        thread = threading.Thread(target=show.run)
+        thread.start()
+        thread.join(timeout=2)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(show.strip.get_pixel(0), (9, 18, 27))
@@ -2,6 +2,8 @@
 # (c) 2015 Martin Erzberger, 2016-2017 Simon Leiner
 # licensed under the GNU Public License, version 2
 
+import numpy as np
+
 from helpers.color import wheel
 from lightshows.templates.colorcycle import *
 
@@ -12,12 +14,19 @@ class TheaterChase(ColorCycle):
 
     No parameters necessary
     """
+
+    cacheable = True
+
     def init_parameters(self):
         super().init_parameters()
         self.set_parameter('num_steps_per_cycle', 35)
 
     def before_start(self):
-        pass
+        # Two LEDs out of 7 are blank. At each step, the blank ones move one pixel ahead.
+        # So there are only 7 different patterns: blank_masks[start_index] marks the blank LEDs of each.
+        pixels = np.arange(self.strip.num_leds)
+        self.blank_masks = [(pixels + start_index) % 7 < 2 for start_index in range(7)]
+        self.frame = np.empty((self.strip.num_leds, 3))
 
     def update(self, current_step: int, current_cycle) -> bool:
         # One cycle = One trip through the color wheel, 0..254
@@ -25,10 +34,7 @@ class TheaterChase(ColorCycle):
         # Note: For a smooth transition between cycles, numStepsPerCycle must be a multiple of 7
         start_index = current_step % 7  # Each segment is 7 dots long: 2 blank, and 5 filled
         color_index = wheel(int(round(255 / self.p.value['num_steps_per_cycle'] * current_step, 0)))
-        for pixel in range(self.strip.num_leds):
-            # Two LEDs out of 7 are blank. At each step, the blank ones move one pixel ahead.
-            if ((pixel + start_index) % 7 == 0) or ((pixel + start_index) % 7 == 1):
-                self.strip.set_pixel(pixel, 0, 0, 0)
-            else:
-                self.strip.set_pixel(pixel, *color_index)
+        self.frame[:] = color_index
+        self.frame[self.blank_masks[start_index]] = 0
+        self.strip.set_pixels(slice(None), self.frame)
         return True
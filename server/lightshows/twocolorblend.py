@@ -2,7 +2,9 @@
 # (c) 2016-2017 Simon Leiner
 # licensed under the GNU Public License, version 2
 
-from helpers.color import SmoothBlend, linear_dim, add_tuples
+import numpy as np
+
+from helpers.color import SmoothBlend
 from helpers.preprocessors import list_to_tuple
 from lightshows.templates.base import *
 
@@ -33,10 +35,8 @@ class TwoColorBlend(Lightshow):
     def run(self):
         transition = SmoothBlend(self.strip)
 
-        for led in range(self.strip.num_leds):
-            normal_distance = led / (self.strip.num_leds - 1)
-            component1 = linear_dim(self.p.value['color1'], 1 - normal_distance)
-            component2 = linear_dim(self.p.value['color2'], normal_distance)
-            led_color = add_tuples(component1, component2)
-            transition.set_pixel(led, *led_color)
+        normal_distance = np.arange(self.strip.num_leds) / max(self.strip.num_leds - 1, 1)
+        component1 = np.outer(1 - normal_distance, self.p.value['color1'])
+        component2 = np.outer(normal_distance, self.p.value['color2'])
+        transition.set_pixels(slice(None), component1 + component2)
         transition.blend()
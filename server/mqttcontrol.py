@@ -4,23 +4,27 @@
 
 """\
 This module starts the central MQTT listener and manages all the lightshows.
+
+The controller runs on an asyncio event loop, which serves the only connection of 102shows to the MQTT broker
+(see :py:class:`helpers.mqtt.AsyncioClient`) and the pipe to the show worker. The commands, the notifications
+and everything the shows publish go through this connection.
 """
 
+import asyncio
 import json
 import logging
-from multiprocessing import Process
-import os
 import signal
 
 import paho.mqtt.client
-import paho.mqtt.publish
 
 import helpers.mqtt
+from drivers import LEDStrip
 from drivers.__active__ import get_driver
+from drivers.segmented import SegmentedStrip
 from helpers.exceptions import *
 from helpers.configparser import ConfigTree
 from helpers.mqtt import TopicAspect
-from lightshows.__active__ import shows
+from showworker import ShowWorker
 
 logger = logging.getLogger('102shows.server.mqttcontrol')
 
@@ -34,13 +38,27 @@ class MQTTControl:
     def __init__(self, config: ConfigTree):
         # global handles
         self.conf = config  # the user config
-        self.show_process = Process()  # for the process in which the lightshows run in
+        self.worker = None  # for the process in which the lightshows run in
         self.strip = None  # for the LED strip
+        self.current_show = None  # name of the running show
 
         # MQTT client
+        self.loop = asyncio.new_event_loop()  #: the event loop of the controller
         self.mqtt = paho.mqtt.client.Client()
         self.mqtt.on_connect = self.on_connect
         self.mqtt.on_message = self.on_message
+        self.mqtt_driver = helpers.mqtt.AsyncioClient(self.mqtt, self.loop)
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False) -> None:
+        """\
+        publishes a message on the broker connection of the controller
+
+        :param topic: topic of the message
+        :param payload: payload of the message
+        :param qos: QoS level of the message
+        :param retain: should the broker retain the message?
+        """
+        self.mqtt.publish(topic, payload, qos, retain)
 
     def notify_user(self, message, qos=0) -> None:
         """\
@@ -49,25 +67,35 @@ class MQTTControl:
         :param message: the text to be displayed
         :param qos: MQTT parameter
         """
-        paho.mqtt.publish.single(
-            topic=self.conf.MQTT.notification_path.format(prefix=self.conf.MQTT.prefix, sys_name=self.conf.sys_name),
-            payload=message,
-            qos=qos,
-            hostname=self.conf.MQTT.Broker.host,
-            port=self.conf.MQTT.Broker.port,
-            keepalive=self.conf.MQTT.Broker.keepalive
-        )
+        self.publish(topic=self.conf.MQTT.notification_path.format(prefix=self.conf.MQTT.prefix,
+                                                                  sys_name=self.conf.sys_name),
+                     payload=message,
+                     qos=qos)
 
     def on_connect(self, client, userdata, flags, rc):
         """subscribe to all messages related to this LED installation"""
         start_path = self.conf.MQTT.Path.show_start
         stop_path = self.conf.MQTT.Path.show_stop
+        brightness_path = self.conf.MQTT.Path.global_brightness_set
+        parameter_path = self.conf.MQTT.Path.show_parameter_set.format(show_name='+')
 
         client.subscribe(start_path)
         client.subscribe(stop_path)
         logger.info("subscription on Broker {host} for {start_path} and {stop_path}".format(
             host=self.conf.MQTT.Broker.host, start_path=start_path, stop_path=stop_path))
 
+        # brightness and parameter changes are handed over to the running show
+        client.subscribe(brightness_path)
+        client.subscribe(parameter_path)
+        logger.info("subscription on Broker {host} for {brightness_path} and {parameter_path}".format(
+            host=self.conf.MQTT.Broker.host, brightness_path=brightness_path, parameter_path=parameter_path))
+
+        # the same for the shows in the zones
+        for path in (self.conf.MQTT.Path.zone_show_start, self.conf.MQTT.Path.zone_show_stop,
+                     self.conf.MQTT.Path.zone_parameter_set):
+            client.subscribe(path.format(zone='+'))
+        logger.info("subscription on Broker {host} for the zones".format(host=self.conf.MQTT.Broker.host))
+
     def on_message(self, client, userdata, msg):
         """react to a received message and eventually starts/stops a show"""
         # store parameters as strings
@@ -84,7 +112,11 @@ class MQTTControl:
             "payload: {}".format(payload)
         )
 
-        if topic == self.conf.MQTT.Path.show_start:
+        zone_start = helpers.mqtt.parse_topic(self.conf.MQTT.Path.zone_show_start, topic)
+        zone_stop = helpers.mqtt.parse_topic(self.conf.MQTT.Path.zone_show_stop, topic)
+
+        if topic == self.conf.MQTT.Path.show_start or zone_start is not None:
+            zone = zone_start['zone'] if zone_start is not None else None
 
             # parse payload
             payload_tree = helpers.mqtt.parse_json_safely(payload)
@@ -95,49 +127,34 @@ class MQTTControl:
                 parameters = {}
 
             # logging
-            logger.info("MQTT command interpreted: START the show \"{}\" (with given parameters: {} ).".format(
-                show_name, parameters))
+            logger.info("MQTT command interpreted: START the show \"{}\" (with given parameters: {} ){}.".format(
+                show_name, parameters, "" if zone is None else " in zone " + zone))
 
-            self.stop_running_show()  # stop any running show
-            self.start_show(show_name, parameters)  # start the new show
+            self.stop_running_show(zone=zone)  # stop any running show
+            self.start_show(show_name, parameters, zone)  # start the new show
 
-        elif topic == self.conf.MQTT.Path.show_stop:
+        elif topic == self.conf.MQTT.Path.show_stop or zone_stop is not None:
+            zone = zone_stop['zone'] if zone_stop is not None else None
 
             # logging
-            logger.info("MQTT command interpreted: STOP the running show")
-            self.stop_running_show()
+            logger.info("MQTT command interpreted: STOP the running show{}".format(
+                "" if zone is None else " in zone " + zone))
+            self.stop_running_show(zone=zone)
 
-    def start_show(self, show_name: str, parameters: dict) -> None:
+        else:  # brightness or parameter change
+            self.worker.forward_message(topic, msg.payload)
+
+    def start_show(self, show_name: str, parameters: dict, zone: str = None) -> None:
         """\
-        looks for a show, checks if it can run and if so, starts it in an own process
+        lets the show worker start a show. The worker looks for the show, checks if it can run
+        and if so, starts it (see :py:func:`showworker.ShowWorker.launch`)
 
         :param show_name: name of the show to be started
         :param parameters: these are passed to the show
+        :param zone: name of the zone in which the show runs (``None`` means the whole strip)
         """
-        # search for show module
-        if show_name not in shows:
-            logger.error("Show \"{name}\" was not found!".format(name=show_name))
-            return
-
-        # initialize show object
-        try:
-            show = shows[show_name](self.strip, parameters)
-            show.check_runnable()
-        except (InvalidStrip, InvalidConf, InvalidParameters) as error_message:
-            logger.error(error_message)
-            self.start_show('clear', {})
-            return
-
-        # start the show
-        logger.info("Starting the show " + show_name)
-        self.show_process = Process(target=show.start, name=show_name)
-        self.show_process.start()
-
-        # propagate via MQTT
-        self.mqtt.publish(topic=self.conf.MQTT.Path.show_current,
-                          payload=show_name,
-                          qos=1,
-                          retain=True)
+        self.worker.start_show(show_name, parameters, zone)
+        self.current_show = show_name if zone is None else None  # a zone show replaces the show on the whole strip
 
     def stop_show(self, show_name: str) -> None:
         """\
@@ -146,54 +163,76 @@ class MQTTControl:
 
         :param show_name: name of the show to be stopped
         """
-        if show_name == self.show_process.name or show_name == "all":
+        if show_name == self.current_show or show_name == "all":
             self.stop_running_show()
 
-    def stop_running_show(self, timeout_sec: float = 1) -> None:
+    def stop_running_show(self, timeout_sec: float = 1, zone: str = None) -> None:
         """\
         stops any running show
 
-        :param timeout_sec: time the show process has until it is terminated
+        :param timeout_sec: time the show has until the show worker is replaced
+        :param zone: only stop the show in this zone (``None`` stops all shows)
         """
-        if self.show_process.is_alive():
-            os.kill(self.show_process.pid, signal.SIGINT)  # the stop signal has a handle attached to it
-            self.show_process.join(timeout_sec)
-            if self.show_process.is_alive():
-                logger.info("{show_name} is running. Terminating...".format(show_name=self.show_process.name))
-                self.show_process.terminate()
-        else:
-            logger.debug("no show running; nothing to stop")
-
-        # propagate via MQTT
-        self.mqtt.publish(topic=self.conf.MQTT.Path.show_current,
-                          payload="",
-                          qos=1,
-                          retain=True)
+        self.worker.stop_show(timeout_sec, zone)
+        if zone is None:
+            self.current_show = None
 
-    def run(self) -> None:
-        """start the listener"""
-        logger.info("Starting {name}".format(name=self.conf.sys_name))
+    def init_strip(self, strip: LEDStrip = None) -> None:
+        """\
+        initializes the LED strip and applies the strip settings of the configuration
 
+        :param strip: use this strip object instead of creating one with the configured driver
+        """
         logger.info("Initializing LED strip...")
-        driver = get_driver(self.conf.Strip.driver)
-        self.strip = driver(num_leds=self.conf.Strip.num_leds,
-                            max_clock_speed_hz=self.conf.Strip.max_clock_speed_hz,
-                            max_global_brightness=self.conf.Strip.max_brightness_percent / 100.0)
+        if strip is None:
+            driver = get_driver(self.conf.Strip.driver)
+            options = dict(self.conf.Strip.driver_options or {})
+            if self.conf.Strip.segments:  # one logical strip on several physical strips
+                segments = [dict(options, **segment) for segment in self.conf.Strip.segments]
+                strip = SegmentedStrip(driver, segments,
+                                       max_clock_speed_hz=self.conf.Strip.max_clock_speed_hz,
+                                       max_global_brightness=self.conf.Strip.max_brightness_percent / 100.0)
+            else:
+                strip = driver(num_leds=self.conf.Strip.num_leds,
+                               max_clock_speed_hz=self.conf.Strip.max_clock_speed_hz,
+                               max_global_brightness=self.conf.Strip.max_brightness_percent / 100.0,
+                               **options)
+        self.strip = strip
+        self.strip.fps = self.conf.Strip.fps
+        self.strip.skip_identical_frames = self.conf.Strip.skip_identical_frames
+        self.strip.async_output = self.conf.Strip.async_output
+        self.strip.forced_refresh_sec = self.conf.Strip.refresh_time_sec
         self.strip.set_global_brightness(self.conf.Strip.initial_brightness_percent / 100.0)
         self.strip.sync_up()
 
+    def start_worker(self) -> None:
+        """starts the process in which the lightshows run (see :py:class:`showworker.ShowWorker`)"""
+        logger.info("Starting the show worker...")
+        self.worker = ShowWorker(self.strip, self.conf, publish=self.publish, loop=self.loop)
+        self.worker.start()
+
+    def connect(self) -> None:
+        """connects to the MQTT broker (the connection is served by :py:attr:`loop`)"""
         logger.info("Connecting to the MQTT Broker")
         if self.conf.MQTT.username is not None:
             self.mqtt.username_pw_set(self.conf.MQTT.username, self.conf.MQTT.password)
         self.mqtt.connect(self.conf.MQTT.Broker.host, self.conf.MQTT.Broker.port, self.conf.MQTT.Broker.keepalive)
+
+    def run(self) -> None:
+        """start the listener"""
+        logger.info("Starting {name}".format(name=self.conf.sys_name))
+
+        self.init_strip()
+        self.start_worker()
+        self.connect()
         logger.info("{name} is ready".format(name=self.conf.sys_name))
 
         # start a show show to listen for brightness changes and refresh the strip regularly
         self.start_show("clear", {})
 
         try:
-            signal.signal(signal.SIGTERM, self.stop_controller)  # attach stop_controller() to SIGTERM
-            self.mqtt.loop_forever()
+            self.loop.add_signal_handler(signal.SIGTERM, self.stop_controller)  # attach stop_controller() to SIGTERM
+            self.loop.run_forever()
         except KeyboardInterrupt:
             self.stop_controller()
         finally:
@@ -201,4 +240,8 @@ class MQTTControl:
 
     def stop_controller(self, signum=None, frame=None):
         """what happens if the controller exits"""
+        self.worker.stop_show()
+        self.worker.terminate()
+        self.mqtt_driver.stop()
+        self.loop.stop()
         del self.strip  # close driver connection
@@ -0,0 +1,391 @@
+# Show Worker
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""\
+This module runs the lightshows in a single long-lived worker process.
+The MQTT controller sends its commands to the worker, which swaps the show objects
+without forking a new process or opening a new broker connection for every show.
+"""
+
+import asyncio
+import logging
+from multiprocessing import Pipe, Process
+import threading
+import time
+
+import paho.mqtt.client
+
+from drivers import LEDStrip
+from drivers.zone import ZoneCompositor
+from helpers.configparser import ConfigTree
+from helpers.exceptions import *
+from lightshows.__active__ import shows
+
+logger = logging.getLogger('102shows.server.showworker')
+
+
+class RelayClient:
+    """\
+    Stands in for the MQTT client inside the worker process: the messages that the shows publish
+    are sent through the pipe to the controller, which publishes them on its own broker connection
+    (see :py:func:`ShowWorker.receive`).
+
+    :param connection: the worker's end of the pipe
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()  # the shows publish from their own threads
+
+    def send(self, *message) -> None:
+        """\
+        sends a message to the controller
+
+        :param message: the message type and its arguments
+        """
+        with self.lock:
+            self.connection.send(message)
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False) -> None:
+        """\
+        lets the controller publish a message (like :py:func:`paho.mqtt.client.Client.publish`)
+
+        :param topic: topic of the message
+        :param payload: payload of the message
+        :param qos: QoS level of the message
+        :param retain: should the broker retain the message?
+        """
+        self.send('publish', topic, payload, qos, retain)
+
+    def disconnect(self) -> None:
+        pass
+
+
+class ShowWorker:
+    """\
+    Runs the lightshows in a persistent process.
+
+    The controller side of this class (:py:func:`start`, :py:func:`start_show`, :py:func:`stop_show` and
+    :py:func:`forward_message`) sends commands through a pipe to the worker process.
+    Inside the worker process (:py:func:`run`), each show runs in its own thread.
+
+    If ``publish`` is given, the worker process does not connect to the MQTT broker at all:
+    the shows publish through a :py:class:`RelayClient`, and the controller publishes their messages
+    on its own connection. Otherwise, all shows share one connection of the worker process.
+
+    Besides the show on the whole strip, one show can run in each zone of the strip (see :py:mod:`drivers.zone`).
+    Starting a show on the whole strip stops all zone shows and vice versa.
+
+    If a show does not stop in time, the controller replaces the whole worker process.
+
+    :param strip: the LED strip. The worker process takes over its state via :py:func:`drivers.LEDStrip.sync_down`
+    :param config: the configuration tree
+    :param publish: function :samp:`{publish}(topic, payload, qos, retain)` that publishes
+                    the messages of the shows on the controller's broker connection
+    :param loop: the asyncio event loop of the controller. It reads the messages of the worker process
+                 as soon as they arrive (without it, they are read whenever a command is sent).
+    """
+
+    def __init__(self, strip: LEDStrip, config: ConfigTree, publish=None, loop: asyncio.AbstractEventLoop = None):
+        self.strip = strip
+        self.conf = config
+        self.publish = publish
+        self.relay = publish is not None  #: do the shows publish through the controller?
+        self.loop = loop
+
+        self.process = None  #: the worker process
+        self.connection = None  #: the controller's end of the command pipe
+
+        # used inside the worker process
+        self.mqtt = None  #: the MQTT client that all shows publish with
+        self.show = None  #: the show object that runs on the whole strip
+        self.show_thread = None  #: the thread in which the show runs
+        self.compositor = None  #: the :py:class:`drivers.zone.ZoneCompositor` that manages the zones
+        self.zone_shows = {}  #: maps the zone names to the show objects and threads that run in the zones
+
+    # controller side:
+
+    def start(self) -> None:
+        """starts the worker process"""
+        self.connection, worker_connection = Pipe()
+        self.process = Process(target=self.run, args=(worker_connection,), name='102shows-worker', daemon=True)
+        self.process.start()
+        if self.loop is not None:
+            self.loop.add_reader(self.connection.fileno(), self.receive)
+        logger.info("Show worker started (pid {})".format(self.process.pid))
+
+    def terminate(self) -> None:
+        """kills the worker process (without giving the running show a chance to end gracefully)"""
+        if self.loop is not None and self.connection is not None:
+            self.loop.remove_reader(self.connection.fileno())
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+    def send(self, *command) -> None:
+        """\
+        sends a command to the worker process. If the worker process is not running, it is restarted first.
+
+        :param command: the command name and its arguments
+        """
+        if self.process is None or not self.process.is_alive():
+            logger.warning("Show worker is not running. Restarting it...")
+            self.terminate()
+            self.start()
+        self.receive()
+        self.connection.send(command)
+
+    def receive(self) -> None:
+        """\
+        handles the messages of the worker process that wait in the pipe:
+        the messages that the shows publish are handed to ``publish``
+        """
+        try:
+            while self.connection.poll():
+                self.handle(*self.connection.recv())
+        except (EOFError, OSError):  # the worker process is gone
+            if self.loop is not None:
+                self.loop.remove_reader(self.connection.fileno())
+
+    def handle(self, message_type: str, *args) -> None:
+        """\
+        handles a message of the worker process
+
+        :param message_type: the type of the message (``publish`` or ``stopped``)
+        :param args: the arguments of the message
+        """
+        if message_type == 'publish':
+            self.publish(*args)
+        else:  # a late reply to a stop command
+            logger.debug("ignoring {} message of the show worker".format(message_type))
+
+    def start_show(self, show_name: str, parameters: dict, zone: str = None) -> None:
+        """\
+        lets the worker start a show
+
+        :param show_name: name of the show to be started
+        :param parameters: these are passed to the show
+        :param zone: name of the zone in which the show runs (``None`` means the whole strip)
+        """
+        self.send('start', show_name, parameters, zone)
+
+    def stop_show(self, timeout_sec: float = 1, zone: str = None) -> None:
+        """\
+        lets the worker stop the running show and waits until it is stopped.
+        If this takes longer than ``timeout_sec``, the worker process is replaced.
+
+        :param timeout_sec: time the show has to stop
+        :param zone: only stop the show in this zone (``None`` stops all shows)
+        """
+        self.send('stop', timeout_sec, zone)
+        deadline = time.perf_counter() + timeout_sec
+        try:
+            while self.connection.poll(max(deadline - time.perf_counter(), 0)):
+                message_type, *args = self.connection.recv()
+                if message_type == 'stopped':
+                    if args[0]:
+                        return
+                    break
+                self.handle(message_type, *args)
+        except EOFError:  # the worker process is gone
+            pass
+
+        logger.info("The show did not stop in time. Restarting the show worker...")
+        self.terminate()
+        self.start()
+
+    def forward_message(self, topic: str, payload: bytes) -> None:
+        """\
+        hands an MQTT message (a brightness or parameter change) over to the running show
+
+        :param topic: topic of the message
+        :param payload: payload of the message
+        """
+        self.send('message', topic, payload)
+
+    # worker side:
+
+    def run(self, connection) -> None:
+        """\
+        The main loop of the worker process: executes the commands from the controller.
+
+        :param connection: the worker's end of the command pipe
+        """
+        self.strip.sync_down()
+        relay = RelayClient(connection)
+        try:
+            self.compositor = ZoneCompositor(self.strip, self.conf.Zones)
+        except InvalidConf as error_message:
+            logger.error(error_message)
+            self.compositor = ZoneCompositor(self.strip)
+        if self.relay:
+            self.mqtt = relay
+        else:
+            self.connect()
+
+        while True:
+            try:
+                command, *args = connection.recv()
+            except EOFError:  # the controller is gone
+                break
+
+            if command == 'start':
+                self.launch(*args)
+            elif command == 'stop':
+                relay.send('stopped', self.halt(*args))
+            elif command == 'message':
+                self.dispatch(*args)
+
+        self.halt()
+        self.mqtt.disconnect()
+
+    def connect(self) -> None:
+        """opens the MQTT connection that the shows use (if they do not publish through the controller)"""
+        self.mqtt = paho.mqtt.client.Client()
+        if self.conf.MQTT.username is not None:
+            self.mqtt.username_pw_set(self.conf.MQTT.username, self.conf.MQTT.password)
+        self.mqtt.connect(self.conf.MQTT.Broker.host, self.conf.MQTT.Broker.port, self.conf.MQTT.Broker.keepalive)
+        self.mqtt.loop_start()
+
+    def launch(self, show_name: str, parameters: dict, zone: str = None) -> None:
+        """\
+        looks for a show, checks if it can run and if so, starts it in an own thread
+
+        :param show_name: name of the show to be started
+        :param parameters: these are passed to the show
+        :param zone: name of the zone in which the show runs (``None`` means the whole strip)
+        """
+        if zone is not None and zone not in self.compositor.zones:
+            logger.error("Zone \"{name}\" was not found!".format(name=zone))
+            return
+
+        if not self.halt(zone=zone):  # only one show at a time (in each zone)
+            return
+        if zone is not None and self.show is not None:  # the show on the whole strip makes room for the zones
+            if not self.halt_show(self.show, self.show_thread):
+                return
+            self.show, self.show_thread = None, None
+            self.publish_current_show("")
+
+        # search for show module
+        if show_name not in shows:
+            logger.error("Show \"{name}\" was not found!".format(name=show_name))
+            return
+
+        # initialize show object
+        strip = self.strip if zone is None else self.compositor.zones[zone]
+        try:
+            show = shows[show_name](strip, parameters, mqtt_client=self.mqtt, config=self.conf)
+            show.check_runnable()
+        except (InvalidStrip, InvalidConf, InvalidParameters) as error_message:
+            logger.error(error_message)
+            self.launch('clear', {}, zone)
+            return
+
+        # start the show
+        logger.info("Starting the show " + show_name + ("" if zone is None else " in zone " + zone))
+        thread = threading.Thread(target=show.start, name=show_name, daemon=True)
+        if zone is None:
+            self.show, self.show_thread = show, thread
+        else:
+            self.zone_shows[zone] = (show, thread)
+            self.compositor.start()
+        thread.start()
+
+        # propagate via MQTT
+        self.publish_current_show(show_name, zone)
+
+    def halt_show(self, show, thread: threading.Thread, timeout_sec: float = 1) -> bool:
+        """\
+        stops a show and unfreezes its strip
+
+        :param show: the show object
+        :param thread: the thread in which the show runs
+        :param timeout_sec: time the show has to stop
+        :return: ``True`` if the show was stopped, ``False`` if it is still running
+        """
+        if thread is not None and thread.is_alive():
+            show.stop()
+            thread.join(timeout_sec)
+            if thread.is_alive():
+                logger.error("{show_name} does not stop".format(show_name=show.name))
+                return False
+        show.strip.unfreeze()
+        return True
+
+    def halt(self, timeout_sec: float = 1, zone: str = None) -> bool:
+        """\
+        stops the running show
+
+        :param timeout_sec: time the show has to stop
+        :param zone: only stop the show in this zone (``None`` stops the show on the whole strip and in all zones)
+        :return: ``True`` if the show was stopped (or no show was running), ``False`` if it is still running
+        """
+        if zone is not None:
+            if zone in self.zone_shows:
+                if not self.halt_show(*self.zone_shows[zone], timeout_sec):
+                    return False
+                del self.zone_shows[zone]
+                self.publish_current_show("", zone)
+            return True
+
+        for zone_name in list(self.zone_shows):
+            if not self.halt(timeout_sec, zone_name):
+                return False
+        if self.compositor is not None:
+            self.compositor.stop()
+
+        if self.show_thread is None or not self.show_thread.is_alive():
+            logger.debug("no show running; nothing to stop")
+        elif not self.halt_show(self.show, self.show_thread, timeout_sec):
+            return False
+
+        self.show = None
+        self.show_thread = None
+        self.strip.unfreeze()
+
+        # propagate via MQTT
+        self.publish_current_show("")
+
+        return True
+
+    def dispatch(self, topic: str, payload: bytes) -> None:
+        """\
+        lets the running shows parse a brightness or parameter change
+
+        :param topic: topic of the message
+        :param payload: payload of the message
+        """
+        running = [(None, self.show)] if self.show is not None else []
+        running += [(zone, show) for zone, (show, _) in self.zone_shows.items()]
+        if not running:
+            logger.debug("no show running; ignoring message on {}".format(topic))
+            return
+
+        for zone, show in running:
+            parameter_paths = [self.conf.MQTT.Path.show_parameter_set.format(show_name=show.name)]
+            if zone is not None:
+                parameter_paths.append(self.conf.MQTT.Path.zone_parameter_set.format(zone=zone))
+            if topic not in [self.conf.MQTT.Path.global_brightness_set] + parameter_paths:
+                continue
+
+            message = paho.mqtt.client.MQTTMessage(topic=topic.encode())
+            message.payload = payload
+            show.mqtt.parse_message(self.mqtt, None, message)
+
+    def publish_current_show(self, show_name: str, zone: str = None) -> None:
+        """\
+        publishes the name of the running show
+
+        :param show_name: the name of the show (or an empty string if no show is running)
+        :param zone: the zone of the show (``None`` means the whole strip)
+        """
+        if zone is None:
+            topic = self.conf.MQTT.Path.show_current
+        else:
+            topic = self.conf.MQTT.Path.zone_show_current.format(zone=zone)
+        self.mqtt.publish(topic=topic,
+                          payload=show_name,
+                          qos=1,
+                          retain=True)
@@ -0,0 +1,66 @@
+# Tests for mqttcontrol
+# (c) 2016-2017 Simon Leiner
+# licensed under the GNU Public License, version 2
+
+"""Tests for the event loop of :py:class:`mqttcontrol.MQTTControl` with a :py:class:`helpers.fakebroker.FakeBroker`"""
+
+import json
+import threading
+import time
+import unittest
+
+from benchmarks import get_benchmark_configuration
+from drivers.dummy import DummyDriver
+from helpers.fakebroker import FakeBroker
+from mqttcontrol import MQTTControl
+
+
+class TestControlPlane(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+        self.broker.start()
+        self.addCleanup(self.broker.stop)
+
+        self.conf = get_benchmark_configuration(10, self.broker.host, self.broker.port)
+        self.control = MQTTControl(self.conf)
+        self.control.init_strip(DummyDriver(10))
+        self.control.start_worker()
+        self.control.connect()
+        self.controller = threading.Thread(target=self.control.loop.run_forever, daemon=True)
+        self.controller.start()
+        self.addCleanup(self.stop_controller)
+
+    def stop_controller(self):
+        self.control.loop.call_soon_threadsafe(self.control.stop_controller)
+        self.controller.join()
+
+    def wait_for_subscription(self, topic: str, timeout_sec: float = 5) -> None:
+        end_time = time.perf_counter() + timeout_sec
+        while not any(topic in session.subscriptions for session in list(self.broker.sessions)):
+            self.assertLess(time.perf_counter(), end_time, "the controller did not subscribe to " + topic)
+            time.sleep(0.01)
+
+    def test_shows_publish_through_the_controller(self):
+        self.wait_for_subscription(self.conf.MQTT.Path.show_start)
+        self.broker.publish(self.conf.MQTT.Path.show_start,
+                            json.dumps({'name': 'solidcolor', 'parameters': {'color': [255, 0, 0]}}))
+
+        with self.broker.received:
+            self.assertTrue(self.broker.received.wait_for(lambda: any(
+                message.topic == self.conf.MQTT.Path.show_current and message.payload == b'solidcolor'
+                for message in self.broker.messages), 5))
+        self.assertIsNotNone(self.broker.wait_for_message(
+            self.conf.MQTT.Path.show_parameter_current.format(show_name='solidcolor'), timeout_sec=5))
+        self.assertEqual(len(self.broker.sessions), 1)  # the worker process has no connection of its own
+
+    def test_notifications_use_the_same_connection(self):
+        self.control.loop.call_soon_threadsafe(self.control.notify_user, "hello")
+        topic = self.conf.MQTT.notification_path.format(prefix=self.conf.MQTT.prefix, sys_name=self.conf.sys_name)
+        notification = self.broker.wait_for_message(topic, timeout_sec=5)
+        self.assertIsNotNone(notification)
+        self.assertEqual(notification.payload, b'hello')
+        self.assertEqual(len(self.broker.sessions), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()